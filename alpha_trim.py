@@ -0,0 +1,27 @@
+# alpha_trim.py
+import numpy as np
+
+
+def alpha_bbox(alpha, threshold=16, min_pixels=2):
+    """
+    アルファチャンネル (H x W の uint8 配列) から、不透明な部分を囲む箱 (left, top, right, bottom) を返す。
+    alpha が threshold 以下の画素は透明とみなし、行・列ごとに不透明な画素が min_pixels 個未満なら数えない。
+    アルファマッティングの薄いもやや、ぽつんと残った点で箱が広がらないようにするため。
+    不透明な部分がなければ None。
+    """
+    opaque = alpha > threshold
+    rows = np.flatnonzero(np.count_nonzero(opaque, axis=1) >= min_pixels)
+    cols = np.flatnonzero(np.count_nonzero(opaque, axis=0) >= min_pixels)
+    if rows.size == 0 or cols.size == 0:
+        return None
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def trim_alpha(img, threshold=16, min_pixels=2):
+    """RGBA の PIL 画像の透明な縁を切り落とした画像を返す (ディスクには書かない)。全部透明なら None。"""
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+    bbox = alpha_bbox(np.asarray(img.getchannel("A")), threshold, min_pixels)
+    if bbox is None:
+        return None
+    return img.crop(bbox)
@@ -0,0 +1,206 @@
+# asset_cache.py
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageTk
+
+from flag_overlay import fade_alpha
+
+# build_assets.py が書き出す事前リサイズ済み画像の置き場所 (各アプリの作業ディレクトリからの相対パス)
+DEFAULT_BUNDLE_DIR = "asset_bundle"
+
+
+def bundle_path(bundle_dir, key):
+    """キャッシュキーに対応する事前リサイズ済みファイルのパスを返す。"""
+    path, size, resample, alpha, thumbnail = key
+    variant = f"{size[0]}x{size[1]}" if size else "orig"
+    variant += f"_r{int(resample)}"
+    if thumbnail:
+        variant += "_fit"
+    if alpha is not None:
+        variant += f"_a{int(round(alpha * 100)):03d}"
+    return os.path.join(bundle_dir, variant, os.path.splitext(path)[0] + ".png")
+
+
+def load_processed(path, size=None, resample=Image.Resampling.LANCZOS, alpha=None, thumbnail=False):
+    """元画像を開いてリサイズ・アルファ加工した PIL 画像を返す。"""
+    with Image.open(path) as src:
+        img = src.copy() if thumbnail or size is None else src.resize(size, resample)
+    if thumbnail and size:
+        img.thumbnail(size, resample)
+    if alpha is not None:
+        # 透明度を下げる (alpha=0.4 なら 40%)
+        img = fade_alpha(img, alpha)
+    return img
+
+
+class AssetCache:
+    """
+    デコード・リサイズ済みの画像を保持する LRU キャッシュ。
+    キーは (パス, 目標サイズ, リサンプル方法, アルファ加工, thumbnail かどうか)。
+    容量は画素データのバイト数で管理し、超えたら古いものから捨てる。
+    ImageTk.PhotoImage も同じキーで保持する (作成はメインスレッドのみ)。
+    Tk のオブジェクトはメインスレッドでしか消せないので、プリウォームのスレッドで追い出した
+    PhotoImage は root.after でメインスレッドに渡してから手放す。
+    bundle_dir に build_assets.py の出力があれば、元画像の代わりにそちらを読む。
+    """
+
+    def __init__(self, root, max_bytes=96 * 1024 * 1024, bundle_dir=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.bundle_dir = bundle_dir
+        self.current_bytes = 0
+        self._images = OrderedDict()  # key -> (PIL.Image, バイト数)
+        self._photos = {}  # key -> ImageTk.PhotoImage
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.photo_hits = 0
+        self.photo_misses = 0
+        self.evictions = 0
+        self.bundle_hits = 0  # 事前リサイズ済みファイルから読めた回数
+        self._prewarm_queue = queue.Queue()
+        self._prewarm_thread = None
+
+    @staticmethod
+    def make_key(path, size=None, resample=Image.Resampling.LANCZOS, alpha=None, thumbnail=False):
+        return (path, tuple(size) if size else None, resample, alpha, thumbnail)
+
+    @staticmethod
+    def _nbytes(img):
+        return img.width * img.height * len(img.getbands())
+
+    def _load(self, path, size, resample, alpha, thumbnail):
+        if self.bundle_dir:
+            prebuilt = bundle_path(self.bundle_dir, (path, size, resample, alpha, thumbnail))
+            try:
+                # 元画像より新しい場合だけ使う
+                if os.path.getmtime(prebuilt) >= os.path.getmtime(path):
+                    with Image.open(prebuilt) as src:
+                        src.load()
+                        self.bundle_hits += 1
+                        return src.copy()
+            except OSError:
+                pass
+        return load_processed(path, size, resample, alpha, thumbnail)
+
+    def get(self, path, size=None, resample=Image.Resampling.LANCZOS, alpha=None, thumbnail=False):
+        """
+        加工済みの PIL 画像を返す。キャッシュになければ読み込んで登録する。
+        返した画像は共有されるので、呼び出し側で書き換えないこと。
+        """
+        key = self.make_key(path, size, resample, alpha, thumbnail)
+        with self._lock:
+            entry = self._images.get(key)
+            if entry is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        img = self._load(path, key[1], resample, alpha, thumbnail)
+        self.put(key, img)
+        return img
+
+    def put(self, key, img):
+        """読み込み済みの画像を登録する (プリウォームなどから使う)。"""
+        nbytes = self._nbytes(img)
+        released = []
+        with self._lock:
+            old = self._images.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+                released.append(self._photos.pop(key, None))
+            self._images[key] = (img, nbytes)
+            self.current_bytes += nbytes
+            released.extend(self._evict())
+        self._release_photos(released)
+
+    def _evict(self):
+        """容量を超えた分を追い出し、手放す PhotoImage のリストを返す (_lock を持って呼ぶ)。"""
+        released = []
+        # 直前に入れたものは残す
+        while self.current_bytes > self.max_bytes and len(self._images) > 1:
+            key, (_, nbytes) = self._images.popitem(last=False)
+            released.append(self._photos.pop(key, None))
+            self.current_bytes -= nbytes
+            self.evictions += 1
+        return released
+
+    def _release_photos(self, photos):
+        """PhotoImage の最後の参照をメインスレッドで手放す。"""
+        photos = [photo for photo in photos if photo is not None]
+        if not photos or threading.current_thread() is threading.main_thread():
+            return
+        try:
+            # コールバックの引数として持たせておき、メインスレッドで実行し終えたときに参照が消える
+            self.root.after(0, lambda held=photos: None)
+        except RuntimeError:
+            # メインループが既に終了している
+            pass
+
+    def photo(self, path, size=None, resample=Image.Resampling.LANCZOS, alpha=None, thumbnail=False):
+        """
+        ImageTk.PhotoImage を返す。Tk のメインスレッドからのみ呼ぶこと。
+        表示中の画像が追い出されても消えないよう、呼び出し側でも参照を保持すること。
+        """
+        key = self.make_key(path, size, resample, alpha, thumbnail)
+        img = self.get(path, size, resample, alpha, thumbnail)
+        with self._lock:
+            photo = self._photos.get(key)
+            if photo is not None:
+                self.photo_hits += 1
+                return photo
+            self.photo_misses += 1
+        photo = ImageTk.PhotoImage(img)
+        with self._lock:
+            if key in self._images:
+                self._photos[key] = photo
+        return photo
+
+    def invalidate(self, path):
+        """指定したパスのエントリをすべて捨てる (ファイルを書き換えたとき用)。"""
+        released = []
+        with self._lock:
+            for key in [k for k in self._images if k[0] == path]:
+                _, nbytes = self._images.pop(key)
+                released.append(self._photos.pop(key, None))
+                self.current_bytes -= nbytes
+        self._release_photos(released)
+
+    def prewarm(self, keys):
+        """
+        keys (make_key の戻り値と同じ形のタプル) をバックグラウンドで読み込んでおく。
+        初めて画面を描くときにデコード待ちが起きないようにするため。
+        何回呼んでも1本のスレッドが順番に処理するので、同じ画像を二重に読むことはない。
+        """
+        self._prewarm_queue.put(list(keys))
+        if self._prewarm_thread is None:
+            self._prewarm_thread = threading.Thread(target=self._prewarm_loop, name="AssetPrewarm", daemon=True)
+            self._prewarm_thread.start()
+        return self._prewarm_thread
+
+    def _prewarm_loop(self):
+        while True:
+            keys = self._prewarm_queue.get()
+            for key in keys:
+                try:
+                    self.get(*key)
+                except Exception as e:
+                    print(f"Asset prewarm failed for {key[0]}: {e}")
+            print(f"Asset prewarm finished: {len(keys)} assets, {self.current_bytes // 1024} KiB cached")
+
+    def stats(self):
+        return {
+            "entries": len(self._images),
+            "bytes": self.current_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "photo_hits": self.photo_hits,
+            "photo_misses": self.photo_misses,
+            "evictions": self.evictions,
+            "bundle_hits": self.bundle_hits,
+        }
@@ -0,0 +1,168 @@
+# box_tracker.py
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+def box_iou(a, b):
+    """2つの箱 (x1, y1, x2, y2) の IoU。"""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class BoxTracker:
+    """
+    YOLO の検出と検出のあいだ、最後に検出した国旗の箱をオプティカルフロー (Lucas-Kanade) で動かすクラス。
+    毎フレーム update() で箱を動かし、推論結果が届いたら correct() で確かめる。
+    推論結果は数フレーム前のフレームのものなので、そのフレームのときの箱と比べ、
+    ずれの分だけいまの箱を直す (フローで動かした分は捨てない)。
+    フローは縮小した白黒画像で計算するので、1フレーム数ミリ秒で済む。
+    追える点が足りなくなったら箱は消す (止まったままの箱を出し続けない)。
+
+    箱はすべて元のフレームの座標 (x1, y1, x2, y2)。メインスレッドからだけ呼ぶこと。
+    """
+
+    def __init__(self, work_width=320, max_points=40, min_points=6, match_iou=0.3, max_misses=3, history=120):
+        self.work_width = work_width  # フローを計算する画像の幅
+        self.max_points = max_points
+        self.min_points = min_points  # 追える点がこれより少なくなったら見失ったとみなす
+        self.match_iou = match_iou    # 検出をいまの箱と同じ物とみなす IoU
+        self.max_misses = max_misses  # 続けて検出されなかったらこの回数で箱を消す
+        self._history = deque(maxlen=history)  # (フレーム番号, そのときの箱)。推論結果と突き合わせる
+        self._lk_params = dict(winSize=(15, 15), maxLevel=2,
+                               criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+        self._gray = None
+        self._prev_gray = None
+        self.reset()
+
+    def reset(self):
+        self.box = None
+        self.label = None
+        self.confidence = 0.0
+        self.misses = 0
+        self._points = None
+        self._scale = 1.0
+        self._history.clear()
+
+    @property
+    def active(self):
+        return self.box is not None
+
+    def _to_gray(self, frame):
+        """縮小した白黒画像を作る (バッファは使い回し、前のフレームと入れ替える)。"""
+        frame_h, frame_w = frame.shape[:2]
+        self._scale = self.work_width / float(frame_w)
+        size = (self.work_width, max(1, int(round(frame_h * self._scale))))
+        if self._gray is None or self._gray.shape != (size[1], size[0]):
+            self._gray = np.empty((size[1], size[0]), dtype=np.uint8)
+            self._prev_gray = np.empty_like(self._gray)
+            self._small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        cv2.resize(frame, size, dst=self._small, interpolation=cv2.INTER_AREA)
+        self._prev_gray, self._gray = self._gray, self._prev_gray
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        return self._gray
+
+    def _seed_points(self, gray):
+        """箱の中から追いやすい点 (角) を選ぶ。"""
+        x1, y1, x2, y2 = [int(round(v * self._scale)) for v in self.box]
+        mask = np.zeros_like(gray)
+        mask[max(0, y1):max(0, y2), max(0, x1):max(0, x2)] = 255
+        self._points = cv2.goodFeaturesToTrack(gray, maxCorners=self.max_points, qualityLevel=0.01,
+                                               minDistance=5, mask=mask)
+
+    def _remember(self, frame_seq):
+        if frame_seq is not None:
+            self._history.append((frame_seq, list(self.box)))
+
+    def box_at(self, frame_seq):
+        """frame_seq のフレームのときの箱。覚えていなければ None。"""
+        for seq, box in reversed(self._history):
+            if seq == frame_seq:
+                return box
+            if frame_seq is not None and seq < frame_seq:
+                break
+        return None
+
+    def start(self, frame, box, label, confidence, frame_seq=None):
+        """frame (番号 frame_seq) で検出した箱から追跡を始める。"""
+        self._history.clear()
+        self.box = [float(v) for v in box]
+        self.label = label
+        self.confidence = confidence
+        self.misses = 0
+        self._seed_points(self._to_gray(frame))
+        self._remember(frame_seq)
+
+    def update(self, frame, frame_seq=None):
+        """新しいフレームで箱を動かし、その箱を返す。見失ったら (追える点が足りなければ) 箱を消して None。"""
+        if self.box is None:
+            return None
+        prev_points = self._points
+        gray = self._to_gray(frame)
+        if prev_points is None or len(prev_points) < self.min_points:
+            # 平らな国旗などで追える点がない。動きがわからないので箱は出さない (次の検出で出し直す)
+            self.reset()
+            return None
+
+        points, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, prev_points, None, **self._lk_params)
+        good = status.reshape(-1) == 1
+        old, new = prev_points.reshape(-1, 2)[good], points.reshape(-1, 2)[good]
+        if len(new) < self.min_points:
+            self.reset()
+            return None
+
+        # 点の移動の中央値で平行移動、点どうしの距離の比の中央値で拡大率を決める
+        dx, dy = (float(v) for v in np.median(new - old, axis=0) / self._scale)
+        scale = 1.0
+        if len(new) >= 2:
+            old_d = np.linalg.norm(old[:, None] - old[None], axis=2)
+            new_d = np.linalg.norm(new[:, None] - new[None], axis=2)
+            valid = old_d > 1.0
+            if valid.any():
+                scale = float(np.clip(np.median(new_d[valid] / old_d[valid]), 0.8, 1.25))
+
+        x1, y1, x2, y2 = self.box
+        cx, cy = (x1 + x2) / 2.0 + dx, (y1 + y2) / 2.0 + dy
+        half_w, half_h = (x2 - x1) * scale / 2.0, (y2 - y1) * scale / 2.0
+        self.box = [cx - half_w, cy - half_h, cx + half_w, cy + half_h]
+        self._points = new.reshape(-1, 1, 2)
+        self._remember(frame_seq)
+        return self.box
+
+    def correct(self, detections, frame_seq, frame, current_frame=None, current_seq=None):
+        """
+        推論結果 [(ラベル, 信頼度, 箱), ...] で箱を確かめる。
+        detections は frame (番号 frame_seq) を推論したもの。current_frame / current_seq はいま表示しているフレーム。
+
+        そのフレームのときの箱と同じ物と思われる検出があれば、ラベルと信頼度を更新し、
+        検出と当時の箱のずれの分だけいまの箱を直す。
+        なければ一番確かな検出から追跡し直す。そのときは frame で始めて current_frame までフローで進める。
+        何も検出されない回が max_misses 回続いたら箱を消す。
+        """
+        if not detections:
+            self.misses += 1
+            if self.misses >= self.max_misses:
+                self.reset()
+            return
+
+        past_box = self.box_at(frame_seq) if self.box is not None else None
+        if past_box is not None:
+            same = [d for d in detections if d[0] == self.label and box_iou(past_box, d[2]) >= self.match_iou]
+            if same:
+                label, confidence, box = max(same, key=lambda d: box_iou(past_box, d[2]))
+                self.box = [now + (detected - past) for now, detected, past in zip(self.box, box, past_box)]
+                self.confidence = confidence
+                self.misses = 0
+                # 点が減ってきていたら、いまのフレーム (最後に update したフレーム) で選び直す
+                if self._points is None or len(self._points) < self.max_points // 2:
+                    self._seed_points(self._gray)
+                return
+
+        label, confidence, box = max(detections, key=lambda d: d[1])
+        self.start(frame, box, label, confidence, frame_seq)
+        if current_frame is not None and current_seq != frame_seq:
+            self.update(current_frame, current_seq)
@@ -0,0 +1,91 @@
+# build_assets.py
+"""
+画面に表示するサイズにリサイズ済みの画像を asset_bundle/ に書き出すスクリプト。
+アプリは AssetCache(root, bundle_dir="asset_bundle") でこれを読み、起動時に prewarm する。
+
+使い方 (リポジトリ直下で):
+    python build_assets.py            # すべてのアプリ分を作る
+    python build_assets.py kokki_UI   # 指定したアプリ分だけ作る
+"""
+import glob
+import os
+import sys
+import time
+
+from PIL import Image
+
+from asset_cache import AssetCache, DEFAULT_BUNDLE_DIR, bundle_path, load_processed
+from model_export import KOKKI_FLAGS
+
+LANCZOS = Image.Resampling.LANCZOS
+BICUBIC = Image.Resampling.BICUBIC
+
+# アプリ名 -> (作業ディレクトリ, [(パターン, サイズ, リサンプル, アルファ, thumbnail), ...])
+# パターンは作業ディレクトリからの相対パス (glob 可)。サイズ等は各画面の描画コードと一致させること。
+ASSET_SPECS = {
+    # kokki_UI/top.py
+    "kokki_UI": ("kokki_UI", [
+        ("image/background.jpg", (800, 600), LANCZOS, None, False),
+        *[(f"image/{flag}.jpg", (800, 600), LANCZOS, None, False) for flag in KOKKI_FLAGS],
+        *[(f"image/{flag}.png", (800, 600), BICUBIC, 0.4, False) for flag in KOKKI_FLAGS],
+        *[(f"image/{flag}.png", (250, 200), LANCZOS, None, True) for flag in KOKKI_FLAGS],
+        ("image/*.jpg", (300, 300), BICUBIC, None, False),
+    ]),
+    # kokki_UI/detail2.py
+    "detail2": ("kokki_UI", [
+        *[(f"image/{flag}.png", (800, 600), LANCZOS, 0.4, False) for flag in KOKKI_FLAGS],
+        ("image/*.jpg", (300, 300), LANCZOS, None, True),
+    ]),
+    # car_game.py
+    "car_game": (".", [
+        ("image/town.jpg", (800, 600), BICUBIC, None, False),
+        ("image/house_less.jpg", (800, 600), BICUBIC, None, False),
+        ("image/car_less.jpg", (800, 600), BICUBIC, None, False),
+        ("image/house_car_less.jpg", (800, 600), BICUBIC, None, False),
+        ("sample.jpg", (800, 600), BICUBIC, None, False),
+        ("image/house.png", (290, 290), BICUBIC, None, True),
+        ("image/car.png", (290, 290), BICUBIC, None, True),
+    ]),
+}
+
+
+def expand_specs(app_name):
+    """
+    ASSET_SPECS のパターンを展開して、AssetCache のキーのリストを返す。
+    パスはアプリの作業ディレクトリからの相対パス。存在しないファイルは含めない。
+    """
+    _, specs = ASSET_SPECS[app_name]
+    keys = []
+    for pattern, size, resample, alpha, thumbnail in specs:
+        paths = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in paths:
+            if os.path.exists(path):
+                keys.append(AssetCache.make_key(path.replace(os.sep, "/"), size, resample, alpha, thumbnail))
+    return keys
+
+
+def build(app_name, bundle_dir=DEFAULT_BUNDLE_DIR):
+    base_dir, _ = ASSET_SPECS[app_name]
+    here = os.getcwd()
+    os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), base_dir))
+    try:
+        keys = expand_specs(app_name)
+        print(f"[{app_name}] {len(keys)} assets -> {os.path.join(base_dir, bundle_dir)}")
+        for key in keys:
+            start = time.perf_counter()
+            img = load_processed(*key)
+            out_path = bundle_path(bundle_dir, key)
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            img.save(out_path, "PNG", compress_level=1)  # 読み込みを速くするため圧縮は軽めに
+            print(f"  {key[0]} -> {out_path} ({img.width}x{img.height}, {time.perf_counter() - start:.2f}s)")
+    finally:
+        os.chdir(here)
+
+
+if __name__ == "__main__":
+    targets = sys.argv[1:] or list(ASSET_SPECS)
+    for name in targets:
+        if name not in ASSET_SPECS:
+            print(f"Unknown app '{name}'. Choose from: {', '.join(ASSET_SPECS)}")
+            sys.exit(1)
+        build(name)
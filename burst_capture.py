@@ -0,0 +1,29 @@
+# burst_capture.py
+import cv2
+
+
+def sharpness(frame, box=None, size=160):
+    """
+    フレーム (box があればその範囲) のピントの良さ。ラプラシアンの分散で、大きいほどくっきりしている。
+    解像度に左右されないように、幅 size の白黒画像に縮小してから測る。
+    """
+    if box is not None:
+        x1, y1, x2, y2 = box
+        frame = frame[y1:y2, x1:x2]
+    h, w = frame.shape[:2]
+    if h == 0 or w == 0:
+        return 0.0
+    scale = size / float(w)
+    small = cv2.resize(frame, (size, max(1, int(round(h * scale)))), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def select_sharpest(frames, k, box=None):
+    """
+    frames からピントの良い順に k 枚選び、[(ピントの値, フレーム), ...] で返す。
+    同じ値なら新しいフレーム (frames の先の方) を優先する。
+    """
+    scored = [(sharpness(frame, box), -i, frame) for i, frame in enumerate(frames)]
+    scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+    return [(score, frame) for score, _, frame in scored[:k]]
@@ -1,16 +1,18 @@
 import cv2
 from tkinter import Tk, Label, Button
 from PIL import Image, ImageTk
+from camera_stream import CameraStream
 
 class CameraApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Camera Viewer")
 
-        # VideoCaptureを初期化
-        self.cap = cv2.VideoCapture(1)
-        if not self.cap.isOpened():
+        # カメラの読み込みスレッドを初期化
+        self.cap = CameraStream(1)
+        if not self.cap.is_opened():
             raise RuntimeError("カメラを開けませんでした。")
+        self.cap.start()
 
         self.frame_count = 0
 
@@ -30,8 +32,8 @@ class CameraApp:
 
         # フレームを5フレームごとに更新
         if self.frame_count % 5 == 0:
-            ret, frame = self.cap.read()
-            if ret:
+            frame = self.cap.read_latest()  # 最新フレームをブロックせずに取得
+            if frame is not None:
                 # OpenCVのBGR画像をPillow用のRGB画像に変換
                 frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
                 image = Image.fromarray(frame)
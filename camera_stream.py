@@ -0,0 +1,152 @@
+# camera_stream.py
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class CameraStream:
+    """
+    カメラ読み込み専用のバックグラウンドスレッド。
+    事前確保した NumPy フレームのリングバッファに書き込み、
+    UI スレッドはロックなしで最新フレームを取り出せる。
+    """
+
+    def __init__(self, indices=0, api_preference=cv2.CAP_ANY, buffer_size=4):
+        if isinstance(indices, int):
+            indices = (indices,)
+        self.buffer_size = max(2, buffer_size)
+
+        self._cap = None
+        for index in indices:
+            cap = cv2.VideoCapture(index, api_preference)
+            if cap.isOpened():
+                self._cap = cap
+                self.index = index
+                break
+            print(f"Warning: Camera index {index} failed.")
+            cap.release()
+
+        # リングバッファ本体（最初のフレームのサイズで確保する）
+        self._slots = None
+        # スロットごとの書き込み番号。書き込み中は -1
+        self._slot_seq = [0] * self.buffer_size
+        self._latest_slot = -1
+        self.frame_seq = 0  # 取り込んだフレームの通し番号
+        self.read_failed = False  # 直近の read() が失敗したかどうか
+
+        self._running = False
+        self._thread = None
+
+    def is_opened(self):
+        return self._cap is not None and self._cap.isOpened()
+
+    def start(self):
+        """読み込みスレッドを開始する。"""
+        if not self.is_opened() or self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="CameraStream", daemon=True)
+        self._thread.start()
+        return self
+
+    def _allocate(self, shape, dtype):
+        self._slots = [np.empty(shape, dtype=dtype) for _ in range(self.buffer_size)]
+        self._slot_seq = [0] * self.buffer_size
+        self._latest_slot = -1
+
+    def _run(self):
+        try:
+            self._read_loop()
+        finally:
+            # 読み込み中のカメラを他のスレッドから解放すると落ちるバックエンドがあるので、このスレッドで解放する
+            cap, self._cap = self._cap, None
+            if cap is not None:
+                cap.release()
+
+    def _read_loop(self):
+        write_slot = 0
+        while self._running:
+            if self._slots is None:
+                ret, frame = self._cap.read()
+                if not ret:
+                    self.read_failed = True
+                    time.sleep(0.05)
+                    continue
+                self._allocate(frame.shape, frame.dtype)
+                np.copyto(self._slots[write_slot], frame)
+            else:
+                # 読者が参照中かもしれないスロットには印を付けてから上書きする
+                self._slot_seq[write_slot] = -1
+                ret, frame = self._cap.read(self._slots[write_slot])
+                if not ret:
+                    self.read_failed = True
+                    time.sleep(0.05)
+                    continue
+                if frame is not self._slots[write_slot]:
+                    # 解像度が変わった場合などはバッファを作り直す
+                    if frame.shape != self._slots[write_slot].shape:
+                        self._allocate(frame.shape, frame.dtype)
+                        write_slot = 0
+                    np.copyto(self._slots[write_slot], frame)
+
+            self.read_failed = False
+            self.frame_seq += 1
+            self._slot_seq[write_slot] = self.frame_seq
+            self._latest_slot = write_slot  # ここで公開（int の代入なのでアトミック）
+            write_slot = (write_slot + 1) % self.buffer_size
+
+    def read_latest(self, copy=True):
+        """
+        最新フレームを返す（ブロックしない）。まだフレームがなければ None。
+        copy=False の場合はバッファのビューを返すので、すぐに使い終えること。
+        """
+        for _ in range(self.buffer_size):
+            slot = self._latest_slot
+            slots = self._slots
+            if slot < 0 or slots is None:
+                return None
+            seq = self._slot_seq[slot]
+            if seq < 0:
+                continue
+            if not copy:
+                return slots[slot]
+            frame = slots[slot].copy()
+            # コピー中に上書きされていなければ成功
+            if self._slot_seq[slot] == seq:
+                return frame
+        return None
+
+    def recent(self, n):
+        """
+        新しい順に最大 n 枚のフレームのコピーを返す (ブロックしない)。
+        コピー中に上書きされたスロットは飛ばすので、n 枚より少ないことがある。
+        n はリングバッファの大きさ - 1 までにしておくと取りこぼしにくい。
+        """
+        slots = self._slots
+        if slots is None:
+            return []
+        seqs = sorted(((seq, i) for i, seq in enumerate(self._slot_seq) if seq > 0), reverse=True)
+        frames = []
+        for seq, i in seqs[:n]:
+            frame = slots[i].copy()
+            if self._slot_seq[i] == seq:
+                frames.append(frame)
+        return frames
+
+    def release(self):
+        """
+        スレッドを止めてカメラを解放する。読み込みスレッドが動いていれば、カメラはそのスレッドが抜けるときに解放する
+        (1秒待っても read() から戻らなければ、待たずに戻る)。
+        """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            if self._thread.is_alive():
+                print("Warning: camera thread is still reading; the camera will be released when it returns.")
+                return
+            self._thread = None
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
@@ -1,16 +1,35 @@
+import time
+STARTED_AT = time.perf_counter() # For the startup time report (includes imports)
 import tkinter as tk
 from tkinter import messagebox, font
 from PIL import Image, ImageTk, ImageFont
 import cv2
 import numpy as np
 import os
-from ultralytics import YOLO
-from rembg import remove
+import sys
+from camera_stream import CameraStream
+from shutter_job import ShutterJob, StageFailed
+from asset_cache import AssetCache, DEFAULT_BUNDLE_DIR
+from build_assets import expand_specs
+from preview_renderer import PreviewRenderer
+from model_loader import ModelLoader
+from model_export import DETECT_IMGSZ
+from letterbox import Letterbox
+from screen_layers import ScreenLayers
+from startup_timer import StartupTimer
+from background_remover import BackgroundRemover
+from fast_cutout import fast_cutout, mask_quality
+from sam_segmenter import SamSegmenter, cutout_rgba
+from alpha_trim import trim_alpha
+from image_writer import ImageWriter
 
 class BlockGameApp:
-    def __init__(self, root):
+    def __init__(self, root, rembg_model="u2net", alpha_matting=True, cutout_mode="grabcut", backdrop_bgr=None):
         self.root = root
         self.root.title("Block Game")
+        # Startup time breakdown, printed and appended to startup_times.csv once the model is ready
+        self.startup_timer = StartupTimer("car_game", started_at=STARTED_AT, log_path="startup_times.csv")
+        self.startup_timer.mark("imports")
 
         # Initial setup
         self.current_screen = "main"
@@ -20,46 +39,85 @@ class BlockGameApp:
         self.frame_count = 0
         # Store paths to the processed (background removed, trimmed) captured images
         self.captured_images = {"house": None, "cars": None}
+        # Button-sized PhotoImages of the captured images, made once at capture time
+        self.captured_thumbnails = {"house": None, "cars": None}
+        self.button_coords = {
+            "house": (270, 90, 570, 440), # x1, y1, x2, y2
+            "cars": (240, 440, 500, 560),
+        }
+        self.last_frame_seq = 0
+        self.shutter_job = None # Background capture processing job, if any
         # Try camera index 1 first, then 0 if needed (common setup)
-        self.capture = cv2.VideoCapture(1)
-        if not self.capture.isOpened():
-            print("Warning: Camera index 1 failed, trying index 0.")
-            self.capture = cv2.VideoCapture(0)
-            if not self.capture.isOpened():
-                messagebox.showerror("Error", "Cannot access the camera")
-                root.destroy()
-                return # Stop initialization if camera fails
+        # Frames are read on a background thread; the UI only takes the newest one
+        self.capture = CameraStream((1, 0))
+        if not self.capture.is_opened():
+            messagebox.showerror("Error", "Cannot access the camera")
+            root.destroy()
+            return # Stop initialization if camera fails
+        self.capture.start()
+        self.startup_timer.mark("camera_opened")
 
         # Load YOLO model (make sure 'bestbest.pt' is in the correct path)
-        try:
-            self.model = YOLO('bestbest.pt')
-        except Exception as e:
-             messagebox.showerror("Error", f"Failed to load YOLO model 'bestbest.pt': {e}")
-             root.destroy()
-             return
+        # Loading and a warm-up inference run in the background so the window shows up right away;
+        # the shutter stays disabled until the model is ready.
+        # An ONNX / OpenVINO export from model_export.py (fixed 480x480 input) is used when present
+        self.model = None
+        self.model_status_id = None
+        # Frames are letterboxed to the 480x480 training size once, into a reused buffer, before detection
+        self.letterbox = Letterbox(DETECT_IMGSZ)
+        self.model_loader = ModelLoader(self.root, 'bestbest.pt', on_ready=self._on_model_ready,
+                                        on_error=self._on_model_error, warmup_shape=(DETECT_IMGSZ, DETECT_IMGSZ, 3),
+                                        imgsz=DETECT_IMGSZ).start()
+
+        # Background removal keeps one rembg session for the whole run, created in the background.
+        # rembg_model is one of background_remover.MODELS (u2netp/silueta are faster, u2net/isnet cleaner);
+        # alpha matting gives softer edges but adds a costly solve per capture
+        self.bg_remover = BackgroundRemover(model=rembg_model, alpha_matting=alpha_matting).start()
+        # Fast cutout from the YOLO box ("grabcut" or "colorkey", see fast_cutout.py); rembg is only used
+        # when the fast mask fails its quality check. "rembg" always uses rembg.
+        # "sam" prompts SAM (vit_b, kept loaded) with the YOLO box instead of the fast mask.
+        # backdrop_bgr is the booth's plain backdrop color for "colorkey" (None: sampled from the crop border)
+        self.cutout_mode = cutout_mode
+        self.backdrop_bgr = backdrop_bgr
+        self.segmenter = SamSegmenter("vit_b").start() if cutout_mode == "sam" else None
+        self.trim_alpha_threshold = 16 # Alpha at or below this is treated as transparent when trimming
+
+        # Decoded/resized image cache, backed by the build_assets.py bundle and prewarmed in the background
+        self.assets = AssetCache(self.root, bundle_dir=DEFAULT_BUNDLE_DIR)
+        self.assets.prewarm(expand_specs("car_game"))
 
         # Output directory for processed images
         self.output_dir = "output_images"
         os.makedirs(self.output_dir, exist_ok=True)
+        # PNG encoding runs on a writer thread (fast compress level 1); on_close waits for it to finish
+        self.image_writer = ImageWriter(png_compress_level=1)
 
         # Main canvas
         self.canvas = tk.Canvas(root, width=800, height=600, bg="white")
         self.canvas.pack()
+        # Each screen's canvas items are built once and then only hidden/shown
+        self.layers = ScreenLayers(self.canvas)
+        self.next_screen_items = {} # blocknumber -> (camera feed item id, message item id)
 
         # Load initial background image (Keep reference)
         self.bg_tk = None
         self.update_background_image() # Load initial background
 
         # --- Keep references to images to prevent garbage collection ---
-        self.house_image_tk = None
-        self.cars_image_tk = None
-        self.bg_next_screen_tk = None
+        # Each next screen is its own layer, so its background/sample PhotoImages are kept per layer
+        # (hidden layers must not depend on the asset cache to keep their images alive)
+        self.next_screen_photos = {} # blocknumber -> {"background": PhotoImage, "sample": PhotoImage}
         self.image_tk = None
-        self.sample_image_tk = None
         # --- ---
 
+        # Camera preview: one reusable buffer/PhotoImage, stretched to fill the 300x300 area like before
+        self.preview = PreviewRenderer(keep_aspect=False)
+        self.cam_feed_image_id = None # Camera feed item of the current next screen (built with the screen)
+        self.message_id = None
+
         # Draw the initial screen
         self.draw_main_screen()
+        self.startup_timer.mark("main_screen")
 
         # Mouse click event
         self.canvas.bind("<Button-1>", self.mouse_event)
@@ -79,9 +137,7 @@ class BlockGameApp:
             background_path = "image/town.jpg"  # Initial background
 
         try:
-            new_bg_image = Image.open(background_path)
-            new_bg_image = new_bg_image.resize((800, 600))
-            self.bg_tk = ImageTk.PhotoImage(new_bg_image) # Update reference
+            self.bg_tk = self.assets.photo(background_path, (800, 600), Image.Resampling.BICUBIC) # Update reference
         except FileNotFoundError:
              print(f"Error: Background image not found at {background_path}. Using default white.")
              # Create a fallback white image if needed
@@ -94,10 +150,13 @@ class BlockGameApp:
             self.bg_tk = ImageTk.PhotoImage(new_bg_image)
 
     def draw_main_screen(self):
+        """Shows the main screen. It is only rebuilt after a capture changes it."""
+        self.current_screen = "main"
+        self.layers.show(("main", self._build_main_screen))
+
+    def _build_main_screen(self):
         """Draws the main screen with dynamic background and buttons/images."""
         self.update_background_image() # Ensure background is up-to-date
-        self.canvas.delete("all")
-        self.current_screen = "main"
 
         # Draw background image
         if self.bg_tk:
@@ -110,67 +169,47 @@ class BlockGameApp:
         # Text
         self.canvas.create_text(400, 30, text="Legoooooo", font=("Helvetica", 24), fill="black")
         self.canvas.create_text(420, 70, text="まちをかんせいさせよう！", font=font_subject, fill="black")
+        # Shown only while the model is still loading
+        self.model_status_id = self.canvas.create_text(400, 580, text="" if self.model_loader.ready else "じゅんびちゅう...",
+                                                       font=("Helvetica", 16), fill="orange")
 
         # Buttons and images
-        house_button_coords = (270, 90, 570, 440) # x1, y1, x2, y2
-        cars_button_coords = (240, 440, 500, 560) # x1, y1, x2, y2
+        for item_type in ("house", "cars"):
+            coords = self.button_coords[item_type]
+            if self.captured_images[item_type]:
+                try:
+                    # Thumbnail made at capture time, so coming back here never touches the disk
+                    center_x = (coords[0] + coords[2]) / 2
+                    center_y = (coords[1] + coords[3]) / 2
+                    self.canvas.create_image(center_x, center_y, anchor=tk.CENTER, image=self.captured_thumbnails[item_type])
+                    # Transparent button overlay for clicking
+                    self.canvas.create_rectangle(*coords, fill="", outline="", tags=f"{item_type}_area")
+                except Exception as e:
+                    print(f"Error displaying captured {item_type} image: {e}")
+                    # Draw placeholder button if image fails
+                    self.draw_placeholder_button(item_type, coords)
+            else:
+                # Draw placeholder button
+                self.draw_placeholder_button(item_type, coords)
 
-        # House button/image
-        if self.captured_images["house"]:
-            try:
-                # Display captured house image, fitting within button area
-                house_image = Image.open(self.captured_images["house"])
-                # Calculate aspect ratio to fit
-                img_w, img_h = house_image.size
-                box_w = house_button_coords[2] - house_button_coords[0]
-                box_h = house_button_coords[3] - house_button_coords[1]
-                scale = min(box_w / img_w, box_h / img_h)
-                new_w, new_h = int(img_w * scale * 0.9), int(img_h * scale * 0.9) # Add some padding
-                house_image = house_image.resize((new_w, new_h))
-
-                self.house_image_tk = ImageTk.PhotoImage(house_image) # Keep reference
-                # Center the image in the button area
-                center_x = (house_button_coords[0] + house_button_coords[2]) / 2
-                center_y = (house_button_coords[1] + house_button_coords[3]) / 2
-                self.canvas.create_image(center_x, center_y, anchor=tk.CENTER, image=self.house_image_tk)
-                # Transparent button overlay for clicking
-                self.canvas.create_rectangle(*house_button_coords, fill="", outline="", tags="house_area") # Use different tag if needed
-            except Exception as e:
-                print(f"Error displaying captured house image: {e}")
-                # Draw placeholder button if image fails
-                self.draw_placeholder_button("house", house_button_coords)
-        else:
-            # Draw house placeholder button
-            self.draw_placeholder_button("house", house_button_coords)
+    def make_button_thumbnail(self, img, coords):
+        """
+        Scales a captured image to fit inside a main screen button area.
 
+        Args:
+            img (PIL.Image.Image): The captured (trimmed) image.
+            coords (tuple): The button area (x1, y1, x2, y2).
 
-        # Car button/image
-        if self.captured_images["cars"]:
-            try:
-                 # Display captured cars image
-                cars_image = Image.open(self.captured_images["cars"])
-                # Calculate aspect ratio to fit
-                img_w, img_h = cars_image.size
-                box_w = cars_button_coords[2] - cars_button_coords[0]
-                box_h = cars_button_coords[3] - cars_button_coords[1]
-                scale = min(box_w / img_w, box_h / img_h)
-                new_w, new_h = int(img_w * scale * 0.9), int(img_h * scale * 0.9) # Add some padding
-                cars_image = cars_image.resize((new_w, new_h))
-
-                self.cars_image_tk = ImageTk.PhotoImage(cars_image) # Keep reference
-                 # Center the image in the button area
-                center_x = (cars_button_coords[0] + cars_button_coords[2]) / 2
-                center_y = (cars_button_coords[1] + cars_button_coords[3]) / 2
-                self.canvas.create_image(center_x, center_y, anchor=tk.CENTER, image=self.cars_image_tk)
-                 # Transparent button overlay for clicking
-                self.canvas.create_rectangle(*cars_button_coords, fill="", outline="", tags="cars_area") # Use different tag if needed
-            except Exception as e:
-                print(f"Error displaying captured cars image: {e}")
-                # Draw placeholder button if image fails
-                self.draw_placeholder_button("cars", cars_button_coords)
-        else:
-            # Draw car placeholder button
-            self.draw_placeholder_button("cars", cars_button_coords)
+        Returns:
+            PIL.Image.Image: The resized image.
+        """
+        # Calculate aspect ratio to fit
+        img_w, img_h = img.size
+        box_w = coords[2] - coords[0]
+        box_h = coords[3] - coords[1]
+        scale = min(box_w / img_w, box_h / img_h)
+        new_w, new_h = int(img_w * scale * 0.9), int(img_h * scale * 0.9) # Add some padding
+        return img.resize((new_w, new_h))
 
     def draw_placeholder_button(self, item_type, coords):
         """Helper function to draw the placeholder buttons"""
@@ -195,16 +234,24 @@ class BlockGameApp:
 
 
     def draw_next_screen(self):
-        """Draws the screen for capturing a specific block."""
-        self.canvas.delete("all")
+        """Shows the capture screen for the selected block, building it on first use."""
         self.current_screen = "next"
+        self.layers.show((f"next_{self.blocknumber}", self._build_next_screen))
+        self.cam_feed_image_id, self.message_id = self.next_screen_items[self.blocknumber]
+
+        # Reset the per-visit parts: the feed is shown again on the first new frame
+        self.image_tk = None
+        self.canvas.itemconfig(self.cam_feed_image_id, state="hidden")
+        self.canvas.itemconfig(self.message_id, text="")
 
+    def _build_next_screen(self):
+        """Draws the screen for capturing a specific block."""
+        photos = self.next_screen_photos[self.blocknumber] = {} # Keep this layer's images alive
         # Background image for the capture screen (sample.jpg)
         try:
-            bg_image = Image.open("sample.jpg") # Use a neutral/instructional background
-            bg_image = bg_image.resize((800, 600))
-            self.bg_next_screen_tk = ImageTk.PhotoImage(bg_image) # Keep reference
-            self.canvas.create_image(0, 0, anchor=tk.NW, image=self.bg_next_screen_tk)
+            # Use a neutral/instructional background
+            photos["background"] = self.assets.photo("sample.jpg", (800, 600), Image.Resampling.BICUBIC)
+            self.canvas.create_image(0, 0, anchor=tk.NW, image=photos["background"])
         except Exception as e:
             print(f"Error loading sample.jpg background: {e}. Using light green.")
             self.canvas.create_rectangle(0, 0, 800, 600, fill="lightgreen", outline="")
@@ -227,7 +274,8 @@ class BlockGameApp:
                                      cam_x + cam_w//2, cam_y + cam_h//2,
                                      fill="gray", outline="black")
         self.canvas.create_text(cam_x, cam_y, text="Camera Feed", font=("Helvetica", 14), fill="white")
-        # The actual feed will be drawn by update_frame
+        # The actual feed is set by update_frame on the first frame
+        cam_feed_image_id = self.canvas.create_image(cam_x, cam_y, anchor=tk.CENTER, tags="camera_feed")
 
         # Display Sample image on the left
         sample_frame_coords = (100, 100, 400, 400) # x1, y1, x2, y2 for the frame
@@ -236,13 +284,11 @@ class BlockGameApp:
 
         if self.sample_image_path:
             try:
-                sample_image = Image.open(self.sample_image_path)
                 # Resize sample image to fit within the defined frame, preserving aspect ratio
-                sample_image.thumbnail((sx2 - sx1 - 10, sy2 - sy1 - 10)) # Add padding
-
-                self.sample_image_tk = ImageTk.PhotoImage(sample_image) # Keep reference
+                photos["sample"] = self.assets.photo(self.sample_image_path, (sx2 - sx1 - 10, sy2 - sy1 - 10), # Add padding
+                                                     Image.Resampling.BICUBIC, thumbnail=True)
                 # Place the sample image in the center of the frame
-                self.canvas.create_image((sx1 + sx2) // 2, (sy1 + sy2) // 2, anchor=tk.CENTER, image=self.sample_image_tk)
+                self.canvas.create_image((sx1 + sx2) // 2, (sy1 + sy2) // 2, anchor=tk.CENTER, image=photos["sample"])
 
             except FileNotFoundError:
                  print(f"Sample image error: File not found at {self.sample_image_path}")
@@ -267,7 +313,9 @@ class BlockGameApp:
                                 text="🏠 さいしょにもどる", font=font_subject, fill="white", tags="back_to_main") # Add tag to text
 
         # Message area (initially empty) - create text item to update later
-        self.message_id = self.canvas.create_text(400, 570, text="", font=("Helvetica", 16), fill="red", anchor=tk.CENTER)
+        message_id = self.canvas.create_text(400, 570, text="", font=("Helvetica", 16), fill="red", anchor=tk.CENTER)
+
+        self.next_screen_items[self.blocknumber] = (cam_feed_image_id, message_id)
 
 
     def mouse_event(self, event):
@@ -304,178 +352,252 @@ class BlockGameApp:
             if "shutter" in clicked_tags:
                 self.capture_shutter()
             elif "back_to_main" in clicked_tags:
+                self.cancel_shutter_job() # Abort any capture still being processed
                 self.draw_main_screen() # Go back to main screen
 
     def capture_shutter(self):
         """
-        Captures an image from the camera, performs object detection using YOLO,
-        removes the background of the detected object, trims transparency,
-        and saves the result. Updates the main screen if successful.
+        Captures an image from the camera and starts a background job that
+        performs object detection using YOLO, removes the background of the
+        detected object, trims transparency and saves the result.
+        Updates the main screen if successful.
         """
+        if self.shutter_job is not None and self.shutter_job.active:
+            # Ignore the shutter while a capture is still being processed (a cancelled one doesn't block)
+            self.canvas.itemconfig(self.message_id, text="しょりちゅう... ちょっとまってね")
+            return
+        if not self.model_loader.ready:
+            self.canvas.itemconfig(self.message_id, text="じゅんびちゅう... ちょっとまってね")
+            return
+        latest_frame = self.capture.read_latest() # Take the newest frame without blocking
+        if latest_frame is not None:
+            self.last_frame = latest_frame
         if self.last_frame is not None:
-            # 1. Save the raw captured frame temporarily
-            raw_filename = f"temp_capture_{self.blocknumber}.jpg"
-            raw_capture_path = os.path.join(self.output_dir, raw_filename)
-            cv2.imwrite(raw_capture_path, self.last_frame)
-            print(f"Temporary image saved: {raw_capture_path}")
-
             # Update message to indicate processing
             self.canvas.itemconfig(self.message_id, text="しゃしんをしらべてるよ...")
-            self.root.update_idletasks() # Force UI update
-
-            # 2. Run YOLO detection on the saved image
-            try:
-                results = self.model(raw_capture_path)
-            except Exception as e:
-                 print(f"Error during YOLO detection: {e}")
-                 self.canvas.itemconfig(self.message_id, text="エラー！うまくしらべられなかった...")
-                 return
-
-            # 3. Process detection results
-            confidence_threshold = 0.3 # Adjusted confidence threshold
-            detected = False
-            best_match_found = False # Flag to ensure only the best match is processed
-
-            if results and results[0].boxes and len(results[0].boxes) > 0:
-
-                # Sort detections by confidence score (descending)
-                sorted_indices = np.argsort(results[0].boxes.conf.cpu().numpy())[::-1]
-
-                for i in sorted_indices:
-                    if best_match_found: break # Stop after finding the first valid match
-
-                    box = results[0].boxes.xyxy[i]
-                    confidence = results[0].boxes.conf[i]
-                    label_index = int(results[0].boxes.cls[i])
-                    object_type = self.model.names.get(label_index, "unknown") # Safely get name
-
-                    print(f"Detected: {object_type} (Conf: {confidence:.2f})")
-
-                    # Check if confidence is high enough
-                    if confidence < confidence_threshold:
-                        print(f"  Skipping low confidence detection.")
-                        continue
-
-                    # Check if the detected object matches the expected type
-                    expected_type = "house" if self.blocknumber == 0 else "cars"
-                    if object_type != expected_type:
-                        print(f"  Skipping - Expected '{expected_type}', got '{object_type}'.")
-                        continue
-
-                    # --- Match Found! Process this one ---
-                    best_match_found = True
-                    detected = True
-                    print(f"  Processing best match: {object_type}")
-
-                    # 4. Crop the detected object from the *original Pillow image* for better quality
-                    try:
-                        original_image_pil = Image.open(raw_capture_path)
-                        x1, y1, x2, y2 = map(int, box.tolist())
-                        # Add some padding to the crop box if desired (optional)
-                        padding = 10
-                        x1 = max(0, x1 - padding)
-                        y1 = max(0, y1 - padding)
-                        x2 = min(original_image_pil.width, x2 + padding)
-                        y2 = min(original_image_pil.height, y2 + padding)
-
-                        cropped_pil = original_image_pil.crop((x1, y1, x2, y2))
-                    except Exception as e:
-                        print(f"Error cropping image: {e}")
-                        self.canvas.itemconfig(self.message_id, text="エラー！ しゃしんのきりぬきにしっぱい...")
-                        continue # Try next detection if available (though unlikely now)
-
-
-                    # 5. Remove background using rembg
-                    try:
-                        output_data = remove(cropped_pil.tobytes(), alpha_matting=True) # Use alpha matting for potentially better edges
-                        removed_bg_pil = Image.frombytes("RGBA", cropped_pil.size, output_data)
-                    except Exception as e:
-                        print(f"Error removing background: {e}")
-                        self.canvas.itemconfig(self.message_id, text="エラー！ はいけいをけせなかった...")
-                        continue
-
-                    # 6. Trim transparent area
-                    # Define paths for saving intermediate and final results
-                    bg_removed_path = os.path.join(self.output_dir, f"result_{object_type}.png")
-                    trimmed_output_path = os.path.join(self.output_dir, f"trimmed_{object_type}.png")
-                    removed_bg_pil.save(bg_removed_path, "PNG") # Save intermediate step
-
-                    if self.trim_transparent_area(bg_removed_path, trimmed_output_path):
-                        # 7. Save the final trimmed image path
-                        self.captured_images[object_type] = trimmed_output_path
-                        print(f"Successfully processed and saved: {trimmed_output_path}")
-                        # Go back to main screen AFTER successful processing
-                        self.draw_main_screen()
-                    else:
-                        print(f"Trimming failed for {bg_removed_path}. Using untrimmed version.")
-                        # Fallback: Use the background-removed but untrimmed image
-                        self.captured_images[object_type] = bg_removed_path
-                        self.draw_main_screen() # Still go back, but with untrimmed
-
-            # --- After checking all detections ---
-            if not detected: # No valid detection passed checks
-                if results and results[0].boxes and len(results[0].boxes) > 0:
-                    # Objects were detected, but not the right type or confidence
-                    self.canvas.itemconfig(self.message_id, text="うーん、ちがうものみたい？ もういちど！")
-                else:
-                    # No objects detected at all
-                    self.canvas.itemconfig(self.message_id, text="なにもみつけられなかったよ...")
-            
-            # Clean up the temporary raw capture file
-            if os.path.exists(raw_capture_path):
-                try:
-                    os.remove(raw_capture_path)
-                    print(f"Deleted temporary file: {raw_capture_path}")
-                except Exception as e:
-                    print(f"Error deleting temporary file {raw_capture_path}: {e}")
 
+            # Keep the captured frame in memory (no temporary JPEG round-trip)
+            ctx = {
+                "frame": self.last_frame,
+                "expected_type": "house" if self.blocknumber == 0 else "cars",
+            }
+            self.shutter_job = ShutterJob(
+                self.root,
+                [("detect", self._shutter_detect), ("crop", self._shutter_crop),
+                 ("matte", self._shutter_matte), ("trim", self._shutter_trim),
+                 ("save", self._shutter_save)],
+                ctx=ctx,
+                on_progress=self._on_shutter_progress,
+                on_done=self._on_shutter_done,
+                on_error=self._on_shutter_error,
+                on_cancel=self._on_shutter_cancel,
+            ).start()
         else:
             self.canvas.itemconfig(self.message_id, text="カメラがうごいてないみたい...")
 
+    def _on_model_ready(self, model):
+        """Called on the main thread once the model is loaded and warmed up."""
+        self.model = model
+        if self.model_status_id is not None:
+            self.canvas.itemconfig(self.model_status_id, text="")
+        self.startup_timer.mark("model_ready")
+        self.startup_timer.report(model_load=self.model_loader.load_time, model_warmup=self.model_loader.warmup_time)
+
+    def _on_model_error(self, error):
+        messagebox.showerror("Error", f"Failed to load YOLO model 'bestbest.pt': {error}")
+        self.on_close()
+
+    # --- Shutter stages (run on the ShutterJob worker thread) ---
+    def _shutter_detect(self, ctx):
+        """Runs YOLO on the letterboxed frame and keeps the best matching box (in frame coordinates)."""
+        with self.model_loader.lock: # A cancelled job may still be running its own detection
+            results = self.model(self.letterbox(ctx["frame"]), imgsz=DETECT_IMGSZ)
+        confidence_threshold = 0.3 # Adjusted confidence threshold
+        expected_type = ctx["expected_type"]
+
+        if results and results[0].boxes and len(results[0].boxes) > 0:
+            # Sort detections by confidence score (descending)
+            sorted_indices = np.argsort(results[0].boxes.conf.cpu().numpy())[::-1]
+
+            for i in sorted_indices:
+                box = results[0].boxes.xyxy[i]
+                confidence = results[0].boxes.conf[i]
+                label_index = int(results[0].boxes.cls[i])
+                object_type = self.model.names.get(label_index, "unknown") # Safely get name
+
+                print(f"Detected: {object_type} (Conf: {confidence:.2f})")
+
+                # Check if confidence is high enough
+                if confidence < confidence_threshold:
+                    print(f"  Skipping low confidence detection.")
+                    continue
+
+                # Check if the detected object matches the expected type
+                if object_type != expected_type:
+                    print(f"  Skipping - Expected '{expected_type}', got '{object_type}'.")
+                    continue
+
+                # --- Match Found! Process this one ---
+                print(f"  Processing best match: {object_type}")
+                ctx["object_type"] = object_type
+                ctx["box"] = self.letterbox.to_original(box.tolist()) # Back to full-resolution frame coordinates
+                return
+
+            # Objects were detected, but not the right type or confidence
+            raise StageFailed("うーん、ちがうものみたい？ もういちど！")
+        # No objects detected at all
+        raise StageFailed("なにもみつけられなかったよ...")
+
+    def _shutter_crop(self, ctx):
+        """Crops the detected object from the same full-resolution frame."""
+        frame = ctx["frame"]
+        frame_h, frame_w = frame.shape[:2]
+        x1, y1, x2, y2 = map(int, ctx["box"])
+        # Add some padding to the crop box if desired (optional)
+        padding = 10
+        x1 = max(0, x1 - padding)
+        y1 = max(0, y1 - padding)
+        x2 = min(frame_w, x2 + padding)
+        y2 = min(frame_h, y2 + padding)
+
+        ctx["crop_box"] = (x1, y1, x2, y2)
+        ctx["cropped_bgr"] = frame[y1:y2, x1:x2]
+        # The detected box inside the crop, used to seed the fast cutout
+        bx1, by1, bx2, by2 = ctx["box"]
+        ctx["object_rect"] = (bx1 - x1, by1 - y1, bx2 - x1, by2 - y1)
+        ctx["cropped_pil"] = Image.fromarray(cv2.cvtColor(ctx["cropped_bgr"], cv2.COLOR_BGR2RGB))
+
+    def _shutter_matte(self, ctx):
+        """Removes the background: fast mask from the YOLO box first, the shared rembg session as the fallback."""
+        if self.cutout_mode == "sam":
+            # Each shot is a new frame, so this pays for a full encode; the model itself stays loaded
+            frame_rgb = cv2.cvtColor(ctx["frame"], cv2.COLOR_BGR2RGB)
+            try:
+                mask, score = self.segmenter.mask_for(frame_rgb, box=ctx["box"])
+            except Exception as e:
+                # Missing checkpoint, torch/segment_anything not installed, out of memory...
+                print(f"SAM cutout failed, falling back to rembg: {e}")
+            else:
+                x1, y1, x2, y2 = ctx["crop_box"]
+                mask = mask[y1:y2, x1:x2]
+                ok, metrics = mask_quality(mask.astype(np.uint8) * 255, ctx["object_rect"])
+                if ok:
+                    print(f"SAM cutout OK (score {score:.2f}): {metrics}")
+                    ctx["removed_bg_pil"] = Image.fromarray(cutout_rgba(frame_rgb[y1:y2, x1:x2], mask))
+                    return
+                print(f"SAM cutout rejected, falling back to rembg: {metrics}")
+        elif self.cutout_mode != "rembg":
+            cutout, metrics = fast_cutout(ctx["cropped_bgr"], ctx["object_rect"], self.cutout_mode, self.backdrop_bgr)
+            if cutout is not None:
+                print(f"Fast cutout OK: {metrics}")
+                ctx["removed_bg_pil"] = cutout
+                return
+            print(f"Fast cutout rejected, falling back to rembg: {metrics}")
+        # Pass the PIL image straight through; an RGBA PIL image comes back
+        ctx["removed_bg_pil"] = self.bg_remover.remove(ctx["cropped_pil"])
+
+    def _shutter_trim(self, ctx):
+        """Trims the transparent border (falls back to the untrimmed cutout)."""
+        ctx["trimmed_pil"] = self.trim_transparent_area(ctx["removed_bg_pil"])
+
+    def _shutter_save(self, ctx):
+        """Saves only the final PNG (trimmed, or the untrimmed cutout if trimming failed)."""
+        object_type = ctx["object_type"]
+        if ctx["trimmed_pil"] is not None:
+            final_path = self.image_writer.write(ctx["trimmed_pil"], os.path.join(self.output_dir, f"trimmed_{object_type}.png"))
+            print(f"Trimmed image queued: {final_path}")
+        else:
+            # Fallback: Use the background-removed but untrimmed image
+            final_path = self.image_writer.write(ctx["removed_bg_pil"], os.path.join(self.output_dir, f"result_{object_type}.png"))
+            print(f"Trimming failed. Using untrimmed version: {final_path}")
+        ctx["written_paths"] = [final_path]
+        ctx["final_path"] = final_path
+
+        # Main screen thumbnail from the in-memory result (turned into a PhotoImage on the main thread)
+        final_pil = ctx["trimmed_pil"] if ctx["trimmed_pil"] is not None else ctx["removed_bg_pil"]
+        ctx["thumbnail"] = self.make_button_thumbnail(final_pil, self.button_coords[object_type])
+
+    # --- Shutter callbacks (run on the Tk main thread) ---
+    def _on_shutter_progress(self, stage_name):
+        stage_messages = {
+            "detect": "しゃしんをしらべてるよ...",
+            "crop": "みつけた！ きりぬいてるよ...",
+            "matte": "はいけいをけしてるよ...",
+            "trim": "もうすこし...",
+            "save": "ほぞんしてるよ...",
+        }
+        if self.current_screen == "next":
+            self.canvas.itemconfig(self.message_id, text=stage_messages.get(stage_name, "しょりちゅう..."))
+
+    def _on_shutter_done(self, ctx):
+        # Save the final image path and go back to main screen AFTER successful processing
+        self.captured_images[ctx["object_type"]] = ctx["final_path"]
+        self.captured_thumbnails[ctx["object_type"]] = ImageTk.PhotoImage(ctx["thumbnail"]) # Replaces any older capture
+        print(f"Successfully processed and saved: {ctx['final_path']}")
+        self.layers.invalidate("main") # Background and buttons depend on what has been captured
+        self.draw_main_screen()
 
-    def trim_transparent_area(self, input_path, output_path):
+    def _on_shutter_error(self, stage_name, error):
+        if isinstance(error, StageFailed):
+            text = str(error)
+        else:
+            print(f"Error during shutter stage '{stage_name}': {error}")
+            stage_errors = {
+                "detect": "エラー！うまくしらべられなかった...",
+                "crop": "エラー！ しゃしんのきりぬきにしっぱい...",
+                "matte": "エラー！ はいけいをけせなかった...",
+            }
+            text = stage_errors.get(stage_name, "エラー！ ほぞんにしっぱい...")
+        if self.current_screen == "next":
+            self.canvas.itemconfig(self.message_id, text=text)
+
+    def _on_shutter_cancel(self, ctx):
+        """Removes anything a cancelled job already wrote (unless a newer capture wrote the same file)."""
+        newer_job = self.shutter_job if self.shutter_job is not None and self.shutter_job.ctx is not ctx else None
+        current_paths = newer_job.ctx.get("written_paths", []) if newer_job is not None else []
+        for path in ctx.get("written_paths", []):
+            if path not in current_paths:
+                self.image_writer.discard(path) # Not written yet: skipped; already written: deleted
+        print("Shutter processing cancelled.")
+
+    def cancel_shutter_job(self):
+        """Aborts the running shutter job, if any."""
+        if self.shutter_job is not None and self.shutter_job.running:
+            self.shutter_job.cancel()
+
+
+    def trim_transparent_area(self, img):
         """
-        Trims the transparent border from a PNG image.
+        Trims the transparent border from an RGBA image, in memory.
+
+        Alpha values at or below trim_alpha_threshold count as transparent, so faint
+        matting haze around the object does not keep the border from being trimmed.
 
         Args:
-            input_path (str): Path to the input PNG image.
-            output_path (str): Path to save the trimmed PNG image.
+            img (PIL.Image.Image): Background-removed image.
 
         Returns:
-            bool: True if trimming was successful, False otherwise.
+            PIL.Image.Image or None: The trimmed image, or None if trimming failed.
         """
         try:
-            img = Image.open(input_path).convert("RGBA")
-
-            # Get the bounding box of the non-transparent area
-            bbox = img.getbbox()
-
-            if bbox:
-                # Crop the image to the bounding box
-                trimmed_img = img.crop(bbox)
-                trimmed_img.save(output_path, "PNG")
-                print(f"Trimmed image saved: {output_path}")
-                return True
-            else:
+            trimmed = trim_alpha(img, threshold=self.trim_alpha_threshold)
+            if trimmed is None:
                 # Image might be entirely transparent
-                print(f"No non-transparent pixels found in {input_path}. Cannot trim.")
-                # Copy the original if it's all transparent? Or just return False?
-                # Let's return False, indicating trimming didn't happen.
-                return False
+                print("No non-transparent pixels found. Cannot trim.")
+            return trimmed
 
-        except FileNotFoundError:
-             print(f"Error trimming: Input file not found at {input_path}")
-             return False
         except Exception as e:
             print(f"Error trimming transparent image: {e}")
-            return False
+            return None
 
 
     def update_frame(self):
         """Reads a frame from the camera and updates the display if on the 'next' screen."""
-        if self.capture and self.capture.isOpened():
-            ret, frame = self.capture.read()
-            if ret:
+        if self.capture and self.capture.is_opened() and self.capture.frame_seq != self.last_frame_seq:
+            self.last_frame_seq = self.capture.frame_seq
+            self.startup_timer.mark("first_frame")
+            frame = self.capture.read_latest() # Non-blocking, newest frame from the capture thread
+            if frame is not None:
                 self.frame_count += 1
                  # Update less frequently to save resources, adjust as needed
                 if self.frame_count % 3 == 0:
@@ -484,18 +606,15 @@ class BlockGameApp:
                     # Only update the canvas if we are on the screen showing the camera feed
                     if self.current_screen == "next":
                         try:
-                            frame_rgb = cv2.cvtColor(self.last_frame, cv2.COLOR_BGR2RGB)
-                            frame_image = Image.fromarray(frame_rgb)
                             # Define target size for camera feed display
                             cam_w, cam_h = 300, 300
-                            frame_image = frame_image.resize((cam_w, cam_h))
-                            self.image_tk = ImageTk.PhotoImage(image=frame_image) # Keep reference
+                            # Resize into the preallocated buffer and paste into the same PhotoImage
+                            preview_tk = self.preview.render(self.last_frame, cam_w, cam_h)
 
-                            # Define center coordinates for the camera feed image
-                            cam_x, cam_y = 550, 200
-                            # Draw the new frame OVER the placeholder/previous frame
-                            # Ensure we use a specific tag to easily delete/update later if needed
-                            self.canvas.create_image(cam_x, cam_y, anchor=tk.CENTER, image=self.image_tk, tags="camera_feed")
+                            # The feed item is built with the screen; only the first frame needs an itemconfig
+                            if preview_tk is not self.image_tk:
+                                self.canvas.itemconfig(self.cam_feed_image_id, image=preview_tk, state="normal")
+                            self.image_tk = preview_tk # Keep reference
 
                         except Exception as e:
                             print(f"Error updating camera feed display: {e}")
@@ -507,28 +626,20 @@ class BlockGameApp:
     def on_close(self):
         """Releases resources and cleans up files when the window is closed."""
         print("Closing application...")
+        self.cancel_shutter_job()
         # Release camera
-        if self.capture and self.capture.isOpened():
+        if self.capture and self.capture.is_opened():
             self.capture.release()
             print("Camera released.")
+        # Finish writing any queued images before exiting
+        if hasattr(self, "image_writer"):
+            self.image_writer.close()
 
-        # Delete temporary capture files and potentially processed images
-        # It's safer to delete specific temp files than everything in output_dir
-        for i in range(2): # Assuming block numbers 0 and 1
-            temp_filename = f"temp_capture_{i}.jpg"
-            temp_path = os.path.join(self.output_dir, temp_filename)
-            if os.path.exists(temp_path):
-                try:
-                    os.remove(temp_path)
-                    print(f"Deleted: {temp_path}")
-                except Exception as e:
-                    print(f"Error deleting {temp_path}: {e}")
-            
-            # Optional: Clean up processed images if desired upon closing
-            # result_filename = f"result_house.png" # Example for house
-            # result_path = os.path.join(self.output_dir, result_filename)
-            # if os.path.exists(result_path):
-            #    # os.remove(result_path) ... and so on for car, trimmed versions
+        # Optional: Clean up processed images if desired upon closing
+        # result_filename = f"result_house.png" # Example for house
+        # result_path = os.path.join(self.output_dir, result_filename)
+        # if os.path.exists(result_path):
+        #    # os.remove(result_path) ... and so on for car, trimmed versions
 
         # Destroy the Tkinter window
         self.root.destroy()
@@ -554,7 +665,12 @@ if __name__ == "__main__":
     tome_car ="gray75"  # Stipple pattern for car button when not captured
 
     # Create and run the application
-    app = BlockGameApp(root)
+    # python car_game.py --rembg-model=u2netp --no-alpha-matting  (faster cutouts on slow PCs)
+    rembg_model = next((arg.split("=", 1)[1] for arg in sys.argv[1:] if arg.startswith("--rembg-model=")), "u2net")
+    # python car_game.py --cutout=colorkey  (or --cutout=rembg to always use rembg, --cutout=sam for SAM vit_b)
+    cutout_mode = next((arg.split("=", 1)[1] for arg in sys.argv[1:] if arg.startswith("--cutout=")), "grabcut")
+    app = BlockGameApp(root, rembg_model=rembg_model, alpha_matting="--no-alpha-matting" not in sys.argv[1:],
+                       cutout_mode=cutout_mode)
     # Set the close window protocol
     root.protocol("WM_DELETE_WINDOW", app.on_close)
     # Start the Tkinter main loop
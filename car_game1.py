@@ -4,8 +4,10 @@ from PIL import Image, ImageTk, ImageFont
 import cv2
 import numpy as np
 import os
-from ultralytics import YOLO
-from rembg import remove
+from camera_stream import CameraStream
+from model_loader import ModelLoader
+from model_export import DETECT_IMGSZ
+from background_remover import BackgroundRemover
 
 class BlockGameApp:
     def __init__(self, root):
@@ -19,14 +21,19 @@ class BlockGameApp:
         self.last_frame = None
         self.frame_count = 0
         self.captured_images = {"house": None, "cars": None}  # Store captured images for house and cars
-        self.capture = cv2.VideoCapture(0)
+        self.last_frame_seq = 0
+        self.capture = CameraStream(0).start()  # 読み込みは別スレッドで行う
 
-        if not self.capture.isOpened():
+        if not self.capture.is_opened():
             messagebox.showerror("Error", "Cannot access the camera")
             root.destroy()
 
-        # Load YOLO model
-        self.model = YOLO('bestbest.pt')
+        # Load YOLO model (in the background, with a warm-up inference; the shutter waits for it)
+        self.model = None
+        self.model_loader = ModelLoader(self.root, 'bestbest.pt', on_ready=self._on_model_ready, on_error=self._on_model_error,
+                                        frame_source=self.capture.read_latest, imgsz=DETECT_IMGSZ).start()
+        # 背景除去は rembg のセッションを1つだけ作って使い回す (軽くしたいときは model="u2netp")
+        self.bg_remover = BackgroundRemover(model="u2net").start()
 
         # Output directory for processed images
         self.output_dir = "output_images"
@@ -156,14 +163,24 @@ class BlockGameApp:
             elif 50 <= x <= 200 and 500 <= y <= 550:
                 self.draw_main_screen()  # メインページに戻る
 
+    def _on_model_ready(self, model):
+        self.model = model
+
+    def _on_model_error(self, error):
+        messagebox.showerror("Error", f"Failed to load YOLO model 'bestbest.pt': {error}")
+        self.on_close()
+
     def capture_shutter(self):
+        if not self.model_loader.ready:
+            self.canvas.itemconfig(self.message_id, text="準備中... ちょっと待ってね")
+            return
         if self.last_frame is not None:
             filename = f"captured_image_{self.blocknumber}.jpg"
             cv2.imwrite(filename, self.last_frame)
             print(f"Image saved: {filename}")
 
             # YOLOモデルの適用
-            results = self.model(filename)
+            results = self.model(filename, imgsz=DETECT_IMGSZ)
 
             # 信頼値のしきい値
             confidence_threshold = 0.5  # ここでしきい値を設定
@@ -191,14 +208,9 @@ class BlockGameApp:
                     # 検出されたオブジェクトを切り抜き
                     cropped = Image.open(filename).crop((x1, y1, x2, y2))
 
-                    # 背景を削除
-                    temp_path = os.path.join(self.output_dir, f"temp_{object_type}_{i}.jpg")
-                    cropped.save(temp_path, "JPEG")
-                    with open(temp_path, "rb") as input_file:
-                        output_data = remove(input_file.read())
+                    # 背景を削除 (一時ファイルを通さず、PIL 画像をそのまま渡す)
                     output_path = os.path.join(self.output_dir, f"result_{object_type}_{i}.png")
-                    with open(output_path, "wb") as output_file:
-                        output_file.write(output_data)
+                    self.bg_remover.remove(cropped).save(output_path, "PNG")
 
                     # 検出結果を保存
                     self.captured_images[object_type] = output_path
@@ -211,9 +223,10 @@ class BlockGameApp:
                 self.canvas.itemconfig(self.message_id, text="物体が検知されません！")
 
     def update_frame(self):
-        if self.capture.isOpened():
-            ret, frame = self.capture.read()
-            if ret:
+        if self.capture.is_opened() and self.capture.frame_seq != self.last_frame_seq:
+            self.last_frame_seq = self.capture.frame_seq
+            frame = self.capture.read_latest()  # 最新フレームをブロックせずに取得
+            if frame is not None:
                 self.frame_count += 1
                 if self.frame_count % 5 == 0:  # Update every 5 frames
                     self.last_frame = frame
@@ -4,8 +4,11 @@ from PIL import Image, ImageTk, ImageFont
 import cv2
 import numpy as np
 import os
-from ultralytics import YOLO
-from rembg import remove
+from camera_stream import CameraStream
+from model_loader import ModelLoader
+from model_export import DETECT_IMGSZ
+from background_remover import BackgroundRemover
+from alpha_trim import trim_alpha
 
 class BlockGameApp:
     def __init__(self, root):
@@ -19,14 +22,19 @@ class BlockGameApp:
         self.last_frame = None
         self.frame_count = 0
         self.captured_images = {"house": None, "cars": None}  # Store captured images for house and cars
-        self.capture = cv2.VideoCapture(0)
+        self.last_frame_seq = 0
+        self.capture = CameraStream(0).start()  # 読み込みは別スレッドで行う
 
-        if not self.capture.isOpened():
+        if not self.capture.is_opened():
             messagebox.showerror("Error", "Cannot access the camera")
             root.destroy()
 
-        # Load YOLO model
-        self.model = YOLO('bestbest.pt')
+        # Load YOLO model (in the background, with a warm-up inference; the shutter waits for it)
+        self.model = None
+        self.model_loader = ModelLoader(self.root, 'bestbest.pt', on_ready=self._on_model_ready, on_error=self._on_model_error,
+                                        frame_source=self.capture.read_latest, imgsz=DETECT_IMGSZ).start()
+        # 背景除去は rembg のセッションを1つだけ作って使い回す (軽くしたいときは model="u2netp")
+        self.bg_remover = BackgroundRemover(model="u2net").start()
 
         # Output directory for processed images
         self.output_dir = "output_images"
@@ -156,14 +164,24 @@ class BlockGameApp:
             elif 50 <= x <= 200 and 500 <= y <= 550:
                 self.draw_main_screen()  # メインページに戻る
 
+    def _on_model_ready(self, model):
+        self.model = model
+
+    def _on_model_error(self, error):
+        messagebox.showerror("Error", f"Failed to load YOLO model 'bestbest.pt': {error}")
+        self.on_close()
+
     def capture_shutter(self):
+        if not self.model_loader.ready:
+            self.canvas.itemconfig(self.message_id, text="準備中... ちょっと待ってね")
+            return
         if self.last_frame is not None:
             filename = f"captured_image_{self.blocknumber}.jpg"
             cv2.imwrite(filename, self.last_frame)
             print(f"Image saved: {filename}")
 
             # YOLOモデルの適用
-            results = self.model(filename)
+            results = self.model(filename, imgsz=DETECT_IMGSZ)
 
             # 信頼値のしきい値
             confidence_threshold = 0.5  # ここでしきい値を設定
@@ -191,14 +209,19 @@ class BlockGameApp:
                     # 検出されたオブジェクトを切り抜き
                     cropped = Image.open(filename).crop((x1, y1, x2, y2))
 
-                    # 背景を削除
-                    temp_path = os.path.join(self.output_dir, f"temp_{object_type}_{i}.jpg")
-                    cropped.save(temp_path, "JPEG")
-                    with open(temp_path, "rb") as input_file:
-                        output_data = remove(input_file.read())
-                    output_path = os.path.join(self.output_dir, f"result_{object_type}_{i}.png")
-                    with open(output_path, "wb") as output_file:
-                        output_file.write(output_data)
+                    # 背景を削除 (一時ファイルを通さず、PIL 画像をそのまま渡す)
+                    removed = self.bg_remover.remove(cropped)
+
+                    # 透過部分をメモリ上でトリミングし、最終的な画像だけを保存する
+                    trimmed = trim_alpha(removed)
+                    if trimmed is not None:
+                        output_path = os.path.join(self.output_dir, f"trimmed_{object_type}_{i}.png")
+                        trimmed.save(output_path, "PNG")
+                        print(f"Trimmed image saved: {output_path}")
+                    else:
+                        print(f"Trimming failed for {object_type}. Using untrimmed version.")
+                        output_path = os.path.join(self.output_dir, f"result_{object_type}_{i}.png")
+                        removed.save(output_path, "PNG")
 
                     # 検出結果を保存
                     self.captured_images[object_type] = output_path
@@ -211,9 +234,10 @@ class BlockGameApp:
                 self.canvas.itemconfig(self.message_id, text="物体が検知されません！")
 
     def update_frame(self):
-        if self.capture.isOpened():
-            ret, frame = self.capture.read()
-            if ret:
+        if self.capture.is_opened() and self.capture.frame_seq != self.last_frame_seq:
+            self.last_frame_seq = self.capture.frame_seq
+            frame = self.capture.read_latest()  # 最新フレームをブロックせずに取得
+            if frame is not None:
                 self.frame_count += 1
                 if self.frame_count % 5 == 0:  # Update every 5 frames
                     self.last_frame = frame
@@ -253,51 +277,3 @@ font_subject = font.Font(family="ＭＳ ゴシック", size=20)
 app = BlockGameApp(root)
 root.protocol("WM_DELETE_WINDOW", app.on_close)
 root.mainloop()
-   from PIL import Image
-
-    def trim_transparent_area(input_path, output_path):
-        """
-        PNG画像の透過部分をトリミングし、物体ができるだけ大きくなるようにトリミングします。
-        物体の形に合わせた矩形サイズで保存します。
-
-        Args:
-            input_path (str): トリミング対象の画像パス。
-            output_path (str): トリミング後の画像を保存するパス。
-
-        Returns:
-            Image or None: トリミング後の画像（成功した場合はImageオブジェクト、失敗した場合はNone）。
-        """
-        try:
-            # 入力画像を開く
-            img = Image.open(input_path).convert("RGBA")
-
-            # アルファチャンネルを使って非透過部分の範囲を取得
-            bbox = img.getbbox()
-
-            if bbox:
-                # 物体部分をトリミング
-                img_cropped = img.crop(bbox)
-                
-                # 保存
-                img_cropped.save(output_path, "PNG")
-                print(f"Trimmed image saved: {output_path}")
-                return img_cropped  # トリミング後の画像を返す
-            else:
-                print("No non-transparent pixels found in the image.")
-                return None
-
-        except Exception as e:
-            print(f"Error trimming transparent image: {e}")
-            return None
-
-            
-                    # トリミング後の画像パス
-                    trimmed_output_path = os.path.join(self.output_dir, f"trimmed_{object_type}_{i}.png")
-
-                    # 透過部分をトリミング
-                    if self.trim_transparent_area(output_path, trimmed_output_path):
-                        # トリミング後の画像パスを保存
-                        self.captured_images[object_type] = trimmed_output_path
-                    else:
-                        print(f"Trimming failed for {output_path}")
-
@@ -0,0 +1,102 @@
+# detection_voter.py
+import math
+import time
+
+
+class DetectionVoter:
+    """
+    推論結果をまたいでクラスごとの信頼度を時間で積分し、十分たまったクラスを「認識した」と判定するクラス。
+    推論と推論のあいだの時間に、その両端で見えていた信頼度 (平均) を掛けて足すので、
+    同じ国旗を同じ時間見せれば、推論が速くても遅くても (フレームレートに関係なく) ほぼ同じ時間で認識する。
+    積み上げた値は時間 (秒) で指数的に減衰する。1回見落としても積み上げがゼロに戻ることはない。
+
+    half_life:                 積み上げた値が半分になるまでの秒数
+    threshold:                 これを超えたクラスを認識したとみなす (信頼度 x 秒。信頼度 1.0 で約 threshold 秒)
+                               ずっと信頼度 c で見えているときの上限は c * half_life / ln2 なので、
+                               min_confidence でも届くように threshold はそれより小さくすること
+    min_confidence:            これより低い検出は数えない
+    early_exit_confidence:     この信頼度以上の検出が early_exit_time 秒続いたら、積み上げを待たずに認識する
+    """
+
+    def __init__(self, half_life=2.0, threshold=0.7, min_confidence=0.4,
+                 early_exit_confidence=0.85, early_exit_time=0.4):
+        self.half_life = half_life
+        self.threshold = threshold
+        self.min_confidence = min_confidence
+        self.early_exit_confidence = early_exit_confidence
+        self.early_exit_time = early_exit_time
+        self.reset()
+
+    def reset(self, now=None):
+        """積み上げを捨てて、認識までの時間の計測を始め直す。"""
+        self.scores = {}  # クラス名 -> 積み上げた信頼度 x 秒
+        self.started_at = time.perf_counter() if now is None else now
+        self.last_update = self.started_at
+        self._last_confidences = {}  # 前回の推論で数えたクラス名 -> 信頼度
+        self._streak_class = None
+        self._streak_since = None
+        self.decided = None
+        self.time_to_recognize = None  # reset から認識までの秒数
+
+    def update(self, confidences, now=None):
+        """
+        1回分の推論結果 {クラス名: 信頼度} を加える。認識したらそのクラス名、まだなら None を返す。
+        同じクラスが複数あるときは一番高い信頼度を渡すこと。何も検出しなかったときは {} を渡す。
+        now は推論したフレームの時刻 (省略すると呼んだ時刻)。
+        """
+        now = time.perf_counter() if now is None else now
+        if self.decided is not None:
+            return self.decided
+
+        # 前回からの経過時間の分だけ減衰させる
+        elapsed = max(0.0, now - self.last_update)
+        self.last_update = now
+        decay = math.exp(-math.log(2) * elapsed / self.half_life)
+        for name in list(self.scores):
+            self.scores[name] *= decay
+            if self.scores[name] < 1e-3:
+                del self.scores[name]
+
+        # 前回と今回の両方で見えていたクラスに、そのあいだの時間の分を足す。
+        # 区間の中でも減衰するので、信頼度 x (1 - decay) x half_life / ln2 (区間が短ければ 信頼度 x elapsed)
+        weight = (1.0 - decay) * self.half_life / math.log(2)
+        current = {name: conf for name, conf in confidences.items() if conf >= self.min_confidence}
+        for name, conf in current.items():
+            previous = self._last_confidences.get(name)
+            if previous is not None:
+                self.scores[name] = self.scores.get(name, 0.0) + 0.5 * (previous + conf) * weight
+        self._last_confidences = current
+
+        # とても確かな検出が early_exit_time 秒続いたら早めに決める
+        top_name = max(current, key=current.get) if current else None
+        if top_name is not None and current[top_name] >= self.early_exit_confidence:
+            if top_name != self._streak_class:
+                self._streak_class, self._streak_since = top_name, now
+            elif now - self._streak_since >= self.early_exit_time:
+                return self._decide(top_name, now)
+        else:
+            self._streak_class, self._streak_since = None, None
+
+        leader, score = self.leader()
+        if leader is not None and score >= self.threshold:
+            return self._decide(leader, now)
+        return None
+
+    def _decide(self, name, now):
+        self.decided = name
+        self.time_to_recognize = now - self.started_at
+        return name
+
+    def leader(self):
+        """いま一番積み上がっているクラスとその値 (なければ (None, 0.0))。"""
+        if not self.scores:
+            return None, 0.0
+        name = max(self.scores, key=self.scores.get)
+        return name, self.scores[name]
+
+    def progress(self):
+        """先頭のクラスが認識にどれだけ近いか (0.0 - 1.0)。画面表示用。"""
+        if self.decided is not None:
+            return 1.0
+        _, score = self.leader()
+        return min(1.0, score / self.threshold)
@@ -0,0 +1,64 @@
+# flag_overlay.py
+import os
+
+from PIL import Image
+
+# alpha -> point() 用のルックアップテーブル (RGBA 4バンド分)
+_lut_cache = {}
+
+
+def _fade_lut(alpha):
+    lut = _lut_cache.get(alpha)
+    if lut is None:
+        identity = list(range(256))
+        faded = [min(255, int(round(p * alpha))) for p in range(256)]
+        # R, G, B はそのまま、A だけ alpha 倍
+        lut = identity * 3 + faded
+        _lut_cache[alpha] = lut
+    return lut
+
+
+def fade_alpha(img, alpha):
+    """
+    画像のアルファ値を alpha 倍した RGBA 画像を返す (alpha=0.4 なら 40%)。
+    split() / putalpha() を使わず、事前に作ったテーブルで全バンドを1回で変換する。
+    """
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+    return img.point(_fade_lut(alpha))
+
+
+class FlagOverlayRenderer:
+    """
+    詳細画面の背景に使う「薄くした国旗」を作るクラス。
+    結果は (国, alpha) ごとに AssetCache に保持され、2回目以降は作り直さない。
+    """
+
+    def __init__(self, assets, size=(800, 600), resample=Image.Resampling.BICUBIC, image_dir="image"):
+        self.assets = assets
+        self.size = size
+        self.resample = resample
+        self.image_dir = image_dir
+
+    def path_for(self, country):
+        """国旗画像のパス。png がなければ jpg を使う。"""
+        path = f"{self.image_dir}/{country}.png"
+        if not os.path.exists(path):
+            path = f"{self.image_dir}/{country}.jpg"
+        return path
+
+    def key_for(self, country, alpha):
+        return self.assets.make_key(self.path_for(country), self.size, self.resample, alpha)
+
+    def get(self, country, alpha=0.4):
+        """薄くした国旗の PIL 画像を返す。"""
+        return self.assets.get(*self.key_for(country, alpha))
+
+    def photo(self, country, alpha=0.4):
+        """薄くした国旗の PhotoImage を返す。Tk のメインスレッドから呼ぶこと。"""
+        return self.assets.photo(*self.key_for(country, alpha))
+
+    def pregenerate(self, countries, alpha=0.4):
+        """指定した国の分をバックグラウンドで先に作っておく。"""
+        keys = [self.key_for(country, alpha) for country in countries]
+        return self.assets.prewarm([key for key in keys if os.path.exists(key[0])])
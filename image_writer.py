@@ -0,0 +1,163 @@
+# image_writer.py
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+FORMATS = ("png", "jpeg", "webp", "qoi")
+EXTENSIONS = {"png": ".png", "jpeg": ".jpg", "webp": ".webp", "qoi": ".qoi"}
+
+
+def _format_for(path):
+    ext = os.path.splitext(path)[1].lower()
+    for fmt, fmt_ext in EXTENSIONS.items():
+        if ext == fmt_ext or (fmt == "jpeg" and ext == ".jpeg"):
+            return fmt
+    raise ValueError(f"Unsupported image extension: {path}")
+
+
+class ImageWriter:
+    """
+    出力画像を書き出す専用スレッド。write() はキューに入れるだけですぐ戻り、
+    エンコードとディスクへの書き込みはワーカースレッドで行う。
+    一時ファイル (<path>.tmp) に書いてから os.replace で名前を変えるので、途中まで書いたファイルは残らない。
+    キューは max_pending 枚まで。いっぱいのときは write() が空くまで待つ (メモリを使い切らないため)。
+
+    png_compress_level: 0-9。大きいほど小さいファイルで遅い (PIL の標準は 6。1 でも十分小さく、かなり速い)
+    jpeg_quality:       0-100
+    webp_quality:       0-100 (webp_lossless=True なら無視される)
+    output_format:      None なら path の拡張子のまま。"webp" / "qoi" などにすると拡張子ごと置き換える
+                        (qoi は pip install qoi が必要)
+    """
+
+    def __init__(self, max_pending=8, png_compress_level=1, jpeg_quality=90, webp_quality=90,
+                 webp_lossless=False, output_format=None, on_error=None):
+        if output_format is not None and output_format not in FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}'. Choose from {', '.join(FORMATS)}")
+        self.png_compress_level = png_compress_level
+        self.jpeg_quality = jpeg_quality
+        self.webp_quality = webp_quality
+        self.webp_lossless = webp_lossless
+        self.output_format = output_format
+        self.on_error = on_error  # on_error(path, error) をワーカースレッドで呼ぶ
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._discarded = set()  # 書く前に取り消されたパス
+        self._lock = threading.Lock()
+        self.written = 0
+        self.errors = []  # [(path, error), ...]
+        self.write_time = 0.0  # エンコードと書き込みにかかった秒数の合計
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="ImageWriter", daemon=True)
+        self._thread.start()
+
+    def target_path(self, path):
+        """output_format を反映した、実際に書き出すパス。"""
+        if self.output_format is None:
+            return path
+        return os.path.splitext(path)[0] + EXTENSIONS[self.output_format]
+
+    def write(self, image, path):
+        """
+        image (PIL 画像、または cv2 の BGR / BGRA 配列) を書き出すようキューに入れ、実際のパスを返す。
+        書き終わる前に image を書き換えないこと。
+        """
+        if self._closed:
+            raise RuntimeError("ImageWriter is closed")
+        path = self.target_path(path)
+        with self._lock:
+            self._discarded.discard(path)
+        self._queue.put((image, path))
+        return path
+
+    def discard(self, path):
+        """path を取り消す。まだ書いていなければ書かず、書き終わっていれば消す。"""
+        path = self.target_path(path)
+        with self._lock:
+            self._discarded.add(path)
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Warning: could not delete {path}: {e}")
+
+    def _encode(self, image, path, fmt):
+        if fmt == "qoi":
+            import qoi  # 使うときだけ必要
+
+            if isinstance(image, Image.Image):
+                array = np.asarray(image.convert("RGBA" if "A" in image.getbands() else "RGB"))
+            else:
+                code = cv2.COLOR_BGRA2RGBA if image.ndim == 3 and image.shape[2] == 4 else cv2.COLOR_BGR2RGB
+                array = cv2.cvtColor(image, code)
+            qoi.write(path, np.ascontiguousarray(array))
+            return
+
+        if isinstance(image, Image.Image):
+            if fmt == "png":
+                image.save(path, "PNG", compress_level=self.png_compress_level)
+            elif fmt == "jpeg":
+                image.convert("RGB").save(path, "JPEG", quality=self.jpeg_quality)
+            else:
+                image.save(path, "WEBP", quality=self.webp_quality, lossless=self.webp_lossless)
+            return
+
+        params = {
+            "png": [cv2.IMWRITE_PNG_COMPRESSION, self.png_compress_level],
+            "jpeg": [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality],
+            "webp": [cv2.IMWRITE_WEBP_QUALITY, 101 if self.webp_lossless else self.webp_quality],
+        }[fmt]
+        ok, encoded = cv2.imencode(EXTENSIONS[fmt], image, params)
+        if not ok:
+            raise IOError(f"Failed to encode {path}")
+        with open(path, "wb") as f:
+            f.write(encoded.tobytes())
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                image, path = item
+                with self._lock:
+                    if path in self._discarded:
+                        continue
+                start = time.perf_counter()
+                tmp_path = path + ".tmp"
+                try:
+                    self._encode(image, tmp_path, _format_for(path))
+                    with self._lock:
+                        if path in self._discarded:
+                            os.remove(tmp_path)
+                            continue
+                        os.replace(tmp_path, path)
+                    self.written += 1
+                except Exception as e:
+                    print(f"Error writing {path}: {e}")
+                    self.errors.append((path, e))
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    if self.on_error is not None:
+                        self.on_error(path, e)
+                self.write_time += time.perf_counter() - start
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """キューに入っている画像をすべて書き終えるまで待つ。"""
+        self._queue.join()
+
+    def close(self):
+        """残りを書き終えてからスレッドを止める。終了時に呼ぶ。"""
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+        self._queue.put(None)
+        self._thread.join(timeout=5.0)
+        print(f"Image writer: {self.written} written, {len(self.errors)} errors, {self.write_time:.2f}s encoding")
@@ -0,0 +1,119 @@
+# inference_scheduler.py
+import time
+
+import cv2
+import numpy as np
+
+
+class InferenceScheduler:
+    """
+    カメラのフレームごとに「いま推論するか」を決めるクラス。固定の「10フレームごと」の代わりに使う。
+
+    - フレームを小さな白黒画像に縮小し、最後に推論したフレームとの差 (画素の平均差) を測る。
+      差が motion_threshold を超えたら (国旗が出てきたなど)、間隔を待たずにすぐ推論する。
+    - 何も検出していない状態で画面が変わらなければ推論しない (idle_interval 秒ごとにだけ確かめる)。
+    - 検出中 (何かが映っている) のときは、止まっていても interval ごとに推論を続ける (投票を進めるため)。
+    - interval は推論にかかった時間に合わせて伸び縮みする。推論が遅い (CPU が足りない) ときは
+      推論の割合が max_duty を超えないように間隔を空け、ワーカーが推論中ならそのフレームは渡さない。
+      ただし max_interval より空けることはない。DetectionVoter と組み合わせるときは、
+      認識が間隔1つ分まで遅れるので max_interval を投票の half_life より十分短くすること。
+
+    メインスレッドからだけ呼ぶこと。
+    """
+
+    def __init__(self, min_interval=0.2, max_interval=1.0, idle_interval=2.0, max_duty=0.5,
+                 motion_threshold=6.0, thumb_size=(64, 48)):
+        self.min_interval = min_interval      # 推論の間隔の下限 (秒)
+        self.max_interval = max_interval      # CPU が足りないときに空ける間隔の上限 (秒)
+        self.idle_interval = idle_interval    # 画面が変わらないときに念のため推論する間隔 (秒)
+        self.max_duty = max_duty              # 時間のうち推論に使ってよい割合
+        self.motion_threshold = motion_threshold  # 変化ありとみなす平均画素差 (0-255)
+        self.thumb_size = thumb_size
+
+        # 縮小画像のバッファは使い回す
+        self._small = np.empty((thumb_size[1], thumb_size[0], 3), dtype=np.uint8)
+        self._gray = np.empty((thumb_size[1], thumb_size[0]), dtype=np.uint8)
+        self._reference = np.empty_like(self._gray)
+        self._diff = np.empty_like(self._gray)
+        self.interval = min_interval
+        self.reset()
+
+    def reset(self):
+        """画面に入ったときに呼ぶ。次のフレームはすぐ推論する。統計もゼロに戻す。"""
+        self._has_reference = False
+        self._last_submit = None
+        self.active = False  # 直近の推論で何か検出したか
+        self.last_motion = 0.0
+        self.frames = 0
+        self.submitted = 0
+        self.skipped_static = 0  # 画面が変わらないので推論しなかったフレーム数
+        self.skipped_wait = 0    # 間隔を空けるため推論しなかったフレーム数
+        self.skipped_busy = 0    # ワーカーが推論中だったので渡さなかったフレーム数
+        self._started_at = time.perf_counter()
+
+    def _motion(self, frame):
+        """最後に推論したフレームとの平均画素差。"""
+        cv2.resize(frame, self.thumb_size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        if not self._has_reference:
+            return float("inf")
+        cv2.absdiff(self._gray, self._reference, dst=self._diff)
+        return float(cv2.mean(self._diff)[0])
+
+    def _adapt(self, last_inference_time):
+        """推論にかかった時間から間隔を決める (推論の割合が max_duty 以下になるように)。"""
+        if last_inference_time > 0:
+            wanted = last_inference_time / self.max_duty
+            self.interval = min(self.max_interval, max(self.min_interval, wanted))
+
+    def should_infer(self, frame, worker, now=None):
+        """このフレームを推論するなら True を返す (True のときは必ずワーカーに渡すこと)。"""
+        now = time.perf_counter() if now is None else now
+        self.frames += 1
+        self._adapt(worker.last_inference_time)
+
+        if worker.busy:
+            self.skipped_busy += 1
+            return False
+
+        self.last_motion = self._motion(frame)
+        elapsed = float("inf") if self._last_submit is None else now - self._last_submit
+        if self.last_motion >= self.motion_threshold:
+            # 新しい物が映った: 最低限の間隔だけ守ってすぐ推論する
+            due = elapsed >= self.min_interval
+        elif self.active:
+            due = elapsed >= self.interval
+        else:
+            due = elapsed >= self.idle_interval
+            if not due:
+                self.skipped_static += 1
+                return False
+
+        if not due:
+            self.skipped_wait += 1
+            return False
+
+        np.copyto(self._reference, self._gray)
+        self._has_reference = True
+        self._last_submit = now
+        self.submitted += 1
+        return True
+
+    def note_result(self, detected):
+        """推論結果が届いたら呼ぶ。何か検出していれば、止まっていても推論を続ける。"""
+        self.active = detected
+
+    def stats(self):
+        """いまの間隔とスキップ率など。"""
+        elapsed = max(1e-6, time.perf_counter() - self._started_at)
+        skipped = self.frames - self.submitted
+        return {
+            "interval_ms": round(self.interval * 1000.0, 1),
+            "inference_hz": round(self.submitted / elapsed, 2),
+            "frames": self.frames,
+            "submitted": self.submitted,
+            "skip_rate": round(skipped / self.frames, 3) if self.frames else 0.0,
+            "skipped_static": self.skipped_static,
+            "skipped_wait": self.skipped_wait,
+            "skipped_busy": self.skipped_busy,
+        }
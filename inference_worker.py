@@ -0,0 +1,87 @@
+# inference_worker.py
+import threading
+import time
+
+
+class InferenceWorker:
+    """
+    YOLO 推論をバックグラウンドスレッドで実行するワーカー。
+    受け口は「最新の1枚だけ」を保持する1スロットのメールボックスで、
+    推論中に届いた古いフレームは新しいフレームで上書きされる。
+    結果は root.after 経由で Tk のメインスレッドに返す。
+    結果と一緒に、推論したフレームとその通し番号も返す (結果が届くころには画面のフレームは先に進んでいるため)。
+    """
+
+    def __init__(self, root, model, on_result, lock=None, preprocess=None, **model_kwargs):
+        self.root = root
+        self.model = model
+        self.on_result = on_result  # on_result(tag, results, frame_seq, frame) をメインスレッドで呼ぶ
+        # 同じモデルを他のスレッドでも使う場合に共有するロック
+        self.lock = lock if lock is not None else threading.Lock()
+        # 推論の前にワーカースレッドでフレームに適用する処理 (Letterbox など)。結果の座標はその出力の座標になる
+        self.preprocess = preprocess
+        self.model_kwargs = model_kwargs
+        self.model_kwargs.setdefault("verbose", False)
+
+        self._cond = threading.Condition()
+        self._pending = None  # (tag, frame, frame_seq) または None
+        self._running = True
+        self.busy = False
+        self.last_inference_time = 0.0  # 直近の推論にかかった秒数
+        self.dropped_frames = 0  # 上書きされて推論されなかったフレーム数
+
+        self._thread = threading.Thread(target=self._run, name="InferenceWorker", daemon=True)
+        self._thread.start()
+
+    def submit(self, frame, tag=None, frame_seq=None):
+        """
+        フレームをメールボックスに入れる（ブロックしない）。
+        frame は結果と一緒に返すので、推論が終わるまで書き換えないこと。
+        """
+        with self._cond:
+            if self._pending is not None:
+                self.dropped_frames += 1
+            self._pending = (tag, frame, frame_seq)
+            self._cond.notify()
+
+    def clear(self):
+        """まだ推論していないフレームを捨てる。"""
+        with self._cond:
+            self._pending = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and self._pending is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                tag, frame, frame_seq = self._pending
+                self._pending = None
+                self.busy = True
+
+            start = time.perf_counter()
+            try:
+                model_input = self.preprocess(frame) if self.preprocess is not None else frame
+                with self.lock:
+                    results = self.model(model_input, **self.model_kwargs)
+            except Exception as e:
+                print(f"Error during background inference: {e}")
+                results = None
+            self.last_inference_time = time.perf_counter() - start
+            self.busy = False
+
+            if not self._running:
+                return
+            try:
+                self.root.after(0, self.on_result, tag, results, frame_seq, frame)
+            except RuntimeError:
+                # メインループが既に終了している
+                return
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._pending = None
+            self._cond.notify()
+        self._thread.join(timeout=1.0)
@@ -1,7 +1,14 @@
 import tkinter as tk
 from tkinter import font
-from PIL import Image, ImageTk
+from PIL import Image
 import os # ファイルの存在確認のために追加
+import sys
+
+# リポジトリ直下の共有モジュール (asset_cache など) を読み込めるようにする
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from asset_cache import AssetCache, DEFAULT_BUNDLE_DIR
+from build_assets import expand_specs
+from flag_overlay import FlagOverlayRenderer
 
 class CountryDetailApp:
     def __init__(self, root):
@@ -29,6 +36,12 @@ class CountryDetailApp:
         self.image_refs = []
         self.background_flag_tk = None # 背景の国旗画像参照用
 
+        # リサイズ済み画像のキャッシュ。事前リサイズ済みの画像を裏で読み込んでおく
+        self.assets = AssetCache(self.root, bundle_dir=DEFAULT_BUNDLE_DIR)
+        self.assets.prewarm(expand_specs("detail2"))
+        # 背景の薄い国旗は国ごとに一度だけ作る (全部の国の分を裏で用意しておく)
+        self.flag_overlays = FlagOverlayRenderer(self.assets, resample=Image.Resampling.LANCZOS)
+
         # --- 国のデータ構造化 ---
         self.countries_data = {
             "Japan": {
@@ -135,6 +148,8 @@ class CountryDetailApp:
             },
         }
 
+        self.flag_overlays.pregenerate(self.countries_data.keys(), alpha=0.4)
+
         self.current_country_key = list(self.countries_data.keys())[0] # 初期表示の国 (例: Japan)
         self.current_detail_index = 0 # 各国の説明のインデックス
 
@@ -221,19 +236,12 @@ class CountryDetailApp:
         detail = country_data["details"][self.current_detail_index]
 
         # --- 背景国旗の表示 ---
-        flag_bg_path = f"image/{country_key}.png" # 国旗画像パスの例。ファイル構成に合わせて変えてください。
-        if not os.path.exists(flag_bg_path):
-             # .jpg も試す
-            flag_bg_path = f"image/{country_key}.jpg"
+        flag_bg_path = self.flag_overlays.path_for(country_key) # image/{国}.png、なければ .jpg
 
         if os.path.exists(flag_bg_path):
             try:
-                flag_bg_img = Image.open(flag_bg_path).resize((800,600), Image.Resampling.LANCZOS).convert("RGBA")
-                # 透明度を下げる（アルファ値を調整）
-                alpha = flag_bg_img.split()[3].point(lambda p: p * 0.4) # 0.4は透明度調整。0=透明,1=不透明
-                flag_bg_img.putalpha(alpha)
-
-                self.background_flag_tk = ImageTk.PhotoImage(flag_bg_img)
+                # 透明度を下げた（アルファ値を調整した）国旗を取得。作成済みならキャッシュから返る
+                self.background_flag_tk = self.flag_overlays.photo(country_key, alpha=0.4) # 0.4は透明度調整。0=透明,1=不透明
                 self.image_refs.append(self.background_flag_tk) # 参照を保持
 
                 # 既存の背景画像アイテムを更新
@@ -254,9 +262,7 @@ class CountryDetailApp:
         image_path = detail["image"]
         if os.path.exists(image_path):
             try:
-                img = Image.open(image_path)
-                img.thumbnail((300, 300), Image.Resampling.LANCZOS) # 画像サイズ調整
-                img_tk = ImageTk.PhotoImage(img)
+                img_tk = self.assets.photo(image_path, (300, 300), Image.Resampling.LANCZOS, thumbnail=True) # 画像サイズ調整
                 self.image_refs.append(img_tk) # 新しい参照を保持
                 self.canvas.itemconfig(self.image_display_id, image=img_tk)
             except Exception as e:
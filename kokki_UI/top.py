@@ -1,29 +1,50 @@
+import time
+STARTED_AT = time.perf_counter() # 起動時間の計測用 (import の時間も含める)
 import tkinter as tk
 from tkinter import messagebox, font
 from PIL import Image, ImageTk
 import cv2
 import numpy as np
 import os
-from ultralytics import YOLO
-from rembg import remove
-import time
-import io
 import shutil
 from Audio import Audio
 import random
-from modutest import play_video_once,run_simple_video_player_app
 import threading
-import subprocess
 import stat
+import sys
+
+# リポジトリ直下の共有モジュール (camera_stream など) を読み込めるようにする
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from camera_stream import CameraStream
+from inference_worker import InferenceWorker
+from model_loader import ModelLoader
+from model_export import DETECT_IMGSZ
+from letterbox import Letterbox
+from detection_voter import DetectionVoter
+from inference_scheduler import InferenceScheduler
+from box_tracker import BoxTracker
+from burst_capture import select_sharpest
+from shutter_job import ShutterJob, StageFailed
+from asset_cache import AssetCache, DEFAULT_BUNDLE_DIR
+from build_assets import expand_specs
+from flag_overlay import FlagOverlayRenderer
+from preview_renderer import PreviewRenderer
+from screen_layers import ScreenLayers
+from startup_timer import StartupTimer
+from image_writer import ImageWriter
 
 
 class BlockGameApp:
 
-    def __init__(self, root):
+    def __init__(self, root, quantized=False):
         self.root = root
+        # 起動時間の内訳 (モデルの準備ができたときに表示して startup_times.csv に追記する)
+        self.startup_timer = StartupTimer("kokki_UI", started_at=STARTED_AT, log_path="startup_times.csv")
+        self.startup_timer.mark("imports")
         self.root.title("LEGOOOOOo")
         self.audio = Audio()
         self.preview_paste_info = {'x': 0, 'y': 0, 'w': 0, 'h': 0} # プレビュー描画オフセットと実サイズ
+        self.preview = PreviewRenderer() # カメラプレビュー用 (バッファと PhotoImage を使い回す)
 
         # --- Configuration ---
         self.flag_map = {
@@ -37,72 +58,109 @@ class BlockGameApp:
 
         # Stores the PATH to the final processed image, or None
         self.captured_images = {flag: None for flag in self.flag_map.values()}
+        # キャプチャ時に作ったサムネイルの PhotoImage {"button": メイン画面用, "result": 結果画面用}
+        # メイン画面に戻るたびにファイルを読み直さないよう、撮り直しかリセットまで保持する
+        self.captured_thumbnails = {flag: None for flag in self.flag_map.values()}
+        self.flag_button_thumbnail_size = (240 - 10, top_position2 - top_position1 - 10) # 国旗ボタンの大きさ - 余白
+        self.result_thumbnail_size = (250, 250)
+        self.model_status_id = None
 
         # Initial setup
         self.current_screen = "main"
         self.blocknumber = None # Index (0-5) of the flag being processed
         self.last_frame = None
         self.frame_count = 0
+        self.last_frame_seq = 0 # 最後に処理したカメラフレームの通し番号
 
         self.image_refs = []
+        # デコード・リサイズ済み画像のキャッシュ (全画面で共有)
+        # build_assets.py で作った事前リサイズ済み画像があればそれを使い、起動時に裏で読み込んでおく
+        self.assets = AssetCache(self.root, bundle_dir=DEFAULT_BUNDLE_DIR)
+        self.assets.prewarm(expand_specs("kokki_UI"))
+        # 詳細画面の薄い国旗は (国, 透明度) ごとに一度だけ作り、全部の国の分を裏で用意しておく
+        self.flag_overlays = FlagOverlayRenderer(self.assets)
+        self.flag_overlays.pregenerate(self.flag_map.values(), alpha=0.4)
 
         # Output directory for processed images
         self.output_dir = "output_images"
         os.makedirs(self.output_dir, exist_ok=True)
+        # 撮った画像の書き出しは専用スレッドで行う (on_close で書き終わるのを待つ)
+        self.image_writer = ImageWriter(jpeg_quality=90)
 
         # --- Camera Setup ---
-        self.capture = cv2.VideoCapture(0, cv2.CAP_DSHOW)#高速バックエンドらしい
-        if not self.capture.isOpened():
+        # 読み込みは専用スレッドで行い、UI側は最新フレームを取り出すだけにする
+        # シャッター時に直前の数フレームを見比べるので、リングバッファは少し大きめにする
+        self.camera = CameraStream(0, cv2.CAP_DSHOW, buffer_size=8)#高速バックエンドらしい
+        if not self.camera.is_opened():
             messagebox.showerror("Error", "Cannot access the camera")
             root.destroy()
             return
+        self.camera.start()
+        self.startup_timer.mark("camera_opened")
 
         # --- YOLO Model ---
-        try:
-            self.model = YOLO('Rebest.pt') # Ensure this model has the correct classes
-            print("Attempting to load model 'Rebest.pt'...")
-            # Verify class names match self.flag_map values AFTER model loads
-            model_classes_dict = self.model.names
-            model_classes_set = set(model_classes_dict.values())
-            expected_classes_set = set(self.flag_map.values())
-            print(f"Model Classes Found: {model_classes_set}")
-            print(f"Expected Classes: {expected_classes_set}")
-            if not expected_classes_set.issubset(model_classes_set):
-                missing = expected_classes_set - model_classes_set
-                extra = model_classes_set - expected_classes_set
-                msg = f"Model class mismatch!\nMissing: {missing}\nUnexpected: {extra}\nCheck model and flag_map."
-                messagebox.showwarning("Model Warning", msg)
-                print(f"WARNING: {msg}") # Also print to console
-
-        except Exception as e:
-            messagebox.showerror("YOLO Error", f"Failed to load YOLO model 'Rebest.pt': {e}")
-            if self.capture and self.capture.isOpened(): #self.capture.release()
-                pass
-            root.destroy()
-            return
+        # model_export.py で書き出した ONNX / OpenVINO 版 (入力 480x480 固定) があればそちらを使う
+        # quantized=True (起動時に --int8) なら INT8 版 Rebest_int8.onnx を使う
+        # 読み込みとウォームアップ推論はバックグラウンドで行い、ウィンドウはすぐに出す
+        # 準備ができるまでシャッターとせつめい画面は使えない (_on_model_ready で解禁)
+        self.model = None
+        self.inference_worker = None
+        # せつめい画面の推論とシャッター処理で同じモデルを使うのでロックを共有する
+        self.model_lock = threading.Lock()
+        # フレームはモデルに渡す前に 480x480 にレターボックスする (スレッドごとに別のバッファ)
+        # シャッター時は直前の burst_frames 枚からピントの良い burst_keep 枚を選んで推論し、
+        # 一番確かに見つかったフレームを使う (1枚だけだとブレや露出の瞬間に失敗しやすい)
+        self.burst_frames = 6
+        self.burst_keep = 3
+        self.shutter_letterboxes = [Letterbox(DETECT_IMGSZ) for _ in range(self.burst_keep)]
+        # シャッター時はガイド枠 (+ 周りに少し余裕) の中だけを推論する。False なら全体を推論する
+        self.roi_detection = True
+        self.roi_margin = 0.1 # ガイド枠の幅・高さに対する余裕の割合
+        print("Attempting to load model 'Rebest.pt'...")
+        self.model_loader = ModelLoader(self.root, 'Rebest.pt', on_ready=self._on_model_ready, on_error=self._on_model_error,
+                                        warmup_shape=(DETECT_IMGSZ, DETECT_IMGSZ, 3), lock=self.model_lock, quantized=quantized,
+                                        imgsz=DETECT_IMGSZ).start()
 
         # --- UI Setup ---
         self.canvas = tk.Canvas(root, width=800, height=600, bg="white")
         self.canvas.pack()
+        # 画面ごとのキャンバスアイテムは一度だけ作り、画面切り替えは表示/非表示で行う
+        self.layers = ScreenLayers(self.canvas)
+        self.next_screen_items = {} # 国 -> 撮影画面の (カメラ画像ID, 準備中テキストID, メッセージID)
 
         self.bg_tk = None # Placeholder for main background PhotoImage
         self.bg_canvas_id = None # ID of the background image on the canvas
-        self.bg_next_screen_tk = None # Placeholder for next screen background
+        # 撮影画面は国ごとに別のレイヤーなので、背景とサンプル画像の PhotoImage も国ごとに保持する
+        # (キャッシュから追い出されても、隠れているレイヤーの画像が消えないように)
+        self.next_screen_photos = {} # 国 -> {"background": PhotoImage, "sample": PhotoImage}
         self.bg_result_screen_tk = None # Placeholder for result screen background
         self.result_flag_tk = None # Placeholder for result screen flag image
-        self.sample_image_tk = None # Placeholder for sample image in next_screen
-
-        # Store PhotoImage references for captured flags to prevent garbage collection
-        self.flag_photo_references = {}
 
         # Explanation screen specific variables
-        self.explanation_detection_count = 0
-        self.last_detected_explanation_flag = None
+        # せつめい画面の認識は、推論結果をまたいで信頼度を積み上げる投票で決める
+        # (信頼度を時間で積分するので、推論の間隔を変えても認識までの時間は half_life と threshold で決まる)
+        self.explanation_voter = DetectionVoter(half_life=2.0, threshold=0.7, min_confidence=0.4,
+                                                early_exit_confidence=0.85, early_exit_time=0.4)
+        # 推論するフレームを画面の変化と推論の速さで選ぶ (固定の10フレームごとの代わり)。
+        # 認識は推論の間隔1つ分まで遅れうるので、CPU が遅くても間隔は投票の half_life の 1/4 までにする
+        self.inference_scheduler = InferenceScheduler(max_interval=self.explanation_voter.half_life / 4)
+        # 推論と推論のあいだ、検出した国旗の箱をプレビュー上で動かし続ける
+        self.explanation_tracker = BoxTracker()
+        self.explanation_letterbox = Letterbox(DETECT_IMGSZ) # 推論ワーカーの前処理。結果の箱を元の座標に戻すのにも使う
+        self.explanation_track_box_id = None
+        self.explanation_track_label_id = None
         self.explanation_screen_message_id = None
         self.explanation_cam_feed_image_id = None # Separate ID for explanation screen camera feed
+        self.explanation_progress_text_id = None
+        self.cam_feed_image_id = None
+        self.cam_feed_text_id = None
+        self.message_id = None
+        self.explanation_session = 0 # せつめい画面を開くたびに増やし、古い推論結果を見分ける
+        self.shutter_job = None # バックグラウンドで実行中のシャッター処理
 
         # Draw the initial screen
         self.draw_main_screen()
+        self.startup_timer.mark("main_screen")
 
         # --- Event Binding ---
         self.canvas.bind("<Button-1>", self.mouse_event)
@@ -134,9 +192,7 @@ class BlockGameApp:
                 self.bg_tk = None
                 return
 
-            new_bg_image = Image.open(background_path)
-            new_bg_image = new_bg_image.resize((800, 600), Image.Resampling.LANCZOS)
-            self.bg_tk = ImageTk.PhotoImage(new_bg_image)
+            self.bg_tk = self.assets.photo(background_path, (800, 600), Image.Resampling.LANCZOS)
 
             if self.bg_canvas_id and self.canvas.winfo_exists():
                 try:
@@ -156,49 +212,34 @@ class BlockGameApp:
             self.bg_tk = None
 
     def draw_main_screen(self):
-        self.canvas.delete("all")
         self.current_screen = "main"
-        # カメラ関連の表示オブジェクトをリセット
-        self.cam_feed_image_id = None
-        self.explanation_cam_feed_image_id = None
         self.image_tk = None # PhotoImage参照もクリア
 
+        # 静的な部分は最初に一度だけ作り、以降は表示/非表示を切り替えるだけ
+        # 国旗ボタンはキャプチャ状況が変わったとき (main_flags を invalidate したとき) だけ作り直す
+        self.layers.show(("main", self._build_main_screen), ("main_flags", self._build_main_flags))
+
+        # === BGM再生（即時） ===
+        self.audio.stop_bgm()
+        self.audio.play_bgm("audio/bgmset/lalalabread.mp3")
+        #self.canvas.after(100, lambda: self.audio.play_voice("audio/voiceset/make/make_flags.wav"))
 
+    def _build_main_screen(self):
         # --- Main screen specific background ---
         main_background_path = "image/background.jpg"
         try:
             if not os.path.exists(main_background_path):
                 print(f"ERROR: Main background image file not found: {main_background_path}")
                 self.canvas.config(bg="lightgrey") # Fallback color
-                if self.bg_canvas_id and self.canvas.winfo_exists():
-                    try:
-                        self.canvas.delete(self.bg_canvas_id)
-                    except tk.TclError:
-                        pass
                 self.bg_tk = None
                 self.bg_canvas_id = None
             else:
                 # Load and display the specific main background
-                main_bg_image_pil = Image.open(main_background_path)
-                main_bg_image_pil = main_bg_image_pil.resize((800, 600), Image.Resampling.LANCZOS)
-                self.bg_tk = ImageTk.PhotoImage(main_bg_image_pil)
-
-                if self.bg_canvas_id and self.canvas.winfo_exists():
-                    try:
-                        self.canvas.delete(self.bg_canvas_id)
-                    except tk.TclError:
-                        self.bg_canvas_id = None # Reset if ID was invalid
-
+                self.bg_tk = self.assets.photo(main_background_path, (800, 600), Image.Resampling.LANCZOS)
                 self.bg_canvas_id = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.bg_tk)
-                self.canvas.lower(self.bg_canvas_id) # Send to back
         except Exception as e:
             print(f"Error setting main background image from {main_background_path}: {e}")
             self.canvas.config(bg="lightgrey")
-            if self.bg_canvas_id and self.canvas.winfo_exists():
-                try:
-                    self.canvas.delete(self.bg_canvas_id)
-                except tk.TclError:
-                    pass
             self.bg_tk = None
             self.bg_canvas_id = None
         # --- End of Main screen specific background ---
@@ -206,7 +247,42 @@ class BlockGameApp:
         self.canvas.create_text(400, 30, text="LEGOOOOOo", font=("Helvetica", 24, "bold"), fill="black")
         self.canvas.create_text(400, 70, text="こっきをつくろう！", font=font_subject, fill="black")
         self.canvas.create_text(400, 110, text="つくりたい くに をクリックしてね！", font=font_subject, fill="black")
+        # モデルの準備中だけ表示するお知らせ (準備ができたら空にする)
+        self.model_status_id = self.canvas.create_text(400, 505, text="" if self.model_loader.ready else "じゅんびちゅう...",
+                                                       font=font_subject, fill="orange")
 
+        # --- 新しい「せつめい」ボタンの追加 ---
+        explanation_btn_x1 = 600
+        explanation_btn_y1 = 530
+        explanation_btn_x2 = 750
+        explanation_btn_y2 = 580
+        self.canvas.create_rectangle(explanation_btn_x1, explanation_btn_y1, explanation_btn_x2, explanation_btn_y2,
+                                     fill="purple", outline="black", tags="explanation_button")
+        self.canvas.create_text((explanation_btn_x1 + explanation_btn_x2) // 2, (explanation_btn_y1 + explanation_btn_y2) // 2,
+                                text="せつめい", font=font_subject, fill="white", tags="explanation_button")
+        # --- ここまで ---
+
+        # --- 新しい「留学」ボタンの追加 ---
+        study_abroad_btn_x1 = 340
+        study_abroad_btn_y1 = 530
+        study_abroad_btn_x2 = 460
+        study_abroad_btn_y2 = 580
+        self.canvas.create_rectangle(study_abroad_btn_x1, study_abroad_btn_y1, study_abroad_btn_x2, study_abroad_btn_y2,
+                                     fill="purple", outline="black", tags="study_abroad_button")
+        self.canvas.create_text((study_abroad_btn_x1 + study_abroad_btn_x2) // 2, (study_abroad_btn_y1 + study_abroad_btn_y2) // 2,
+                                text="留学", font=font_subject, fill="white", tags="study_abroad_button")
+        # --- ここまで ---
+        
+        reset_btn_x1 = 50
+        reset_btn_y1 = 530
+        reset_btn_x2 = 200
+        reset_btn_y2 = 580
+        self.canvas.create_rectangle(reset_btn_x1, reset_btn_y1, reset_btn_x2, reset_btn_y2,
+                                     fill="orange", outline="black", tags="reset_button")
+        self.canvas.create_text((reset_btn_x1 + reset_btn_x2) // 2, (reset_btn_y1 + reset_btn_y2) // 2,
+                                text="リセット", font=font_subject, fill="white", tags="reset_button")
+
+    def _build_main_flags(self):
         button_coords = {
             "Japan":   (10, top_position1, 250, top_position2),
             "Sweden":  (260, top_position1, 510, top_position2),
@@ -219,13 +295,11 @@ class BlockGameApp:
         button_texts = {name_en: self.flag_names_jp.get(name_en, name_en) for name_en in button_coords.keys()}
 
         text_y_offset_ratio = 0.4
-        self.flag_photo_references.clear()
 
         for flag_name, coords in button_coords.items(): # flag_name here is the English key
             x1, y1, x2, y2 = coords
             center_x = (x1 + x2) // 2
             center_y = (y1 + y2) // 2
-            btn_width = x2 - x1
             btn_height = y2 - y1
             text_y = y1 + (btn_height * text_y_offset_ratio)
 
@@ -234,12 +308,10 @@ class BlockGameApp:
 
             captured_image_path = self.captured_images.get(flag_name)
 
-            if captured_image_path and os.path.exists(captured_image_path):
+            if captured_image_path:
                 try:
-                    img = Image.open(captured_image_path)
-                    img.thumbnail((btn_width - 10, btn_height - 10), Image.Resampling.LANCZOS)
-                    img_tk = ImageTk.PhotoImage(img)
-                    self.flag_photo_references[flag_name] = img_tk
+                    # キャプチャ時に作ったサムネイルを使う (ディスクは読まない)
+                    img_tk = self.captured_thumbnails[flag_name]["button"]
                     self.canvas.create_image(center_x, center_y, anchor=tk.CENTER, image=img_tk, tags=(flag_name, "flag_display"))
                     self.canvas.create_rectangle(x1, y1, x2, y2, outline="green", width=2, tags=(flag_name, "flag_border"))
                 except Exception as e:
@@ -251,54 +323,10 @@ class BlockGameApp:
                 self.canvas.create_rectangle(x1, y1, x2, y2, fill="#ADD8E6", outline="black", stipple="gray50", tags=(flag_name, "button_default"))
                 self.canvas.create_text(center_x, text_y, text=button_texts[flag_name], font=font_title2, fill="black", tags=(flag_name, "text_default"))
 
-        if self.bg_canvas_id and self.canvas.winfo_exists():
-            self.canvas.lower(self.bg_canvas_id)
-
-        # --- 新しい「せつめい」ボタンの追加 ---
-        explanation_btn_x1 = 600
-        explanation_btn_y1 = 530
-        explanation_btn_x2 = 750
-        explanation_btn_y2 = 580
-        self.canvas.create_rectangle(explanation_btn_x1, explanation_btn_y1, explanation_btn_x2, explanation_btn_y2,
-                                     fill="purple", outline="black", tags="explanation_button")
-        self.canvas.create_text((explanation_btn_x1 + explanation_btn_x2) // 2, (explanation_btn_y1 + explanation_btn_y2) // 2,
-                                text="せつめい", font=font_subject, fill="white", tags="explanation_button")
-        # --- ここまで ---
-
-        # --- 新しい「留学」ボタンの追加 ---
-        study_abroad_btn_x1 = 340
-        study_abroad_btn_y1 = 530
-        study_abroad_btn_x2 = 460
-        study_abroad_btn_y2 = 580
-        self.canvas.create_rectangle(study_abroad_btn_x1, study_abroad_btn_y1, study_abroad_btn_x2, study_abroad_btn_y2,
-                                     fill="purple", outline="black", tags="study_abroad_button")
-        self.canvas.create_text((study_abroad_btn_x1 + study_abroad_btn_x2) // 2, (study_abroad_btn_y1 + study_abroad_btn_y2) // 2,
-                                text="留学", font=font_subject, fill="white", tags="study_abroad_button")
-        # --- ここまで ---
-        
-        reset_btn_x1 = 50
-        reset_btn_y1 = 530
-        reset_btn_x2 = 200
-        reset_btn_y2 = 580
-        self.canvas.create_rectangle(reset_btn_x1, reset_btn_y1, reset_btn_x2, reset_btn_y2,
-                                     fill="orange", outline="black", tags="reset_button")
-        self.canvas.create_text((reset_btn_x1 + reset_btn_x2) // 2, (reset_btn_y1 + reset_btn_y2) // 2,
-                                text="リセット", font=font_subject, fill="white", tags="reset_button")
-        
-
-        # === BGM再生（即時） ===
-        self.audio.stop_bgm()
-        self.audio.play_bgm("audio/bgmset/lalalabread.mp3")
-        #self.canvas.after(100, lambda: self.audio.play_voice("audio/voiceset/make/make_flags.wav"))
-
 
     def draw_next_screen(self):
-        self.canvas.delete("all")
         self.current_screen = "next"
-        # カメラ関連の表示オブジェクトをリセット
-        self.cam_feed_image_id = None
-        self.explanation_cam_feed_image_id = None
-        self.image_tk = None # PhotoImage参照もクリア
+        self.image_tk = None # PhotoImage参照もクリア (最初のフレームでカメラ画像を表示し直す)
 
 
         flag_name = self.flag_map.get(self.blocknumber)
@@ -316,6 +344,25 @@ class BlockGameApp:
             # self.draw_main_screen() # サンプル画像がなくても続行する場合はコメントアウト
             # return
 
+        # カメラプレビューエリアの設定
+        self.cam_x = 600   # プレビューエリアの中心 x
+        self.cam_y = 250   # プレビューエリアの中心 y
+        self.cam_width = 300 # プレビューエリア全体の幅 (この中にアスペクト比保持で表示)
+        self.cam_height = 300 # プレビューエリア全体の高さ
+
+        # 撮影画面は国ごとに一度だけ作り、2回目以降は表示を切り替えるだけ
+        self.layers.show((f"next_{flag_name}", lambda: self._build_next_screen(flag_name, flag_name_jp)))
+        self.cam_feed_image_id, self.cam_feed_text_id, self.message_id = self.next_screen_items[flag_name]
+
+        # 訪問ごとに変わる部分を初期状態に戻す
+        self.canvas.itemconfig(self.cam_feed_image_id, state="hidden") # update_frameで最初のフレームを描くときに表示
+        self.canvas.itemconfig(self.cam_feed_text_id, state="normal")
+        self.canvas.itemconfig(self.message_id, text="", fill="red")
+
+        self.audio.play_voice("audio/voiceset/make/make_sample.wav")
+
+    def _build_next_screen(self, flag_name, flag_name_jp):
+        photos = self.next_screen_photos[flag_name] = {} # このレイヤーの画像の参照を保持
         # 背景画像の設定 (キャプチャ画面専用またはデフォルト)
         capture_bg_path = "image/background_capture.jpg"
         try:
@@ -324,11 +371,8 @@ class BlockGameApp:
                 print(f"Critical: Fallback background {bg_image_path_to_load} not found.")
                 self.canvas.config(bg="lightgrey")
             else:
-                bg_image = Image.open(bg_image_path_to_load)
-                bg_image = bg_image.resize((800, 600), Image.Resampling.LANCZOS)
-                self.bg_next_screen_tk = ImageTk.PhotoImage(bg_image) # 参照を保持
-                self.canvas.create_image(0, 0, anchor=tk.NW, image=self.bg_next_screen_tk)
-                self.canvas.lower(self.bg_next_screen_tk) # 背景なので一番下に
+                photos["background"] = self.assets.photo(bg_image_path_to_load, (800, 600), Image.Resampling.LANCZOS)
+                self.canvas.create_image(0, 0, anchor=tk.NW, image=photos["background"])
         except Exception as e:
             print(f"Error loading capture background: {e}")
             self.canvas.config(bg="lightgrey")
@@ -342,10 +386,9 @@ class BlockGameApp:
         sample_y = 250   # サンプル画像の中心 y 座標
         try:
             if os.path.exists(self.sample_image_path): # 再度存在確認
-                sample_image_pil = Image.open(self.sample_image_path)
-                sample_image_pil.thumbnail((imageSizeX, imageSizeY), Image.Resampling.LANCZOS)
-                self.sample_image_tk = ImageTk.PhotoImage(sample_image_pil) # 参照を保持
-                self.canvas.create_image(sample_x, sample_y, anchor=tk.CENTER, image=self.sample_image_tk)
+                sample_image_pil = self.assets.get(self.sample_image_path, (imageSizeX, imageSizeY), Image.Resampling.LANCZOS, thumbnail=True)
+                photos["sample"] = self.assets.photo(self.sample_image_path, (imageSizeX, imageSizeY), Image.Resampling.LANCZOS, thumbnail=True)
+                self.canvas.create_image(sample_x, sample_y, anchor=tk.CENTER, image=photos["sample"])
                 sw, sh = sample_image_pil.size
                 self.canvas.create_rectangle(sample_x - sw//2 - 5, sample_y - sh//2 - 5,
                                              sample_x + sw//2 + 5, sample_y + sh//2 + 5,
@@ -358,22 +401,16 @@ class BlockGameApp:
             print(f"Sample image error for {self.sample_image_path}: {e}")
             self.canvas.create_text(sample_x, sample_y, text="サンプル画像\nエラー", font=font_subject, fill="red", justify=tk.CENTER)
 
-        # カメラプレビューエリアの設定
-        self.cam_x = 600   # プレビューエリアの中心 x
-        self.cam_y = 250   # プレビューエリアの中心 y
-        self.cam_width = 300 # プレビューエリア全体の幅 (この中にアスペクト比保持で表示)
-        self.cam_height = 300 # プレビューエリア全体の高さ
-
         # プレビューエリアの背景 (黒い四角)
         self.canvas.create_rectangle(
             self.cam_x - self.cam_width // 2, self.cam_y - self.cam_height // 2,
             self.cam_x + self.cam_width // 2, self.cam_y + self.cam_height // 2,
             fill="black", outline="grey", tags="camera_bg_rect"
         )
-        # カメラ準備中のテキスト (update_frameで画像表示時に削除される)
-        self.cam_feed_text_id = self.canvas.create_text(self.cam_x, self.cam_y, text="カメラ準備中...", fill="white", font=font_subject)
-        self.cam_feed_image_id = None # update_frameでカメラ画像アイテムIDを格納
-        self.image_tk = None # update_frameでPhotoImage参照を保持
+        # カメラ準備中のテキスト (update_frameで画像表示時に隠される)
+        cam_feed_text_id = self.canvas.create_text(self.cam_x, self.cam_y, text="カメラ準備中...", fill="white", font=font_subject)
+        # カメラ画像 (update_frameで PhotoImage を設定する。ガイド枠より下に置く)
+        cam_feed_image_id = self.canvas.create_image(self.cam_x, self.cam_y, anchor=tk.CENTER)
 
         # --- アスペクト比保持プレビューに合わせた7:12ガイド枠の描画 ---
         target_guide_aspect_ratio_wh = 12.0 / 7.0
@@ -413,21 +450,36 @@ class BlockGameApp:
         self.canvas.create_text(150, 555, text="← もどる", font=font_subject, fill="black", tags="back_to_main")
 
         # メッセージ表示用テキストオブジェクト (最初は空)
-        self.message_id = self.canvas.create_text(400, 555, text="", font=("Helvetica", 16), fill="red")
+        message_id = self.canvas.create_text(400, 555, text="", font=("Helvetica", 16), fill="red")
 
-        self.audio.play_voice("audio/voiceset/make/make_sample.wav")
+        self.next_screen_items[flag_name] = (cam_feed_image_id, cam_feed_text_id, message_id)
 
     def draw_explanation_screen(self):
-        self.canvas.delete("all")
         self.current_screen = "explanation"
-        self.explanation_detection_count = 0  # カウントをリセット
-        self.last_detected_explanation_flag = None # 最後に検出されたフラグをリセット
-        # カメラ関連の表示オブジェクトをリセット
-        self.cam_feed_image_id = None
-        self.explanation_cam_feed_image_id = None
-        self.image_tk = None # PhotoImage参照もクリア
+        self.explanation_voter.reset() # 投票をリセットし、認識までの時間の計測を始める
+        self.inference_scheduler.reset() # 最初のフレームはすぐ推論する
+        self.explanation_tracker.reset()
+        self.explanation_session += 1 # これより前に投げた推論の結果は無視する
+        self.image_tk = None # PhotoImage参照もクリア (最初のフレームでカメラ画像を表示し直す)
 
+        # カメラプレビューエリアの設定 (サイズを調整)
+        self.cam_x = 400
+        self.cam_y = 250 # 少し上に移動
+        self.cam_width = 400 # 幅を小さく
+        self.cam_height = 300 # 高さを小さく
 
+        self.layers.show(("explanation", self._build_explanation_screen))
+
+        # 訪問ごとに変わる部分を初期状態に戻す
+        self.canvas.itemconfig(self.explanation_cam_feed_image_id, state="hidden")
+        self.canvas.itemconfig(self.explanation_screen_message_id, text="カメラ準備中...", fill="white")
+        self.canvas.itemconfig(self.explanation_progress_text_id, text="国をカメラにかざして")
+        self.canvas.itemconfig(self.explanation_track_box_id, state="hidden")
+        self.canvas.itemconfig(self.explanation_track_label_id, state="hidden")
+
+        #self.audio.play_voice("audio/voiceset/others/hold_flag.wav")
+
+    def _build_explanation_screen(self):
         # 背景画像の設定
         explanation_bg_path = "image/background_explanation.jpg" # 説明画面専用の背景
         try:
@@ -436,68 +488,76 @@ class BlockGameApp:
                 print(f"Critical: Fallback background {bg_image_path_to_load} not found for explanation screen.")
                 self.canvas.config(bg="lightgrey")
             else:
-                bg_image = Image.open(bg_image_path_to_load)
-                bg_image = bg_image.resize((800, 600), Image.Resampling.LANCZOS)
-                self.bg_next_screen_tk = ImageTk.PhotoImage(bg_image) # 参照を保持
-                self.canvas.create_image(0, 0, anchor=tk.NW, image=self.bg_next_screen_tk)
-                self.canvas.lower(self.bg_next_screen_tk)
+                self.bg_explanation_screen_tk = self.assets.photo(bg_image_path_to_load, (800, 600), Image.Resampling.LANCZOS) # 参照を保持
+                self.canvas.create_image(0, 0, anchor=tk.NW, image=self.bg_explanation_screen_tk)
         except Exception as e:
             print(f"Error loading explanation background: {e}")
             self.canvas.config(bg="lightgrey")
 
         self.canvas.create_text(400, 50, text="しりたい こっき を かざしてね！", font=font_title, fill="black")
 
-        # カメラプレビューエリアの設定 (サイズを調整)
-        self.cam_x = 400
-        self.cam_y = 250 # 少し上に移動
-        self.cam_width = 400 # 幅を小さく
-        self.cam_height = 300 # 高さを小さく
-
         self.canvas.create_rectangle(
             self.cam_x - self.cam_width // 2, self.cam_y - self.cam_height // 2,
             self.cam_x + self.cam_width // 2, self.cam_y + self.cam_height // 2,
             fill="black", outline="grey", tags="explanation_camera_bg_rect"
         )
+        self.explanation_cam_feed_image_id = self.canvas.create_image(self.cam_x, self.cam_y, anchor=tk.CENTER) # Explanation screen's camera image ID
+        # 追跡中の国旗の箱 (カメラ画像の上に重ねる)
+        self.explanation_track_box_id = self.canvas.create_rectangle(0, 0, 0, 0, outline="lime", width=3, state="hidden")
+        self.explanation_track_label_id = self.canvas.create_text(0, 0, text="", anchor=tk.SW, fill="lime",
+                                                                  font=font_subject, state="hidden")
         # テキストを画面の下中央に配置
         self.explanation_screen_message_id = self.canvas.create_text(
             400, 500, # 画面下中央に配置
             text="カメラ準備中...", fill="white", font=font_subject
         )
-        self.explanation_cam_feed_image_id = None # Explanation screen's camera image ID
-        self.image_tk = None # PhotoImage reference
 
         # ★★★ 進捗テキスト（カメラ画像の下）を追加（フォントサイズ2倍に変更） ★★★
         font_subject_big = font.Font(root=self.root, family=font_subject.cget('family'), size=font_subject.cget('size')*2)
         self.explanation_progress_text_id = self.canvas.create_text(
             400, 460, # カメラ画像の下あたり
-            text="連続検出 0 / 5", fill="orange", font=font_subject_big
+            text="国をカメラにかざして", fill="orange", font=font_subject_big
         )
 
         # 戻るボタンを左下に配置
         self.canvas.create_rectangle(50, 530, 250, 580, fill="lightblue", outline="black", tags="back_to_main_from_explanation")
         self.canvas.create_text(150, 555, text="← もどる", font=font_subject, fill="black", tags="back_to_main_from_explanation")
 
-        #self.audio.play_voice("audio/voiceset/others/hold_flag.wav")
-
 
     def draw_result_screen(self):
         """検知成功後に表示する結果画面を描画する"""
-        self.canvas.delete("all")
         self.current_screen = "result"
-        # カメラ関連の表示オブジェクトをリセット
-        self.cam_feed_image_id = None
-        self.explanation_cam_feed_image_id = None
         self.image_tk = None # PhotoImage参照もクリア
 
+        self.layers.show(("result", self._build_result_screen))
+
+        flag_name = self.flag_map.get(self.blocknumber, "不明な国")
+        flag_name_en = self.flag_map[self.blocknumber]
+        flag_name_jp = self.flag_names_jp.get(flag_name_en, flag_name_en)  # 日本語がなければ英語を使う
+        self.canvas.itemconfig(self.result_title_id, text=f"「{flag_name_jp}」をゲットしたよ！")
+        self.canvas.itemconfig(self.result_number_id, text=f"国旗(こっき)の番号(ばんごう): {self.blocknumber}")
+
+        captured_image_path = self.captured_images.get(flag_name)
+        self.canvas.itemconfig(self.result_image_id, state="hidden")
+        if captured_image_path:
+            try:
+                self.result_flag_tk = self.captured_thumbnails[flag_name]["result"]
+                self.canvas.itemconfig(self.result_image_id, image=self.result_flag_tk, state="normal")
+                self.canvas.itemconfig(self.result_status_id, text="")
+            except Exception as e:
+                print(f"Error displaying captured flag image on result screen: {e}")
+                self.canvas.itemconfig(self.result_status_id, text="画像表示エラー", fill="red")
+        else:
+            self.canvas.itemconfig(self.result_status_id, text="キャプチャ画像なし", fill="grey")
+
+        self.canvas.after(300, lambda: self.audio.play_voice(f"audio/voiceset/get/get_{flag_name}.wav"))
 
+    def _build_result_screen(self):
         try:
             background_path = "image/background.jpg"
             if os.path.exists(background_path):
-                bg_image = Image.open(background_path)
-                bg_image = bg_image.resize((800, 600), Image.Resampling.LANCZOS)
-                self.bg_result_screen_tk = ImageTk.PhotoImage(bg_image)
+                self.bg_result_screen_tk = self.assets.photo(background_path, (800, 600), Image.Resampling.LANCZOS)
                 self.canvas.create_image(0, 0, anchor=tk.NW, image=self.bg_result_screen_tk)
-                self.canvas.lower(self.bg_result_screen_tk)
             else:
                 self.canvas.config(bg="lightyellow")
                 print(f"Warning: Result screen background image not found: {background_path}")
@@ -505,29 +565,11 @@ class BlockGameApp:
             print(f"Error loading background for result screen: {e}")
             self.canvas.config(bg="lightyellow")
 
-        flag_name = self.flag_map.get(self.blocknumber, "不明な国")
-        flag_name_en = self.flag_map[self.blocknumber]
-        flag_name_jp = self.flag_names_jp.get(flag_name_en, flag_name_en)  # 日本語がなければ英語を使う
-        self.canvas.create_text(400, 80,
-                                 text=f"「{flag_name_jp}」をゲットしたよ！",
-                                 font=font_title, fill="darkgreen")
-
-        self.canvas.create_text(400, 150,
-                                 text=f"国旗(こっき)の番号(ばんごう): {self.blocknumber}",
-                                 font=font_subject, fill="black")
-
-        captured_image_path = self.captured_images.get(flag_name)
-        if captured_image_path and os.path.exists(captured_image_path):
-            try:
-                img = Image.open(captured_image_path)
-                img.thumbnail((250, 250), Image.Resampling.LANCZOS)
-                self.result_flag_tk = ImageTk.PhotoImage(img)
-                self.canvas.create_image(400, 300, anchor=tk.CENTER, image=self.result_flag_tk)
-            except Exception as e:
-                print(f"Error displaying captured flag image on result screen: {e}")
-                self.canvas.create_text(400, 300, text="画像表示エラー", font=font_subject, fill="red")
-        else:
-            self.canvas.create_text(400, 300, text="キャプチャ画像なし", font=font_subject, fill="grey")
+        # 文字と画像は draw_result_screen で差し替える
+        self.result_title_id = self.canvas.create_text(400, 80, text="", font=font_title, fill="darkgreen")
+        self.result_number_id = self.canvas.create_text(400, 150, text="", font=font_subject, fill="black")
+        self.result_image_id = self.canvas.create_image(400, 300, anchor=tk.CENTER)
+        self.result_status_id = self.canvas.create_text(400, 300, text="", font=font_subject, fill="grey")
 
         self.canvas.create_rectangle(300, 480, 500, 530,
                                      fill="lightblue", outline="black",
@@ -536,8 +578,6 @@ class BlockGameApp:
                                  font=font_subject, fill="black",
                                  tags="back_to_main_from_result")
 
-        self.canvas.after(300, lambda: self.audio.play_voice(f"audio/voiceset/get/get_{flag_name}.wav"))
-
     def detail_screen(self):
         # 国のデータ（画像ファイル・説明文）
         countries = {
@@ -664,56 +704,48 @@ class BlockGameApp:
             ]
         }
         self.current_screen = "detail"
-        self.canvas.delete("all")
-        self.image_refs.clear()
-        # カメラ関連の表示オブジェクトをリセット
-        self.cam_feed_image_id = None
-        self.explanation_cam_feed_image_id = None
         self.image_tk = None # PhotoImage参照もクリア
 
-
         flag_name = self.flag_map.get(self.blocknumber, "Unknown")
-        # 2. 国旗画像を薄く加工して背景として表示
+        flag_name_en = self.flag_map[self.blocknumber]
+        flag_name_jp = self.flag_names_jp.get(flag_name_en, flag_name_en)  # 日本語がなければ英語を使う
+        selected_info = random.choice(countries[flag_name])
 
-        flag_bg_path = f"image/{flag_name}.png"  # 国旗画像パスの例。ファイル構成に合わせて変えてください。
+        # 枠組みは一度だけ作り、国ごとに変わる画像と文字だけ差し替える
+        self.layers.show(("detail", self._build_detail_screen))
+        self.image_refs.clear()
 
+        # 2. 国旗画像を薄く加工して背景として表示 (image/{国}.png を使う)
         try:
-            flag_bg_img = Image.open(flag_bg_path).resize((800,600)).convert("RGBA")
-
-        # 透明度を下げる（アルファ値を40%に）
-            alpha = flag_bg_img.split()[3].point(lambda p: p * 0.4)  # 0.4は透明度調整。0=透明,1=不透明
-            flag_bg_img.putalpha(alpha)
-
-            flag_bg_tk = ImageTk.PhotoImage(flag_bg_img)
+            # 透明度を下げた（アルファ値を40%に）国旗を取得。作成済みならキャッシュから返る
+            flag_bg_tk = self.flag_overlays.photo(flag_name, alpha=0.4)  # 0.4は透明度調整。0=透明,1=不透明
             self.image_refs.append(flag_bg_tk)
-            # 白枠の中（中央）に国旗を表示
-            self.canvas.create_image(400, 300, image=flag_bg_tk, anchor=tk.CENTER)
+            self.canvas.itemconfig(self.detail_flag_bg_id, image=flag_bg_tk, state="normal")
         except Exception as e:
             print(f"国旗画像の読み込み失敗: {e}")
-
-
-        flag_name_en = self.flag_map[self.blocknumber]
-        flag_name_jp = self.flag_names_jp.get(flag_name_en, flag_name_en)  # 日本語がなければ英語を使う
+            self.canvas.itemconfig(self.detail_flag_bg_id, state="hidden")
 
         # メインタイトルを黒で表示
-        self.canvas.create_text(400, 50, text=f"{flag_name_jp} について", font=font_title, fill="black")
-
-        selected_info = random.choice(countries[flag_name])
+        self.canvas.itemconfig(self.detail_title_id, text=f"{flag_name_jp} について")
 
-        img = Image.open(selected_info["image"]).resize((300,300))
-        img_tk = ImageTk.PhotoImage(img)
+        img_tk = self.assets.photo(selected_info["image"], (300, 300), Image.Resampling.BICUBIC)
         self.image_refs.append(img_tk)
-
-        self.canvas.create_image(400, 250, image=img_tk, anchor=tk.CENTER)
-        self.canvas.create_text(430, 430, text=selected_info["text"], font=font_subject, fill="black")
-
-        self.canvas.create_rectangle(300, 500, 500, 550, fill="lightblue", outline="black", tags="back_to_main")
-        self.canvas.create_text(400, 525, text="メインにもどる", font=font_subject, fill="black", tags="back_to_main")
+        self.canvas.itemconfig(self.detail_image_id, image=img_tk)
+        self.canvas.itemconfig(self.detail_text_id, text=selected_info["text"])
 
         self.audio.stop_bgm()
         self.audio.play_bgm(f"audio/bgmset/{flag_name}.mp3")
         self.audio.play_voice(selected_info["voice"])
 
+    def _build_detail_screen(self):
+        # 白枠の中（中央）に国旗を表示 (画像は detail_screen で差し替える)
+        self.detail_flag_bg_id = self.canvas.create_image(400, 300, anchor=tk.CENTER)
+        self.detail_title_id = self.canvas.create_text(400, 50, text="", font=font_title, fill="black")
+        self.detail_image_id = self.canvas.create_image(400, 250, anchor=tk.CENTER)
+        self.detail_text_id = self.canvas.create_text(430, 430, text="", font=font_subject, fill="black")
+
+        self.canvas.create_rectangle(300, 500, 500, 550, fill="lightblue", outline="black", tags="back_to_main")
+        self.canvas.create_text(400, 525, text="メインにもどる", font=font_subject, fill="black", tags="back_to_main")
 
     def mouse_event(self, event):
         x, y = event.x, event.y
@@ -730,6 +762,8 @@ class BlockGameApp:
 
         if self.current_screen == "main":
             if tag == "explanation_button":
+                if self._model_not_ready(self.model_status_id):
+                    return
                 print("Explanation button clicked. Navigating to explanation screen.")
                 self.draw_explanation_screen()
                 return
@@ -758,7 +792,8 @@ class BlockGameApp:
                     else:
                         video_path_for_thread = r'.\movie\ryugaku3.mp4'
                     
-                    # 2. 動画を再生
+                    # 2. 動画を再生 (動画を見るときだけ使うので、ここで import する)
+                    import subprocess
                     command = ['ffplay', '-autoexit','-x', '1200', '-y', '900', video_path_for_thread]
 
                     print(f"動画を再生します: {video_path_for_thread}")
@@ -796,6 +831,7 @@ class BlockGameApp:
                 self.capture_shutter()
             elif tag == "back_to_main":
                 print("Back to main clicked from next screen")
+                self.cancel_shutter_job()
                 self.draw_main_screen()
 
         elif self.current_screen == "result":
@@ -815,6 +851,16 @@ class BlockGameApp:
 
 
     def capture_shutter(self):
+        if self.shutter_job is not None and self.shutter_job.active:
+            # 処理中のシャッターは無視する (中止したジョブは止まるのを待たない)
+            if self.message_id and self.canvas.winfo_exists(): self.canvas.itemconfig(self.message_id, text="しょりちゅう... ちょっとまってね", fill='orange')
+            return
+        if self._model_not_ready(self.message_id):
+            return
+        # 読み込みスレッドから最新フレームを取り出す (ブロックしない)
+        latest_frame = self.camera.read_latest()
+        if latest_frame is not None:
+            self.last_frame = latest_frame
         if self.last_frame is None:
             if self.message_id and self.canvas.winfo_exists(): self.canvas.itemconfig(self.message_id, text="カメラの じゅんびができてないよ")
             return
@@ -832,159 +878,217 @@ class BlockGameApp:
         if self.message_id and self.canvas.winfo_exists():
             self.canvas.itemconfig(self.message_id, text="しゃしん を しらべてるよ...", fill='orange')
             self.audio.play_voice("audio/voiceset/others/check_picture.wav")
-        
-        self.root.update_idletasks()
-
-        
-
-        timestamp = int(time.time())
-        temp_filename = f"captured_image_temp_{self.blocknumber}_{timestamp}.jpg"
 
+        frame = self.last_frame # メモリ上のフレームをそのまま使う (一時JPEGは作らない)
+        # ガイド枠はプレビューの状態に依存するので、ジョブを始める前にメインスレッドで確定させる
         try:
-            cv2.imwrite(temp_filename, self.last_frame)
-
-            results = self.model(temp_filename, verbose=False)
-            confidence_threshold = 0.4
-            detected_correct_flag = False
-            best_confidence = 0
-            best_box = None
-
-            if results and len(results[0].boxes) > 0:
-                boxes = results[0].boxes
-                for i in range(len(boxes)):
-                    confidence = boxes.conf[i].item()
-                    label_index = int(boxes.cls[i].item())
-                    object_type = self.model.names.get(label_index, "Unknown")
-                    if object_type == expected_flag and confidence >= confidence_threshold:
-                        if confidence > best_confidence:
-                            best_confidence = confidence
-                            detected_correct_flag = True
-                            best_box = boxes.xyxy[i].tolist()
-
-
-            # `capture_shutter` 関数の中のこの部分を修正
-            if detected_correct_flag and best_box: # Ensure best_box is not None
-                if self.message_id and self.canvas.winfo_exists(): self.canvas.itemconfig(self.message_id, text=f"{flag_name_jp} をみつけた！ しょりちゅう...", fill='blue')
-                self.root.update_idletasks()
-                try:
-                    # ★★★ 修正点: with構文を使ってファイルを自動で閉じる ★★★
-                    with Image.open(temp_filename) as img_pil_original_capture:
-                        original_capture_width, original_capture_height = img_pil_original_capture.size
-
-                        if self.preview_crop_guide_coords is None:
-                            raise ValueError("Crop guide coords not set.")
-                        if self.preview_paste_info['w'] == 0 or self.preview_paste_info['h'] == 0:
-                            raise ValueError("Preview paste info not set or invalid (w or h is 0).")
-
-                        preview_area_abs_x1 = self.cam_x - self.cam_width // 2
-                        preview_area_abs_y1 = self.cam_y - self.cam_height // 2
-
-                        guide_abs_x1, guide_abs_y1, guide_abs_x2, guide_abs_y2 = self.preview_crop_guide_coords
-
-                        guide_rel_area_x1 = guide_abs_x1 - preview_area_abs_x1
-                        guide_rel_area_y1 = guide_abs_y1 - preview_area_abs_y1
-                        guide_rel_area_x2 = guide_abs_x2 - preview_area_abs_x1
-                        guide_rel_area_y2 = guide_abs_y2 - preview_area_abs_y1
-
-                        guide_rel_image_x1 = guide_rel_area_x1 - self.preview_paste_info['x']
-                        guide_rel_image_y1 = guide_rel_area_y1 - self.preview_paste_info['y']
-                        guide_rel_image_x2 = guide_rel_area_x2 - self.preview_paste_info['x']
-                        guide_rel_image_y2 = guide_rel_area_y2 - self.preview_paste_info['y']
+            crop_box = self._guide_crop_box(frame.shape[1], frame.shape[0])
+        except ValueError as e:
+            print(f"ERROR during image processing/saving for {expected_flag}: {e}")
+            if self.message_id and self.canvas.winfo_exists():
+                self.canvas.itemconfig(self.message_id, text=f"エラー: {expected_flag} の 加工・保存に しっぱい...", fill='red')
+            return
 
-                        display_w_on_preview = self.preview_paste_info['w']
-                        display_h_on_preview = self.preview_paste_info['h']
+        frame_h, frame_w = frame.shape[:2]
+        detect_box = self._detection_roi(crop_box, frame_w, frame_h) if self.roi_detection else (0, 0, frame_w, frame_h)
+
+        # 直前の数フレームから、ガイド枠のあたりのピントが良いものを選ぶ
+        burst = [f for f in self.camera.recent(self.burst_frames) if f.shape == frame.shape] or [frame]
+        candidates = [f for _, f in select_sharpest(burst, self.burst_keep, detect_box)]
+
+        ctx = {
+            "frame": candidates[0],
+            "frames": candidates,
+            "crop_box": crop_box,
+            "detect_box": detect_box,
+            "expected_flag": expected_flag,
+            "flag_name_jp": flag_name_jp,
+            "timestamp": int(time.time()),
+        }
+        # 重い処理はバックグラウンドで行い、UIはメッセージ更新だけにする
+        self.shutter_job = ShutterJob(
+            self.root,
+            [("detect", self._shutter_detect), ("crop", self._shutter_crop), ("save", self._shutter_save)],
+            ctx=ctx,
+            on_progress=self._on_shutter_progress,
+            on_done=self._on_shutter_done,
+            on_error=self._on_shutter_error,
+            on_cancel=self._on_shutter_cancel,
+        ).start()
+
+    # --- シャッター処理の各ステージ (バックグラウンドスレッドで実行される) ---
+    def _shutter_detect(self, ctx):
+        expected_flag = ctx["expected_flag"]
+        # ガイド枠のあたりだけを切り出して推論する (画素が少なく、背景の誤検出も減る)
+        roi_x1, roi_y1, roi_x2, roi_y2 = ctx["detect_box"]
+        frames = ctx["frames"]
+        letterboxed = [letterbox(frame[roi_y1:roi_y2, roi_x1:roi_x2])
+                       for letterbox, frame in zip(self.shutter_letterboxes, frames)]
+        confidence_threshold = 0.4
+        best_confidence = 0
+        best_box = None
+        best_index = None
+
+        # .pt のモデルは候補をまとめて1回で推論する。書き出したモデルは入力が1枚固定なので、
+        # ピントの良い順に1枚ずつ推論し、見つかったところでやめる
+        batched = self.model_loader.weights_path.endswith(".pt")
+        start = time.perf_counter()
+        with self.model_lock:
+            if batched:
+                all_results = self.model(letterboxed, imgsz=DETECT_IMGSZ, verbose=False)
+            else:
+                all_results = []
+                for image in letterboxed:
+                    all_results.extend(self.model(image, imgsz=DETECT_IMGSZ, verbose=False))
+                    boxes = all_results[-1].boxes
+                    if any(self.model.names.get(int(boxes.cls[i].item())) == expected_flag
+                           and boxes.conf[i].item() >= confidence_threshold for i in range(len(boxes))):
+                        break
+        print(f"Burst detect: {len(all_results)}/{len(frames)} frames in {time.perf_counter() - start:.3f}s"
+              f" ({'batched' if batched else 'sequential'})")
+
+        for index, result in enumerate(all_results):
+            boxes = result.boxes
+            for i in range(len(boxes)):
+                confidence = boxes.conf[i].item()
+                label_index = int(boxes.cls[i].item())
+                object_type = self.model.names.get(label_index, "Unknown")
+                if object_type == expected_flag and confidence >= confidence_threshold:
+                    if confidence > best_confidence:
+                        best_confidence = confidence
+                        best_index = index
+                        # 元のフレームの座標に戻す
+                        bx1, by1, bx2, by2 = self.shutter_letterboxes[index].to_original(boxes.xyxy[i].tolist())
+                        best_box = [bx1 + roi_x1, by1 + roi_y1, bx2 + roi_x1, by2 + roi_y1]
+
+        if not best_box:
+            raise StageFailed(f"{ctx['flag_name_jp']} が みつからない or はっきりしない...")
+        # 一番確かに見つかったフレームを切り出しと保存に使う
+        ctx["frame"] = frames[best_index]
+        ctx["best_box"] = best_box
+        ctx["best_confidence"] = best_confidence
+
+    def _shutter_crop(self, ctx):
+        # ガイド枠の範囲を同じフレーム配列から切り出す
+        crop_x1, crop_y1, crop_x2, crop_y2 = ctx["crop_box"]
+        ctx["cropped_frame"] = ctx["frame"][crop_y1:crop_y2, crop_x1:crop_x2]
+
+    def _shutter_save(self, ctx):
+        # ディスクに書くのは最終成果物だけ
+        permanent_filename_base = f"{ctx['expected_flag']}_{ctx['timestamp']}"
+        final_image_path = os.path.join(self.output_dir, f"guide_cropped_{permanent_filename_base}.jpg")
+        final_image_path = self.image_writer.write(ctx["cropped_frame"], final_image_path)
+        ctx["final_image_path"] = final_image_path
+        print(f"Queued guide-cropped image: {final_image_path}")
+
+        # 画面表示用のサムネイルもここで作っておく (PhotoImage にするのはメインスレッドで)
+        cropped_pil = Image.fromarray(cv2.cvtColor(ctx["cropped_frame"], cv2.COLOR_BGR2RGB))
+        thumbnails = {}
+        for name, size in (("button", self.flag_button_thumbnail_size), ("result", self.result_thumbnail_size)):
+            thumbnail = cropped_pil.copy()
+            thumbnail.thumbnail(size, Image.Resampling.LANCZOS)
+            thumbnails[name] = thumbnail
+        ctx["thumbnails"] = thumbnails
+
+    # --- シャッター処理のコールバック (メインスレッドで実行される) ---
+    def _on_shutter_progress(self, stage_name):
+        flag_name_jp = self.shutter_job.ctx["flag_name_jp"]
+        stage_messages = {
+            "detect": ("しゃしん を しらべてるよ...", 'orange'),
+            "crop": (f"{flag_name_jp} をみつけた！ しょりちゅう...", 'blue'),
+            "save": (f"{flag_name_jp} を ほぞん してるよ...", 'blue'),
+        }
+        text, fill = stage_messages.get(stage_name, ("しょりちゅう...", 'blue'))
+        if self.current_screen == "next" and self.message_id and self.canvas.winfo_exists():
+            self.canvas.itemconfig(self.message_id, text=text, fill=fill)
+
+    def _on_shutter_done(self, ctx):
+        expected_flag = ctx["expected_flag"]
+        final_image_path = ctx["final_image_path"]
+        self.captured_images[expected_flag] = final_image_path
+        # 撮り直したときは前のサムネイルを置き換える
+        self.captured_thumbnails[expected_flag] = {name: ImageTk.PhotoImage(img) for name, img in ctx["thumbnails"].items()}
+        print(f"成功！ {ctx['flag_name_jp']} を追加しました。ファイル: {final_image_path}")
+        self.layers.invalidate("main_flags") # 次にメイン画面を出すときに国旗ボタンを作り直す
+        self.draw_result_screen()
+
+    def _on_shutter_error(self, stage_name, error):
+        expected_flag = self.shutter_job.ctx["expected_flag"]
+        if isinstance(error, StageFailed):
+            text = str(error)
+        elif stage_name == "detect":
+            print(f"ERROR during capture/YOLO processing: {error}")
+            text = "エラー が はっせい しました"
+        else:
+            print(f"ERROR during image processing/saving for {expected_flag}: {error}")
+            text = f"エラー: {expected_flag} の 加工・保存に しっぱい..."
+        if self.current_screen == "next" and self.message_id and self.canvas.winfo_exists():
+            self.canvas.itemconfig(self.message_id, text=text, fill='red')
+
+    def _on_shutter_cancel(self, ctx):
+        # 中止されたジョブが書いたファイルは残さない
+        # (あとから始めたジョブが同じファイル名で書いたものは消さない)
+        final_image_path = ctx.get("final_image_path")
+        current_ctx = self.shutter_job.ctx if self.shutter_job is not None and self.shutter_job.ctx is not ctx else {}
+        if final_image_path and final_image_path != current_ctx.get("final_image_path"):
+            self.image_writer.discard(final_image_path) # まだ書いていなければ書かない
+        print("Shutter processing cancelled.")
+
+    def cancel_shutter_job(self):
+        """処理中のシャッタージョブがあれば中止する。"""
+        if self.shutter_job is not None and self.shutter_job.running:
+            self.shutter_job.cancel()
+
+    def _guide_crop_box(self, frame_width, frame_height):
+        """
+        プレビュー上の黄色いガイド枠を、元フレームの座標 (x1, y1, x2, y2) に変換する。
+        preview_paste_info (プレビュー内の貼り付け位置と表示サイズ) を使う。
+        """
+        if self.preview_crop_guide_coords is None:
+            raise ValueError("Crop guide coords not set.")
+        if self.preview_paste_info['w'] == 0 or self.preview_paste_info['h'] == 0:
+            raise ValueError("Preview paste info not set or invalid (w or h is 0).")
 
-                        if display_w_on_preview <= 0 or display_h_on_preview <=0: # ゼロ除算を避ける
-                            raise ValueError(f"Preview display size is zero or negative: {display_w_on_preview}x{display_h_on_preview}")
+        preview_area_abs_x1 = self.cam_x - self.cam_width // 2
+        preview_area_abs_y1 = self.cam_y - self.cam_height // 2
 
-                        scale_x = original_capture_width / float(display_w_on_preview)
-                        scale_y = original_capture_height / float(display_h_on_preview)
+        guide_abs_x1, guide_abs_y1, guide_abs_x2, guide_abs_y2 = self.preview_crop_guide_coords
 
-                        crop_orig_x1 = int(guide_rel_image_x1 * scale_x)
-                        crop_orig_y1 = int(guide_rel_image_y1 * scale_y)
-                        crop_orig_x2 = int(guide_rel_image_x2 * scale_x)
-                        crop_orig_y2 = int(guide_rel_image_y2 * scale_y)
+        guide_rel_image_x1 = guide_abs_x1 - preview_area_abs_x1 - self.preview_paste_info['x']
+        guide_rel_image_y1 = guide_abs_y1 - preview_area_abs_y1 - self.preview_paste_info['y']
+        guide_rel_image_x2 = guide_abs_x2 - preview_area_abs_x1 - self.preview_paste_info['x']
+        guide_rel_image_y2 = guide_abs_y2 - preview_area_abs_y1 - self.preview_paste_info['y']
 
-                        crop_orig_x1 = max(0, crop_orig_x1)
-                        crop_orig_y1 = max(0, crop_orig_y1)
-                        crop_orig_x2 = min(original_capture_width, crop_orig_x2)
-                        crop_orig_y2 = min(original_capture_height, crop_orig_y2)
+        display_w_on_preview = self.preview_paste_info['w']
+        display_h_on_preview = self.preview_paste_info['h']
 
-                        # (デバッグプリントは省略)
+        if display_w_on_preview <= 0 or display_h_on_preview <=0: # ゼロ除算を避ける
+            raise ValueError(f"Preview display size is zero or negative: {display_w_on_preview}x{display_h_on_preview}")
 
-                        if crop_orig_x1 >= crop_orig_x2 or crop_orig_y1 >= crop_orig_y2:
-                            error_msg = (f"Invalid crop dimensions after scaling. "
-                                         f"CropBox:({crop_orig_x1},{crop_orig_y1},{crop_orig_x2},{crop_orig_y2}).")
-                            print(f"ERROR: {error_msg}")
-                            raise ValueError(error_msg)
+        scale_x = frame_width / float(display_w_on_preview)
+        scale_y = frame_height / float(display_h_on_preview)
 
-                        cropped_img = img_pil_original_capture.crop((crop_orig_x1, crop_orig_y1, crop_orig_x2, crop_orig_y2))
-                    
-                    # 'with'ブロックの外に移動
-                    permanent_filename_base = f"{expected_flag}_{timestamp}"
-                    final_image_path = os.path.join(self.output_dir, f"guide_cropped_{permanent_filename_base}.jpg")
-                    cropped_img.save(final_image_path, "JPEG", quality=90)
-                    print(f"Saved guide-cropped image to: {final_image_path}")
-
-                    self.captured_images[expected_flag] = final_image_path
-                    print(f"成功！ {flag_name_jp} を追加しました。ファイル: {final_image_path}")
-                    self.draw_result_screen()
-                    return
-                except Exception as e_process_save:
-                    # (以下は変更なし)
-                    print(f"ERROR during image processing/saving for {expected_flag}: {e_process_save}")
-                    if self.message_id and self.canvas.winfo_exists():
-                        self.canvas.itemconfig(self.message_id, text=f"エラー: {expected_flag} の 加工・保存に しっぱい...", fill='red')
-            
-            else:
-                if self.message_id and self.canvas.winfo_exists(): self.canvas.itemconfig(self.message_id, text=f"{flag_name_jp} が みつからない or はっきりしない...", fill='red')
-            
+        crop_orig_x1 = max(0, int(guide_rel_image_x1 * scale_x))
+        crop_orig_y1 = max(0, int(guide_rel_image_y1 * scale_y))
+        crop_orig_x2 = min(frame_width, int(guide_rel_image_x2 * scale_x))
+        crop_orig_y2 = min(frame_height, int(guide_rel_image_y2 * scale_y))
 
+        if crop_orig_x1 >= crop_orig_x2 or crop_orig_y1 >= crop_orig_y2:
+            error_msg = (f"Invalid crop dimensions after scaling. "
+                         f"CropBox:({crop_orig_x1},{crop_orig_y1},{crop_orig_x2},{crop_orig_y2}).")
+            print(f"ERROR: {error_msg}")
+            raise ValueError(error_msg)
 
-        except Exception as e:
-            print(f"ERROR during capture/YOLO processing: {e}")
-            if self.message_id and self.canvas.winfo_exists():
-                self.canvas.itemconfig(self.message_id, text="エラー が はっせい しました", fill='red')
-        finally:
-            if os.path.exists(temp_filename):
-                try:
-                    os.remove(temp_filename)
-                except Exception as e_del:
-                    print(f"Warning: Error deleting temp file {temp_filename}: {e_del}")
+        return crop_orig_x1, crop_orig_y1, crop_orig_x2, crop_orig_y2
 
+    def _detection_roi(self, crop_box, frame_width, frame_height):
+        """ガイド枠 (元フレームの座標) の周りに roi_margin 分の余裕を足した推論範囲を返す。"""
+        x1, y1, x2, y2 = crop_box
+        margin_x = int((x2 - x1) * self.roi_margin)
+        margin_y = int((y2 - y1) * self.roi_margin)
+        return (max(0, x1 - margin_x), max(0, y1 - margin_y),
+                min(frame_width, x2 + margin_x), min(frame_height, y2 + margin_y))
 
-    def _resize_with_aspect_ratio(self, pil_image, target_width, target_height, background_color="black"):
-        """
-        PILイメージをアスペクト比を保持してリサイズし、指定された背景色の中央に配置する。
-        戻り値: PIL.Image.Image オブジェクトと、貼り付け情報。
-        """
-        original_w, original_h = pil_image.size
-        target_aspect_ratio = float(target_width) / target_height # ターゲットエリアのアスペクト比
-        original_aspect_ratio = float(original_w) / original_h
-
-        if original_aspect_ratio > target_aspect_ratio:
-            # 元画像がターゲットエリアより横長の場合 (レターボックス)
-            # -> ターゲット幅いっぱいにリサイズ
-            display_w = target_width
-            display_h = int(target_width / original_aspect_ratio)
-        else:
-            # 元画像がターゲットエリアより縦長または同じアスペクト比の場合 (ピラーボックス)
-            # -> ターゲット高さいっぱいにリサイズ
-            display_h = target_height
-            display_w = int(target_height * original_aspect_ratio)
-
-        # アスペクト比を保持してリサイズ
-        resized_image = pil_image.resize((display_w, display_h), Image.Resampling.LANCZOS)
-
-        # 背景イメージを作成し、中央にリサイズ画像を貼り付け
-        final_image = Image.new("RGB", (target_width, target_height), background_color)
-        paste_x = (target_width - display_w) // 2
-        paste_y = (target_height - display_h) // 2
-        final_image.paste(resized_image, (paste_x, paste_y))
-        
-        # ★★★ 修正点: 計算した情報を返す ★★★
-        return final_image, paste_x, paste_y, display_w, display_h
-    
     def reset_all(self):
         """
         全てのキャプチャ画像と状態をリセットして初期状態に戻ります。
@@ -997,9 +1101,11 @@ class BlockGameApp:
         
         # 1. キャプチャ画像の記録をリセット
         self.captured_images = {flag: None for flag in self.flag_map.values()}
+        self.captured_thumbnails = {flag: None for flag in self.flag_map.values()}
         print("Captured image records have been reset.")
 
-        # 2. `output_images` ディレクトリの中身を削除
+        # 2. `output_images` ディレクトリの中身を削除 (書きかけの画像を書き終えてから)
+        self.image_writer.flush()
         if os.path.isdir(self.output_dir):
             try:
                 # 一度フォルダごと削除して、作り直すのが確実
@@ -1026,12 +1132,173 @@ class BlockGameApp:
 
                     messagebox.showerror("リセットエラー", f"画像の保存フォルダのリセット中にエラーがおきました。\n{e}")
         
-        # 3. メイン画面を再描画して見た目を更新
+        # 3. 国旗ボタンを作り直すようにして、メイン画面を再描画
+        self.layers.invalidate("main_flags")
         self.draw_main_screen()
         print("--- Reset Complete ---")
 
 
-    
+    def _on_explanation_results(self, session, results, frame_seq, frame):
+        """
+        推論ワーカーから届いた結果を投票に加え、国旗を認識したら詳細画面へ進む (メインスレッドで実行される)。
+        results は frame (通し番号 frame_seq) のもので、いま表示しているフレームより古いことがある。
+        """
+        # 画面を離れた後や、前回のせつめい画面の結果は捨てる
+        if self.current_screen != "explanation" or session != self.explanation_session:
+            return
+        if not self.canvas.winfo_exists():
+            return
+
+        try:
+            # この結果の国旗ごとの一番高い信頼度
+            flag_confidences = {}
+            # 追跡用の検出 [(国旗, 信頼度, 元のフレームでの箱)]
+            flag_detections = []
+
+            print(f"--- DEBUG (Frame {self.frame_count}): YOLO Detection Results ---")
+            if results and len(results[0].boxes) > 0:
+                current_frame_detections = []
+                for i, box in enumerate(results[0].boxes):
+                    confidence = box.conf[0].item()
+                    label_index = int(box.cls[0].item())
+                    object_type = self.model.names.get(label_index, "Unknown")
+                    current_frame_detections.append(f"   検出 {i+1}: タイプ='{object_type}', 信頼度={confidence:.2f}")
+
+                    if object_type in self.flag_map.values():
+                        flag_confidences[object_type] = max(confidence, flag_confidences.get(object_type, 0.0))
+                        if confidence >= self.explanation_voter.min_confidence:
+                            box_xyxy = self.explanation_letterbox.to_original(box.xyxy[0].tolist())
+                            flag_detections.append((object_type, confidence, box_xyxy))
+
+                for detection_str in current_frame_detections:
+                    print(detection_str)
+            else:
+                print("   検出なし")
+
+            # 何か映っている間は、画面が止まっていても推論を続ける
+            self.inference_scheduler.note_result(bool(results and len(results[0].boxes) > 0))
+
+            # 追跡中の箱を、推論したフレームのときの箱と比べて確かめる (見失っていれば検出から追い直す)
+            self.explanation_tracker.correct(flag_detections, frame_seq, frame, self.last_frame, self.last_frame_seq)
+            self._draw_tracked_box()
+
+            # 信頼度を積み上げる (1回見落としてもゼロには戻らない)
+            recognized_flag = self.explanation_voter.update(flag_confidences)
+            leader, score = self.explanation_voter.leader()
+            print(f"   投票: {leader} {score:.2f} / {self.explanation_voter.threshold:.2f}")
+            print("------------------------------------------")
+
+            # テキスト表示の更新
+            display_text = "こっき を かざしてね！"
+            fill_color = "white"
+            if leader:
+                display_jp_name = self.flag_names_jp.get(leader, leader)
+                display_text = f"「{display_jp_name}」が検知されたよ！"
+                fill_color = "green"
+            self.canvas.itemconfig(self.explanation_screen_message_id, text=display_text, fill=fill_color)
+
+            # ★★★ 進捗テキストの更新（国名付き） ★★★
+            if self.explanation_progress_text_id:
+                if leader:
+                    progress_text = f"{self.flag_names_jp.get(leader, leader)} {int(self.explanation_voter.progress() * 100)}%"
+                else:
+                    progress_text = "国をカメラにかざして"
+                self.canvas.itemconfig(self.explanation_progress_text_id, text=progress_text)
+
+            # 十分な確かさになったら詳細画面へ遷移
+            if recognized_flag:
+                print(f"Recognized {recognized_flag} in {self.explanation_voter.time_to_recognize:.2f}s")
+                print(f"Inference scheduler stats: {self.inference_scheduler.stats()}")
+                for num, name in self.flag_map.items():
+                    if name == recognized_flag:
+                        self.blocknumber = num
+                        break
+                print(f"Auto-navigating to detail screen for {recognized_flag}")
+                # 中間状態やメイン画面描画を挟まず、直接詳細画面を呼び出す
+                self.detail_screen()
+
+        except tk.TclError as e:
+            print(f"TclError updating explanation screen (item might be deleted): {e}")
+
+    def _draw_tracked_box(self):
+        """追跡中の箱をプレビュー上の座標に直して描く。追跡していなければ隠す。"""
+        tracker = self.explanation_tracker
+        if not tracker.active or self.preview_paste_info['w'] == 0 or self.last_frame is None:
+            self.canvas.itemconfig(self.explanation_track_box_id, state="hidden")
+            self.canvas.itemconfig(self.explanation_track_label_id, state="hidden")
+            return
+
+        frame_h, frame_w = self.last_frame.shape[:2]
+        scale_x = self.preview_paste_info['w'] / float(frame_w)
+        scale_y = self.preview_paste_info['h'] / float(frame_h)
+        origin_x = self.cam_x - self.cam_width // 2 + self.preview_paste_info['x']
+        origin_y = self.cam_y - self.cam_height // 2 + self.preview_paste_info['y']
+
+        # プレビューの外にはみ出さないようにする
+        x1, y1, x2, y2 = tracker.box
+        x1 = origin_x + min(max(x1, 0), frame_w) * scale_x
+        x2 = origin_x + min(max(x2, 0), frame_w) * scale_x
+        y1 = origin_y + min(max(y1, 0), frame_h) * scale_y
+        y2 = origin_y + min(max(y2, 0), frame_h) * scale_y
+        self.canvas.coords(self.explanation_track_box_id, x1, y1, x2, y2)
+        self.canvas.itemconfig(self.explanation_track_box_id, state="normal")
+        self.canvas.coords(self.explanation_track_label_id, x1, y1)
+        self.canvas.itemconfig(self.explanation_track_label_id, state="normal",
+                               text=self.flag_names_jp.get(tracker.label, tracker.label))
+
+    def _on_model_ready(self, model):
+        """モデルの読み込みとウォームアップが終わったときにメインスレッドで呼ばれる。"""
+        self.model = model
+        # Verify class names match self.flag_map values AFTER model loads
+        model_classes_dict = self.model.names
+        model_classes_set = set(model_classes_dict.values())
+        expected_classes_set = set(self.flag_map.values())
+        print(f"Model Classes Found: {model_classes_set}")
+        print(f"Expected Classes: {expected_classes_set}")
+        if not expected_classes_set.issubset(model_classes_set):
+            missing = expected_classes_set - model_classes_set
+            extra = model_classes_set - expected_classes_set
+            msg = f"Model class mismatch!\nMissing: {missing}\nUnexpected: {extra}\nCheck model and flag_map."
+            messagebox.showwarning("Model Warning", msg)
+            print(f"WARNING: {msg}") # Also print to console
+
+        # せつめい画面の推論はバックグラウンドで行い、結果は root.after で受け取る
+        self.inference_worker = InferenceWorker(self.root, self.model, self._on_explanation_results, lock=self.model_lock,
+                                                preprocess=self.explanation_letterbox, imgsz=DETECT_IMGSZ)
+
+        if self.model_status_id and self.canvas.winfo_exists():
+            self.canvas.itemconfig(self.model_status_id, text="")
+
+        self.startup_timer.mark("model_ready")
+        self.startup_timer.report(model_load=self.model_loader.load_time, model_warmup=self.model_loader.warmup_time)
+
+    def _on_model_error(self, error):
+        messagebox.showerror("YOLO Error", f"Failed to load YOLO model 'Rebest.pt': {error}")
+        self.on_close()
+
+    def _model_not_ready(self, message_id):
+        """モデルがまだ準備中なら message_id にお知らせを出して True を返す。"""
+        if self.model_loader.ready:
+            return False
+        if message_id and self.canvas.winfo_exists():
+            self.canvas.itemconfig(message_id, text="じゅんびちゅう... ちょっとまってね", fill="orange")
+        return True
+
+    def _show_camera_error(self):
+        """フレーム取得に失敗したことを現在の画面のメッセージに表示する。"""
+        if self.current_screen in ["next", "explanation"] and self.canvas.winfo_exists():
+            try:
+                target_message_id = None
+                if self.current_screen == "next":
+                    target_message_id = self.message_id
+                elif self.current_screen == "explanation":
+                    target_message_id = self.explanation_screen_message_id
+
+                if target_message_id and self.canvas.winfo_exists():
+                    self.canvas.itemconfig(target_message_id, text="カメラから映像取得失敗", fill="red")
+            except tk.TclError:
+                pass
+
     def update_frame(self):
         # print(f"Current time: {time.time():.2f} JST, Frame: {self.frame_count}, Screen: {self.current_screen}")
 
@@ -1040,27 +1307,26 @@ class BlockGameApp:
             self.root.after(33, self.update_frame)
             return
 
-        if not (hasattr(self, 'capture') and self.capture and self.capture.isOpened()):
+        if not (hasattr(self, 'camera') and self.camera.is_opened()):
             print("Camera not open, retrying in 1 second.")
             self.root.after(1000, self.update_frame)
             return
 
-        ret, frame = self.capture.read()
-        if not ret: # フレーム取得失敗の場合
-            if self.current_screen in ["next", "explanation"] and self.canvas.winfo_exists():
-                try:
-                    target_message_id = None
-                    if self.current_screen == "next":
-                        target_message_id = self.message_id
-                    elif self.current_screen == "explanation":
-                        target_message_id = self.explanation_screen_message_id
-
-                    if target_message_id and self.canvas.winfo_exists():
-                        self.canvas.itemconfig(target_message_id, text="カメラから映像取得失敗", fill="red")
-                except tk.TclError:
-                    pass
+        # 読み込みスレッドが更新した最新フレームを取り出す (ブロックしない)
+        frame_seq = self.camera.frame_seq
+        if frame_seq == self.last_frame_seq:
+            # 新しいフレームがまだ来ていない
+            if self.camera.read_failed:
+                self._show_camera_error()
+            self.root.after(15, self.update_frame)
+            return
+        frame = self.camera.read_latest()
+        if frame is None: # フレーム取得失敗の場合
+            self._show_camera_error()
             self.root.after(33, self.update_frame) # 引き続きフレーム更新を試みる
             return
+        self.last_frame_seq = frame_seq
+        self.startup_timer.mark("first_frame")
 
         # フレームが正常に取得できた場合のみ処理を続行
         self.frame_count += 1
@@ -1068,147 +1334,51 @@ class BlockGameApp:
 
         if self.current_screen in ["next", "explanation"] and self.canvas.winfo_exists():
             try:
-                frame_rgb = cv2.cvtColor(self.last_frame, cv2.COLOR_BGR2RGB)
-                frame_image_pil = Image.fromarray(frame_rgb)
-
                 # プレビューサイズを画面に応じて切り替え
                 target_cam_width = 0
                 target_cam_height = 0
-                cam_feed_image_id_ref = None
-                cam_feed_text_id_ref = None
-                cam_x_offset = 0
-                cam_y_offset = 0
+                cam_feed_image_id = None
 
                 if self.current_screen == "next":
                     target_cam_width = self.cam_width
                     target_cam_height = self.cam_height
-                    cam_feed_image_id_ref = "cam_feed_image_id"
-                    cam_feed_text_id_ref = "cam_feed_text_id"
-                    cam_x_offset = self.cam_x
-                    cam_y_offset = self.cam_y
+                    cam_feed_image_id = self.cam_feed_image_id
                 elif self.current_screen == "explanation":
                     target_cam_width = self.cam_width # `draw_explanation_screen`で更新された値
                     target_cam_height = self.cam_height # `draw_explanation_screen`で更新された値
-                    cam_feed_image_id_ref = "explanation_cam_feed_image_id"
-                    cam_feed_text_id_ref = "explanation_screen_message_id"
-                    cam_x_offset = self.cam_x
-                    cam_y_offset = self.cam_y
-
-                processed_preview_pil, paste_x, paste_y, display_w, display_h = self._resize_with_aspect_ratio(
-                    frame_image_pil,
-                    target_cam_width,
-                    target_cam_height
-                )
-                self.preview_paste_info = {'x': paste_x, 'y': paste_y, 'w': display_w, 'h': display_h}
-                self.image_tk = ImageTk.PhotoImage(image=processed_preview_pil) # 参照を保持 (重要: GC防止)
-
-                current_cam_feed_image_id = getattr(self, cam_feed_image_id_ref)
-                current_cam_feed_text_id = getattr(self, cam_feed_text_id_ref)
-
-                # カメラフィード画像の更新または作成
-                if current_cam_feed_image_id and self.canvas.winfo_exists() and self.canvas.type(current_cam_feed_image_id):
-                    self.canvas.itemconfig(current_cam_feed_image_id, image=self.image_tk)
-                elif self.canvas.winfo_exists():
-                    setattr(self, cam_feed_image_id_ref, self.canvas.create_image(cam_x_offset, cam_y_offset, anchor=tk.CENTER, image=self.image_tk))
-                    # カメラフィードのテキストがあれば削除
-                    if current_cam_feed_text_id and self.canvas.winfo_exists() and self.canvas.type(current_cam_feed_text_id):
-                        self.canvas.delete(current_cam_feed_text_id)
-                        setattr(self, cam_feed_text_id_ref, None) # 削除したらIDをNoneにする
+                    cam_feed_image_id = self.explanation_cam_feed_image_id
+
+                # 事前確保したバッファに直接縮小し、同じ PhotoImage を paste で更新する
+                preview_tk = self.preview.render(self.last_frame, target_cam_width, target_cam_height)
+                self.preview_paste_info = self.preview.paste_info
+                photo_changed = preview_tk is not self.image_tk
+                self.image_tk = preview_tk # 参照を保持 (重要: GC防止)
+
+                # カメラ画像のアイテムは画面を作ったときに用意済み。
+                # PhotoImage は使い回すので、画面に入って最初のフレーム (差し替え時) だけ itemconfig する
+                if photo_changed and cam_feed_image_id and self.canvas.winfo_exists():
+                    self.canvas.itemconfig(cam_feed_image_id, image=self.image_tk, state="normal")
+                    if self.current_screen == "next":
+                        # カメラ準備中のテキストを隠す
+                        self.canvas.itemconfig(self.cam_feed_text_id, state="hidden")
+                    else:
+                        self.canvas.itemconfig(self.explanation_screen_message_id, text="こっき を かざしてね！", fill="white")
 
-                if self.current_screen == "next":
-                    if self.canvas.winfo_exists() and self.canvas.find_withtag("crop_guide_rect"):
-                        self.canvas.tag_raise("crop_guide_rect")
-                elif self.current_screen == "explanation":
+                if self.current_screen == "explanation":
                     # Explanation screen specific logic
-                    # 10フレームごとにYOLO検出を実行
-                    if self.frame_count % 10 == 0:
-                        results = self.model(self.last_frame, verbose=False)
-                        detected_flag_name = None
-                        best_confidence = 0.4 # Confidence threshold for detection
-                        
-                        print(f"--- DEBUG (Frame {self.frame_count}): YOLO Detection Results ---")
-                        if results and len(results[0].boxes) > 0:
-                            current_frame_detections = []
-                            for i, box in enumerate(results[0].boxes):
-                                confidence = box.conf[0].item()
-                                label_index = int(box.cls[0].item())
-                                object_type = self.model.names.get(label_index, "Unknown")
-                                current_frame_detections.append(f"   検出 {i+1}: タイプ='{object_type}', 信頼度={confidence:.2f}")
-
-                                # 最も信頼度の高い有効なフラグを特定
-                                if object_type in self.flag_map.values() and confidence > best_confidence:
-                                    best_confidence = confidence
-                                    detected_flag_name = object_type
-                            
-                            for detection_str in current_frame_detections:
-                                print(detection_str)
-                        else:
-                            print("   検出なし")
-                        
-                        # 検出結果に基づいて連続カウントを更新
-                        if detected_flag_name and detected_flag_name == self.last_detected_explanation_flag:
-                            self.explanation_detection_count += 1
-                        elif detected_flag_name: # 新しいフラグが検出された場合
-                            self.last_detected_explanation_flag = detected_flag_name
-                            self.explanation_detection_count = 1
-                        else: # 何も検出されなかった場合、または有効なフラグが検出されなかった場合
-                            self.last_detected_explanation_flag = None
-                            self.explanation_detection_count = 0
-                        
-                        print(f"   現在の連続検出フレーム数: {self.explanation_detection_count}")
-                        print("------------------------------------------")
-
-                        # テキスト表示の更新
-                        display_text = "こっき を かざしてね！"
-                        fill_color = "white"
-                        if self.last_detected_explanation_flag:
-                            display_jp_name = self.flag_names_jp.get(self.last_detected_explanation_flag, self.last_detected_explanation_flag)
-                            display_text = f"「{display_jp_name}」が検知されたよ！（連続　{self.explanation_detection_count}フレーム）"
-                            fill_color = "green"
-                        self.canvas.itemconfig(self.explanation_screen_message_id, text=display_text, fill=fill_color)
-                        self.root.update_idletasks() # 画面表示を即時更新
-
-                        # ★★★ 進捗テキストの更新（国名付き） ★★★
-                        if hasattr(self, 'explanation_progress_text_id') and self.explanation_progress_text_id:
-                            if self.last_detected_explanation_flag:
-                                display_jp_name = self.flag_names_jp.get(self.last_detected_explanation_flag, self.last_detected_explanation_flag)
-                                progress_text = f"{display_jp_name} 連続検出 {self.explanation_detection_count} / 5"
-                            else:
-                                progress_text = "国をカメラにかざして"
-                            self.canvas.itemconfig(self.explanation_progress_text_id, text=progress_text)
-
-                        # 9フレーム連続検出で詳細画面へ遷移
-                        if self.explanation_detection_count >= 5:
-                            found_block_num = None
-                            for num, name in self.flag_map.items():
-                                if name == self.last_detected_explanation_flag:
-                                    found_block_num = num
-                                    break
-                            
-                            if found_block_num is not None:
-                                self.blocknumber = found_block_num
-                                print(f"Auto-navigating to detail screen for {self.last_detected_explanation_flag}")
-                                # 中間状態やメイン画面描画を挟まず、直接詳細画面を呼び出す
-                                self.detail_screen()
-                                # ★★★ 修正点: returnを削除し、ループが継続するようにする ★★★
-                                # return
-                            else:
-                                print(f"ERROR: Detected flag '{self.last_detected_explanation_flag}' not found in flag_map for transition.")
-                                # マップにない国旗が検出されたが遷移できない場合、カウントをリセットして継続
-                                self.last_detected_explanation_flag = None
-                                self.explanation_detection_count = 0
-                                if self.canvas.winfo_exists(): # ウィジェットが存在するか確認
-                                    try:
-                                        self.canvas.itemconfig(self.explanation_screen_message_id, text="不明な国旗です。こっき を かざしてね！", fill="red")
-                                    except tk.TclError:
-                                        print("Could not update explanation message; canvas item may be gone.")
+                    # 推論のないフレームでも、追跡中の箱を動かして描き直す
+                    if self.explanation_tracker.active:
+                        self.explanation_tracker.update(self.last_frame, self.last_frame_seq)
+                        self._draw_tracked_box()
+                    # 画面が変わったとき・検出中のときだけ最新フレームを推論ワーカーへ渡す (結果は _on_explanation_results で受け取る)
+                    if (self.inference_worker is not None
+                            and self.inference_scheduler.should_infer(self.last_frame, self.inference_worker)):
+                        self.inference_worker.submit(self.last_frame, tag=self.explanation_session, frame_seq=self.last_frame_seq)
 
             except tk.TclError as e:
                 print(f"TclError updating camera feed or canvas item (item might be deleted): {e}")
                 # Tkinterオブジェクトがすでに破棄されている場合に発生。画面遷移中によく起こる。
-                # 参照をNoneにリセットし、次回描画時に再作成を試みる。
-                self.cam_feed_image_id = None
-                self.explanation_cam_feed_image_id = None
+                # PhotoImage参照をリセットし、次のフレームで画像を設定し直す。
                 self.image_tk = None # PhotoImage参照もクリア
             except Exception as e:
                 print(f"Error in update_frame (current_screen: {self.current_screen}) : {e}")
@@ -1220,18 +1390,18 @@ class BlockGameApp:
 
     def on_close(self):
         print("Closing application...")
-        if hasattr(self, 'capture') and self.capture and self.capture.isOpened():
-           #self.capture.release()
+        self.cancel_shutter_job()
+        if hasattr(self, 'assets'):
+            print(f"Asset cache stats: {self.assets.stats()}")
+        if getattr(self, 'inference_worker', None) is not None:
+            print(f"Inference scheduler stats: {self.inference_scheduler.stats()}")
+            self.inference_worker.stop()
+        if hasattr(self, 'camera'):
+            self.camera.release()
             print("Camera released.")
+        if hasattr(self, 'image_writer'):
+            self.image_writer.close() # キューに残っている画像を書き終えてから閉じる
 
-        print("Cleaning temporary files...")
-        for item in os.listdir('.'):
-            if item.startswith("captured_image_temp_") and item.endswith(".jpg"):
-                try:
-                    os.remove(item)
-                    print(f"Deleted: {item}")
-                except Exception as e:
-                    print(f"Error deleting {item}: {e}")
         self.root.destroy()
 
     
@@ -1262,6 +1432,7 @@ if __name__ == "__main__":
     bottom_position1 = 320
     bottom_position2 = 470
 
-    app = BlockGameApp(root)
+    # python top.py --int8 で量子化したモデルを使う (model_export.py --int8 で作っておく)
+    app = BlockGameApp(root, quantized="--int8" in sys.argv[1:])
     root.protocol("WM_DELETE_WINDOW", app.on_close)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,57 @@
+# letterbox.py
+import cv2
+import numpy as np
+
+from model_export import DETECT_IMGSZ
+
+
+class Letterbox:
+    """
+    カメラのフレームを、縦横比を保ったまま size x size (訓練時の 480x480) に縮小して
+    灰色 (114) の余白で埋めるクラス。ultralytics の前処理と同じ形にしておけば、
+    モデル側ではリサイズが起きない。
+    出力先のバッファは最初に一度だけ確保し、毎回そこに直接書き込む。
+    フレームの大きさが変わらない限り、余白の計算もやり直さない。
+    1つのインスタンスは1つのスレッドからだけ使うこと (バッファを共有しているため)。
+    """
+
+    def __init__(self, size=DETECT_IMGSZ, color=114):
+        self.size = size
+        self.color = color
+        self.buffer = np.full((size, size, 3), color, dtype=np.uint8)
+        self.frame_shape = None  # (高さ, 幅)
+        self.scale = 1.0
+        self.pad_x = 0
+        self.pad_y = 0
+        self._roi = None
+        self._interpolation = cv2.INTER_AREA
+
+    def _configure(self, frame_h, frame_w):
+        self.scale = min(self.size / frame_h, self.size / frame_w)
+        new_w = min(self.size, int(round(frame_w * self.scale)))
+        new_h = min(self.size, int(round(frame_h * self.scale)))
+        self.pad_x = (self.size - new_w) // 2
+        self.pad_y = (self.size - new_h) // 2
+        self.buffer[:] = self.color
+        self._roi = self.buffer[self.pad_y:self.pad_y + new_h, self.pad_x:self.pad_x + new_w]
+        # 縮小は INTER_AREA、拡大は INTER_LINEAR
+        self._interpolation = cv2.INTER_AREA if self.scale < 1.0 else cv2.INTER_LINEAR
+        self.frame_shape = (frame_h, frame_w)
+
+    def __call__(self, frame):
+        """frame (BGR) をバッファに描き、そのバッファを返す。次の呼び出しで上書きされる。"""
+        frame_h, frame_w = frame.shape[:2]
+        if (frame_h, frame_w) != self.frame_shape:
+            self._configure(frame_h, frame_w)
+        cv2.resize(frame, (self._roi.shape[1], self._roi.shape[0]), dst=self._roi, interpolation=self._interpolation)
+        return self.buffer
+
+    def to_original(self, box):
+        """バッファ上の箱 (x1, y1, x2, y2) を元のフレームの座標に戻す (フレームの内側に収める)。"""
+        frame_h, frame_w = self.frame_shape
+        x1, y1, x2, y2 = [float(v) for v in box]
+        x1 = min(max((x1 - self.pad_x) / self.scale, 0.0), frame_w)
+        x2 = min(max((x2 - self.pad_x) / self.scale, 0.0), frame_w)
+        y1 = min(max((y1 - self.pad_y) / self.scale, 0.0), frame_h)
+        y2 = min(max((y2 - self.pad_y) / self.scale, 0.0), frame_h)
+        return [x1, y1, x2, y2]
@@ -0,0 +1,121 @@
+# model_benchmark.py
+"""
+FP32 のモデルと INT8 に量子化したモデルを、同じ画像で精度と速度を比べるスクリプト。
+
+正解ラベルはファイル名から決める:
+    image/Japan.png など           -> ファイル名がクラス名 (Holland は Oranda として扱う)
+    captured_image_3.jpg など      -> 番号を kokki_UI の flag_map の順で国に直す
+それ以外の画像は速度と「2つのモデルの答えが同じか」だけに使う。
+各画像で一番信頼度の高い検出を、そのモデルの答えとする。
+
+使い方 (kokki_UI ディレクトリで):
+    python ../model_benchmark.py Rebest.pt
+    python ../model_benchmark.py Rebest.pt --reference Rebest.onnx --candidate Rebest_int8.onnx --runs 20
+"""
+import argparse
+import glob
+import os
+import re
+import time
+
+import cv2
+import numpy as np
+
+from model_export import DETECT_IMGSZ, KOKKI_FLAGS, exported_path, resolve_weights
+
+DEFAULT_IMAGES = ["image/*.png", "image/*.jpg", "captured_image_*.jpg"]
+LABEL_ALIASES = {"Holland": "Oranda"}
+
+
+def label_for(path, class_names):
+    """ファイル名から正解のクラス名を返す。わからなければ None。"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    stem = LABEL_ALIASES.get(stem, stem)
+    if stem in class_names:
+        return stem
+    match = re.fullmatch(r"captured_image_(\d+)", stem)
+    if match and int(match.group(1)) < len(KOKKI_FLAGS):
+        return KOKKI_FLAGS[int(match.group(1))]
+    return None
+
+
+def evaluate(model_path, images, imgsz=DETECT_IMGSZ, conf=0.25, runs=10, warmup=2):
+    """
+    各画像について一番信頼度の高いクラス名 (なければ None) と、推論時間 (秒) のリストを返す。
+    画像は先にデコードしておき、推論だけを計る。
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(model_path, task="detect")
+    frames = [cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR) for path in images]
+    for _ in range(warmup):
+        model(frames[0], imgsz=imgsz, conf=conf, verbose=False)
+
+    predictions = []
+    latencies = []
+    for frame in frames:
+        top = None
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = model(frame, imgsz=imgsz, conf=conf, verbose=False)[0]
+            latencies.append(time.perf_counter() - start)
+        if len(result.boxes) > 0:
+            best = int(result.boxes.conf.argmax().item())
+            top = model.names[int(result.boxes.cls[best].item())]
+        predictions.append(top)
+    return predictions, latencies, dict(model.names)
+
+
+def _latency_summary(latencies):
+    ms = np.array(latencies) * 1000.0
+    return f"mean {ms.mean():6.1f} ms  p95 {np.percentile(ms, 95):6.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare accuracy and latency of the FP32 and INT8 detectors.")
+    parser.add_argument("weights", help="path to the .pt weights (e.g. Rebest.pt)")
+    parser.add_argument("--reference", help="FP32 model (default: the ONNX export if present, else the .pt)")
+    parser.add_argument("--candidate", help="quantized model (default: <stem>_int8.onnx)")
+    parser.add_argument("--images", nargs="+", default=DEFAULT_IMAGES, help="evaluation images (globs allowed)")
+    parser.add_argument("--imgsz", type=int, default=DETECT_IMGSZ)
+    parser.add_argument("--runs", type=int, default=10, help="timed runs per image")
+    args = parser.parse_args()
+
+    reference = args.reference or resolve_weights(args.weights, ("onnx",))
+    candidate = args.candidate or exported_path(args.weights, "int8")
+    images = sorted({p for pattern in args.images for p in (glob.glob(pattern) if glob.has_magic(pattern) else [pattern])})
+    if not images:
+        raise SystemExit("No evaluation images found.")
+    print(f"{len(images)} images, {args.runs} runs each, imgsz {args.imgsz}")
+
+    results = {}
+    for name, path in (("FP32", reference), ("INT8", candidate)):
+        print(f"Running {name}: {path}")
+        results[name] = evaluate(path, images, args.imgsz, runs=args.runs)
+
+    class_names = set(results["FP32"][2].values())
+    labels = [label_for(path, class_names) for path in images]
+
+    print("\n--- Per-class accuracy (top-1 on labelled images) ---")
+    print(f"  {'class':<10} {'n':>3}  {'FP32':>6}  {'INT8':>6}")
+    for cls in sorted({label for label in labels if label}):
+        idx = [i for i, label in enumerate(labels) if label == cls]
+        row = []
+        for name in ("FP32", "INT8"):
+            predictions = results[name][0]
+            row.append(sum(predictions[i] == cls for i in idx) / len(idx))
+        print(f"  {cls:<10} {len(idx):>3}  {row[0]:6.1%}  {row[1]:6.1%}")
+
+    agree = sum(a == b for a, b in zip(results["FP32"][0], results["INT8"][0]))
+    print(f"\nTop-1 agreement FP32 vs INT8: {agree}/{len(images)}")
+    for i, path in enumerate(images):
+        if results["FP32"][0][i] != results["INT8"][0][i]:
+            print(f"  differs: {path}: {results['FP32'][0][i]} vs {results['INT8'][0][i]}")
+
+    print("\n--- Latency per inference ---")
+    for name in ("FP32", "INT8"):
+        print(f"  {name}: {_latency_summary(results[name][1])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+# model_export.py
+"""
+YOLO の重み (.pt) を ONNX / OpenVINO に書き出すスクリプトと、書き出したモデルを探す関数。
+GPU のない PC では PyTorch より ONNX Runtime / OpenVINO の方が速く推論できる。
+ModelLoader は書き出したモデルがあれば自動でそちらを使う。
+
+使い方 (重みファイルのあるディレクトリで):
+    python ../model_export.py Rebest.pt                    # Rebest.onnx を作り、*.jpg で一致を確認
+    python model_export.py bestbest.pt --format onnx openvino
+    python model_export.py bestbest.pt --check-only --images car_0024.jpg sample.jpg
+    python ../model_export.py Rebest.pt --int8 --images "captured_image_*.jpg" "image/*.png"
+                                                          # Rebest_int8.onnx も作る (画像で較正)
+"""
+import argparse
+import glob
+import os
+
+import cv2
+import numpy as np
+
+# モデルの訓練時の入力サイズ (caution.txt 参照)。書き出したモデルはこのサイズ固定になる
+DETECT_IMGSZ = 480
+
+# こっきアプリ (kokki_UI) の国旗。モデルのクラス名と image/ の画像ファイル名に使う
+KOKKI_FLAGS = ["Japan", "Sweden", "Estonia", "Oranda", "Germany", "Denmark"]
+
+# 優先して使う順
+EXPORT_FORMATS = ("openvino", "onnx")
+# INT8 に量子化した ONNX (ModelLoader で quantized=True のときだけ使う)
+QUANTIZED_FORMATS = ("int8",)
+
+
+def exported_path(weights, fmt):
+    """ultralytics が書き出すファイル (ディレクトリ) のパス。"""
+    stem = os.path.splitext(weights)[0]
+    if fmt == "onnx":
+        return stem + ".onnx"
+    if fmt == "openvino":
+        return stem + "_openvino_model"
+    if fmt == "int8":
+        return stem + "_int8.onnx"
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+def resolve_weights(weights, formats=EXPORT_FORMATS):
+    """
+    書き出したモデルがあればそのパスを、なければ weights をそのまま返す。
+    .pt の方が新しい (書き出し後に学習し直した) 場合は書き出したモデルを使わない。
+    """
+    pt_mtime = os.path.getmtime(weights) if os.path.exists(weights) else None
+    for fmt in formats:
+        path = exported_path(weights, fmt)
+        if os.path.exists(path) and (pt_mtime is None or os.path.getmtime(path) >= pt_mtime):
+            return path
+    return weights
+
+
+def export(weights, formats=("onnx",), imgsz=DETECT_IMGSZ):
+    """weights を formats の形式で書き出し、書き出したパスのリストを返す。"""
+    from ultralytics import YOLO
+
+    model = YOLO(weights)
+    paths = []
+    for fmt in formats:
+        path = model.export(format=fmt, imgsz=imgsz, dynamic=False, half=False)
+        print(f"Exported {weights} -> {path} ({imgsz}x{imgsz})")
+        paths.append(str(path))
+    return paths
+
+
+def preprocess(path, imgsz=DETECT_IMGSZ):
+    """
+    ultralytics と同じ前処理 (縦横比を保って縮小し、灰色 114 で余白を埋める) をした
+    1x3xHxW の float32 配列を返す。量子化の較正に使う。
+    """
+    # 日本語のファイル名でも読めるように imdecode を使う
+    image = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"Cannot read image: {path}")
+    h, w = image.shape[:2]
+    scale = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - new_h) // 2, (imgsz - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    blob = cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)[np.newaxis].astype(np.float32) / 255.0
+    return np.ascontiguousarray(blob)
+
+
+def quantize(onnx_path, calibration_images, mode="static", imgsz=DETECT_IMGSZ):
+    """
+    FP32 の ONNX を INT8 に量子化して <stem>_int8.onnx に書き出し、そのパスを返す。
+    static はカメラで撮った画像などで活性化の範囲を較正する (精度が出やすい)。dynamic は較正なし。
+    """
+    import onnx
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_dynamic, quantize_static)
+
+    stem = os.path.splitext(onnx_path)[0]
+    out_path = stem + "_int8.onnx"
+
+    if mode == "dynamic":
+        quantize_dynamic(onnx_path, out_path, weight_type=QuantType.QUInt8)
+    elif mode == "static":
+        if not calibration_images:
+            raise ValueError("Static quantization needs calibration images.")
+        input_name = onnx.load(onnx_path, load_external_data=False).graph.input[0].name
+
+        class _Reader(CalibrationDataReader):
+            def __init__(self):
+                self._paths = iter(calibration_images)
+
+            def get_next(self):
+                path = next(self._paths, None)
+                return None if path is None else {input_name: preprocess(path, imgsz)}
+
+        quantize_static(onnx_path, out_path, _Reader(), quant_format=QuantFormat.QDQ,
+                        per_channel=True, activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    else:
+        raise ValueError(f"Unknown quantization mode: {mode}")
+
+    # クラス名や入力サイズなど ultralytics が読むメタデータを元のモデルから引き継ぐ
+    source = onnx.load(onnx_path, load_external_data=False)
+    quantized = onnx.load(out_path)
+    existing = {prop.key for prop in quantized.metadata_props}
+    for prop in source.metadata_props:
+        if prop.key not in existing:
+            quantized.metadata_props.add(key=prop.key, value=prop.value)
+    onnx.save(quantized, out_path)
+    print(f"Quantized {onnx_path} -> {out_path} ({mode}, {len(calibration_images)} calibration images)")
+    return out_path
+
+
+def _detections(model, image, imgsz, conf):
+    result = model(image, imgsz=imgsz, conf=conf, verbose=False)[0]
+    boxes = result.boxes
+    return [(int(boxes.cls[i].item()), float(boxes.conf[i].item()), boxes.xyxy[i].tolist())
+            for i in range(len(boxes))]
+
+
+def _iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def check_parity(weights, exported, images, imgsz=DETECT_IMGSZ, conf=0.25, min_iou=0.9, conf_tol=0.05):
+    """
+    元の重みと書き出したモデルで同じ画像を推論し、クラス・箱・信頼度が許容範囲内で一致するか確認する。
+    一致すれば True。画像ごとの結果を表示する。
+    """
+    from ultralytics import YOLO
+
+    reference = YOLO(weights)
+    candidate = YOLO(exported, task="detect")
+
+    if dict(reference.names) != dict(candidate.names):
+        print(f"Class names differ: {reference.names} vs {candidate.names}")
+        return False
+
+    all_ok = True
+    for path in images:
+        expected = _detections(reference, path, imgsz, conf)
+        actual = _detections(candidate, path, imgsz, conf)
+        problems = []
+        unmatched = list(actual)
+        for cls, score, box in expected:
+            # 同じクラスで一番重なる箱を対応させる
+            candidates = [d for d in unmatched if d[0] == cls]
+            best = max(candidates, key=lambda d: _iou(box, d[2]), default=None)
+            if best is None or _iou(box, best[2]) < min_iou:
+                problems.append(f"missing {reference.names[cls]} {np.round(box).astype(int).tolist()}")
+                continue
+            unmatched.remove(best)
+            if abs(best[1] - score) > conf_tol:
+                problems.append(f"{reference.names[cls]} conf {score:.3f} vs {best[1]:.3f}")
+        for cls, score, box in unmatched:
+            problems.append(f"extra {reference.names[cls]} {np.round(box).astype(int).tolist()} ({score:.3f})")
+
+        status = "OK" if not problems else "MISMATCH"
+        print(f"  {status:<8} {path}: {len(expected)} vs {len(actual)} boxes" + "".join(f"\n           {p}" for p in problems))
+        all_ok = all_ok and not problems
+    return all_ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a YOLO detector for CPU inference and check it against the .pt weights.")
+    parser.add_argument("weights", help="path to the .pt weights (e.g. Rebest.pt, bestbest.pt)")
+    parser.add_argument("--format", nargs="+", default=["onnx"], choices=EXPORT_FORMATS, help="formats to export")
+    parser.add_argument("--imgsz", type=int, default=DETECT_IMGSZ, help="fixed input size")
+    parser.add_argument("--images", nargs="+", default=["*.jpg"], help="images (globs allowed) for the parity check")
+    parser.add_argument("--check-only", action="store_true", help="skip exporting, only compare existing exports")
+    parser.add_argument("--int8", action="store_true", help="also write an INT8 ONNX model calibrated on --images")
+    parser.add_argument("--quant-mode", default="static", choices=("static", "dynamic"), help="INT8 quantization mode")
+    args = parser.parse_args()
+
+    images = sorted({p for pattern in args.images for p in (glob.glob(pattern) if glob.has_magic(pattern) else [pattern])})
+
+    formats = list(args.format)
+    if args.int8 and "onnx" not in formats:
+        formats.append("onnx")
+    paths = ([exported_path(args.weights, fmt) for fmt in formats] if args.check_only
+             else export(args.weights, formats, args.imgsz))
+    if args.int8 and not args.check_only:
+        quantize(exported_path(args.weights, "onnx"), images, args.quant_mode, args.imgsz)
+        # INT8 は FP32 とぴったりは一致しないので、ここでは比べない (model_benchmark.py で精度を確認する)
+
+    if not images:
+        print("No images for the parity check.")
+        return
+    failed = False
+    for path in paths:
+        print(f"Parity check: {args.weights} vs {path} ({len(images)} images)")
+        if not check_parity(args.weights, path, images, args.imgsz):
+            failed = True
+    if failed:
+        raise SystemExit("Parity check failed.")
+    print("Parity check passed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# model_loader.py
+import threading
+import time
+
+import numpy as np
+
+from model_export import EXPORT_FORMATS, QUANTIZED_FORMATS, resolve_weights
+
+
+class ModelLoader:
+    """
+    YOLO モデルをバックグラウンドスレッドで読み込み、ダミー画像で1回推論して温めておくクラス。
+    ウィンドウは読み込みを待たずに表示でき、最初の本番推論で初期化の待ち時間が出なくなる。
+    準備ができたら root.after 経由で on_ready(model) をメインスレッドで呼ぶ。
+    prefer_exported=True なら model_export.py で書き出した ONNX / OpenVINO モデルがあればそちらを読む。
+    quantized=True なら INT8 に量子化したモデル (<stem>_int8.onnx) を読む (なければ通常のモデル)。
+    """
+
+    def __init__(self, root, weights, on_ready=None, on_error=None, warmup_shape=(480, 640, 3),
+                 frame_source=None, lock=None, prefer_exported=True, quantized=False, **model_kwargs):
+        self.root = root
+        self.weights = weights
+        self.prefer_exported = prefer_exported
+        self.quantized = quantized
+        self.weights_path = weights  # 実際に読んだファイル
+        self.on_ready = on_ready  # on_ready(model)
+        self.on_error = on_error  # on_error(exception)
+        # ウォームアップはカメラと同じ大きさの画像で行う。frame_source があればその形を使う
+        self.warmup_shape = warmup_shape
+        self.frame_source = frame_source
+        # 推論を他のスレッドと同じロックで守る場合に渡す
+        self.lock = lock if lock is not None else threading.Lock()
+        self.model_kwargs = model_kwargs
+        self.model_kwargs.setdefault("verbose", False)
+
+        self.model = None
+        self.ready = False
+        self.error = None
+        self.load_time = 0.0  # 重みの読み込みにかかった秒数
+        self.warmup_time = 0.0  # ウォームアップ推論にかかった秒数
+        self._thread = None
+
+    def start(self):
+        """読み込みを開始する。"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ModelLoader", daemon=True)
+            self._thread.start()
+        return self
+
+    def _warmup_frame(self):
+        shape = self.warmup_shape
+        if self.frame_source is not None:
+            # カメラの最初のフレームを少しだけ待って、実際の入力サイズに合わせる
+            deadline = time.perf_counter() + 2.0
+            while time.perf_counter() < deadline:
+                frame = self.frame_source()
+                if frame is not None:
+                    shape = frame.shape
+                    break
+                time.sleep(0.05)
+        return np.zeros(shape, dtype=np.uint8)
+
+    def _run(self):
+        try:
+            start = time.perf_counter()
+            # ultralytics (torch) の import 自体が重いので、これもこのスレッドで行う
+            from ultralytics import YOLO
+            if self.quantized:
+                self.weights_path = resolve_weights(self.weights, QUANTIZED_FORMATS + EXPORT_FORMATS)
+                if not self.weights_path.endswith("_int8.onnx"):
+                    print(f"Warning: no INT8 model for '{self.weights}', using '{self.weights_path}'")
+            elif self.prefer_exported:
+                self.weights_path = resolve_weights(self.weights)
+            model = YOLO(self.weights_path, task="detect")
+            self.load_time = time.perf_counter() - start
+
+            frame = self._warmup_frame()
+            start = time.perf_counter()
+            with self.lock:
+                model(frame, **self.model_kwargs)
+            self.warmup_time = time.perf_counter() - start
+            print(f"Model '{self.weights_path}' ready: load {self.load_time:.2f}s, "
+                  f"warm-up {self.warmup_time:.2f}s at {frame.shape[1]}x{frame.shape[0]}")
+        except Exception as e:
+            self.error = e
+            self._post(self._finish_error, e)
+            return
+        self._post(self._finish, model)
+
+    def _post(self, callback, *args):
+        try:
+            self.root.after(0, callback, *args)
+        except RuntimeError:
+            # ウィンドウがもう閉じられている
+            pass
+
+    def _finish(self, model):
+        self.model = model
+        self.ready = True
+        if self.on_ready is not None:
+            self.on_ready(model)
+
+    def _finish_error(self, error):
+        if self.on_error is not None:
+            self.on_error(error)
@@ -0,0 +1,78 @@
+# preview_renderer.py
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+
+class _PreviewTarget:
+    """1つのプレビュー形状 (フレームサイズ x 表示エリア) 用に確保したバッファ一式。"""
+
+    def __init__(self, frame_w, frame_h, target_w, target_h, keep_aspect, background):
+        if keep_aspect:
+            frame_aspect = float(frame_w) / frame_h
+            target_aspect = float(target_w) / target_h
+            if frame_aspect > target_aspect:
+                # 表示エリアより横長 -> 幅いっぱい (上下に帯)
+                display_w = target_w
+                display_h = int(target_w / frame_aspect)
+            else:
+                # 表示エリアより縦長または同じ -> 高さいっぱい (左右に帯)
+                display_h = target_h
+                display_w = int(target_h * frame_aspect)
+        else:
+            display_w, display_h = target_w, target_h
+
+        self.paste_x = (target_w - display_w) // 2
+        self.paste_y = (target_h - display_h) // 2
+        self.display_w = display_w
+        self.display_h = display_h
+
+        # RGBA にしておくと PIL 画像がこの配列のメモリをそのまま参照できる
+        self.buffer = np.empty((target_h, target_w, 4), dtype=np.uint8)
+        self.buffer[:, :] = (*background, 255)
+        self.roi = self.buffer[self.paste_y:self.paste_y + display_h, self.paste_x:self.paste_x + display_w]
+        self.resized = np.empty((display_h, display_w, 3), dtype=np.uint8)
+        self.pil_view = Image.frombuffer("RGBA", (target_w, target_h), self.buffer, "raw", "RGBA", 0, 1)
+        self.photo = ImageTk.PhotoImage("RGBA", (target_w, target_h))
+
+
+class PreviewRenderer:
+    """
+    カメラ映像をプレビューエリアに描くためのクラス。
+    プレビューの形状ごとにレターボックス済みのバッファと PhotoImage を一度だけ確保し、
+    毎フレーム cv2.resize (INTER_AREA) でそこに直接書き込んで PhotoImage.paste で更新する。
+    毎フレームの新しい画像オブジェクトの生成はほぼ無くなる。
+    """
+
+    def __init__(self, background=(0, 0, 0), keep_aspect=True, interpolation=cv2.INTER_AREA):
+        self.background = background
+        self.keep_aspect = keep_aspect
+        self.interpolation = interpolation
+        self._targets = {}  # (frame_w, frame_h, target_w, target_h) -> _PreviewTarget
+        self.current = None
+
+    def render(self, frame_bgr, target_w, target_h):
+        """
+        BGR フレームを target_w x target_h のプレビューに描き、更新した PhotoImage を返す。
+        Tk のメインスレッドから呼ぶこと。貼り付け位置は current.paste_x などで参照できる。
+        """
+        frame_h, frame_w = frame_bgr.shape[:2]
+        key = (frame_w, frame_h, target_w, target_h)
+        target = self._targets.get(key)
+        if target is None:
+            target = _PreviewTarget(frame_w, frame_h, target_w, target_h, self.keep_aspect, self.background)
+            self._targets[key] = target
+        self.current = target
+
+        cv2.resize(frame_bgr, (target.display_w, target.display_h), dst=target.resized, interpolation=self.interpolation)
+        cv2.cvtColor(target.resized, cv2.COLOR_BGR2RGBA, dst=target.roi)
+        target.photo.paste(target.pil_view)
+        return target.photo
+
+    @property
+    def paste_info(self):
+        """直近に描いたプレビューの貼り付け情報 {'x', 'y', 'w', 'h'}。"""
+        if self.current is None:
+            return {'x': 0, 'y': 0, 'w': 0, 'h': 0}
+        return {'x': self.current.paste_x, 'y': self.current.paste_y,
+                'w': self.current.display_w, 'h': self.current.display_h}
@@ -0,0 +1,149 @@
+# sam_segmenter.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# モデルの種類ごとのチェックポイント。CPU では vit_b が一番速い (vit_l の数分の1の時間)
+CHECKPOINTS = {
+    "vit_b": "../sam_vit_b_01ec64.pth",
+    "vit_l": "../sam_vit_l_0b3195.pth",
+    "vit_h": "../sam_vit_h_4b8939.pth",
+}
+
+
+def frame_key(image):
+    """画像の中身から作るキー。同じフレームなら同じキーになる。"""
+    image = np.ascontiguousarray(image)
+    digest = hashlib.blake2b(image.data, digest_size=16).hexdigest()
+    return f"{image.shape}:{digest}"
+
+
+def cutout_rgba(image_rgb, mask):
+    """マスクの外を透明にした RGBA 配列を返す。"""
+    rgba = np.zeros((*image_rgb.shape[:2], 4), dtype=np.uint8)
+    rgba[:, :, :3] = image_rgb
+    rgba[:, :, 3] = mask.astype(np.uint8) * 255
+    return rgba
+
+
+class SamSegmenter:
+    """
+    SAM (segment_anything) のモデルを読み込んだままにしておき、画像ごとのエンコード結果 (embedding) を
+    キャッシュする切り抜きサービス。重いのは set_image のエンコードだけで、
+    同じ画像に点や箱 (YOLO の箱など) を何度聞いても、2回目からはデコーダの分しかかからない。
+
+    キャッシュは frame_key() をキーにした LRU で、cache_size 枚まで覚える。
+    スレッドから呼んでもよい (1度に1つずつ処理する)。
+    """
+
+    def __init__(self, model_type="vit_b", checkpoint=None, device=None, cache_size=4):
+        if model_type not in CHECKPOINTS:
+            raise ValueError(f"Unknown SAM model type '{model_type}'. Choose from {', '.join(CHECKPOINTS)}")
+        self.model_type = model_type
+        self.checkpoint = checkpoint or CHECKPOINTS[model_type]
+        self.device = device
+        self.cache_size = cache_size
+
+        self.predictor = None
+        self.error = None  # 読み込みに失敗したときの例外 (2回目からは読み込み直さずにこれを投げる)
+        self.load_time = None
+        self.last_encode_time = None  # 直近のエンコードにかかった秒数
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()  # キー -> (features, original_size, input_size)
+        self._current_key = None
+        self._lock = threading.RLock()
+
+    def load(self):
+        """モデルを読み込む (済んでいれば何もしない)。"""
+        with self._lock:
+            if self.predictor is not None:
+                return self.predictor
+            if self.error is not None:
+                raise self.error
+            start = time.perf_counter()
+            try:
+                # torch と segment_anything はとても重いので、実際に使うときに import する
+                import torch
+                from segment_anything import sam_model_registry, SamPredictor
+
+                device = self.device or ("cuda" if torch.cuda.is_available() else "cpu")
+                sam = sam_model_registry[self.model_type](checkpoint=self.checkpoint)
+                sam.to(device)
+                self.predictor = SamPredictor(sam)
+            except Exception as e:
+                self.error = e
+                raise
+            self.load_time = time.perf_counter() - start
+            print(f"SAM '{self.model_type}' loaded on {device} in {self.load_time:.2f}s")
+            return self.predictor
+
+    def start(self):
+        """バックグラウンドでモデルを読み込み始める。失敗したら表示して self.error に残す。"""
+        threading.Thread(target=self._load_in_background, name="SamSegmenter", daemon=True).start()
+        return self
+
+    def _load_in_background(self):
+        try:
+            self.load()
+        except Exception as e:
+            print(f"Error loading SAM '{self.model_type}' from {self.checkpoint}: {e}")
+
+    def set_image(self, image_rgb):
+        """画像をエンコードする。キャッシュにあればエンコードせずに復元する。画像のキーを返す。"""
+        with self._lock:
+            predictor = self.load()
+            key = frame_key(image_rgb)
+            if key == self._current_key:
+                self.hits += 1
+                return key
+            cached = self._cache.get(key)
+            if cached is not None:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                predictor.features, predictor.original_size, predictor.input_size = cached
+                predictor.is_image_set = True
+            else:
+                self.misses += 1
+                start = time.perf_counter()
+                predictor.set_image(image_rgb)
+                self.last_encode_time = time.perf_counter() - start
+                print(f"SAM encode: {self.last_encode_time:.2f}s")
+                self._cache[key] = (predictor.features, predictor.original_size, predictor.input_size)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            self._current_key = key
+            return key
+
+    def mask_for(self, image_rgb, points=None, labels=None, box=None):
+        """
+        1つのプロンプト (点のリストと箱のどちらか、または両方) で一番よいマスクを返す。(bool の配列, スコア)。
+        points は [(x, y), ...]、labels は 1 (前景) / 0 (背景) のリスト (省略すると全部前景)。box は (x1, y1, x2, y2)。
+        """
+        with self._lock:
+            self.set_image(image_rgb)
+            point_coords = point_labels = None
+            if points is not None and len(points) > 0:
+                point_coords = np.asarray(points, dtype=np.float32)
+                point_labels = np.asarray(labels if labels is not None else [1] * len(points), dtype=np.int32)
+            masks, scores, _ = self.predictor.predict(
+                point_coords=point_coords, point_labels=point_labels,
+                box=None if box is None else np.asarray(box, dtype=np.float32),
+                multimask_output=box is None and point_coords is not None and len(point_coords) == 1)
+            best = int(np.argmax(scores))
+            return masks[best], float(scores[best])
+
+    def masks_for_boxes(self, image_rgb, boxes):
+        """箱ごとにマスクを返す ([(bool の配列, スコア), ...])。エンコードは1回だけ。"""
+        return [self.mask_for(image_rgb, box=box) for box in boxes]
+
+    def masks_for_points(self, image_rgb, points):
+        """点ごとに別々のマスクを返す ([(bool の配列, スコア), ...])。"""
+        return [self.mask_for(image_rgb, points=[point]) for point in points]
+
+    def stats(self):
+        return {"model": self.model_type, "cached": len(self._cache), "hits": self.hits, "misses": self.misses,
+                "last_encode_s": None if self.last_encode_time is None else round(self.last_encode_time, 3)}
@@ -0,0 +1,60 @@
+# screen_layers.py
+
+
+class ScreenLayers:
+    """
+    画面ごとのキャンバスアイテムをタグでまとめて保持するクラス。
+    各レイヤーは最初に表示するときに一度だけ builder で作り、
+    以降の画面切り替えは itemconfigure(state=...) による表示/非表示だけで済ませる。
+    変化する部分 (メッセージやサムネイル) は呼び出し側で itemconfig して更新する。
+    """
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self._built = set()
+        self.visible = ()
+
+    @staticmethod
+    def tag(name):
+        return f"layer_{name}"
+
+    def is_built(self, name):
+        return name in self._built
+
+    def build(self, name, builder):
+        """まだ作っていなければ builder() を呼んでレイヤーを作る (作ったアイテムは非表示で残る)。"""
+        if name in self._built:
+            return
+        before = set(self.canvas.find_all())
+        builder()
+        layer_tag = self.tag(name)
+        for item in self.canvas.find_all():
+            if item not in before:
+                # タグの先頭はクリック判定に使われているので、レイヤーのタグは末尾に足す
+                self.canvas.addtag_withtag(layer_tag, item)
+        self.canvas.itemconfigure(layer_tag, state="hidden")
+        self._built.add(name)
+
+    def show(self, *layers):
+        """
+        (名前, builder) の組を受け取り、それらのレイヤーだけを表示する。
+        後に書いたレイヤーほど手前に来る。
+        """
+        names = tuple(name for name, _ in layers)
+        for name, builder in layers:
+            self.build(name, builder)
+        for name in self.visible:
+            if name not in names:
+                self.canvas.itemconfigure(self.tag(name), state="hidden")
+        for name in names:
+            self.canvas.itemconfigure(self.tag(name), state="normal")
+            self.canvas.tag_raise(self.tag(name))
+        self.visible = names
+
+    def invalidate(self, name):
+        """レイヤーを削除する。次に show したときに作り直される。"""
+        if name in self._built:
+            self.canvas.delete(self.tag(name))
+            self._built.discard(name)
+        if name in self.visible:
+            self.visible = tuple(n for n in self.visible if n != name)
@@ -0,0 +1,103 @@
+# shutter_job.py
+import threading
+import time
+
+
+class StageFailed(Exception):
+    """ステージが想定内の理由で失敗したときに投げる。メッセージはそのまま画面に出せる文にする。"""
+
+
+class ShutterJob:
+    """
+    シャッター後の処理 (detect -> crop -> matte -> trim -> save など) を
+    バックグラウンドスレッドで順番に実行するジョブ。
+
+    stages は (ステージ名, 関数) のリスト。各関数は ctx (dict) を受け取り、
+    次のステージに渡したい値を ctx に書き込む。
+    コールバックはすべて root.after 経由で Tk のメインスレッドから呼ばれる。
+        on_progress(stage_name)   ステージ開始時
+        on_done(ctx)              全ステージ成功時
+        on_error(stage_name, e)   例外が出たとき
+        on_cancel(ctx)            cancel() 後にジョブが止まったとき (途中で書いたファイルの後始末用)
+    cancel() はステージの境目で効く。実行中のステージ (rembg など) は最後まで走るが、結果は捨てられる。
+    中止したジョブは on_cancel 以外のコールバックを呼ばないので、止まるのを待たずに次のジョブを始めてよい
+    (active で判定する)。その場合、2つのジョブのステージが同時に走ることがある。
+    """
+
+    def __init__(self, root, stages, ctx=None, on_progress=None, on_done=None, on_error=None, on_cancel=None):
+        self.root = root
+        self.stages = stages
+        self.ctx = ctx if ctx is not None else {}
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+
+        self.cancelled = False
+        self.finished = False
+        self.current_stage = None
+        self.stage_times = {}  # ステージ名 -> 秒
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="ShutterJob", daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """ジョブを中止する。メインスレッドから呼ぶ。"""
+        self.cancelled = True
+
+    @property
+    def running(self):
+        return not self.finished
+
+    @property
+    def active(self):
+        """実行中で、中止もされていない (新しいジョブを始めるべきでない) か。"""
+        return not self.finished and not self.cancelled
+
+    def _post(self, func, *args):
+        try:
+            self.root.after(0, func, *args)
+        except RuntimeError:
+            # メインループが既に終了している
+            pass
+
+    def _run(self):
+        for stage_name, stage_func in self.stages:
+            if self.cancelled:
+                break
+            self.current_stage = stage_name
+            self._post(self._report_progress, stage_name)
+            start = time.perf_counter()
+            try:
+                stage_func(self.ctx)
+            except Exception as e:
+                self.stage_times[stage_name] = time.perf_counter() - start
+                self._post(self._finish_error, stage_name, e)
+                return
+            self.stage_times[stage_name] = time.perf_counter() - start
+            print(f"ShutterJob stage '{stage_name}' took {self.stage_times[stage_name]:.3f}s")
+        self._post(self._finish)
+
+    # --- 以下はメインスレッドで実行される ---
+    def _report_progress(self, stage_name):
+        if not self.cancelled and not self.finished and self.on_progress:
+            self.on_progress(stage_name)
+
+    def _finish(self):
+        self.finished = True
+        if self.cancelled:
+            if self.on_cancel:
+                self.on_cancel(self.ctx)
+        elif self.on_done:
+            self.on_done(self.ctx)
+
+    def _finish_error(self, stage_name, error):
+        self.finished = True
+        if self.cancelled:
+            if self.on_cancel:
+                self.on_cancel(self.ctx)
+        elif self.on_error:
+            self.on_error(stage_name, error)
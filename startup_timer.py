@@ -0,0 +1,45 @@
+# startup_timer.py
+import os
+import time
+
+
+class StartupTimer:
+    """
+    起動にかかった時間を区切りごとに記録して表示するクラス。
+    log_path を指定すると1回の起動を1行として追記するので、リリースごとの比較に使える。
+    import の内訳まで見たいときは `python -X importtime top.py 2> importtime.log` を使う。
+    """
+
+    def __init__(self, app_name, started_at=None, log_path=None):
+        self.app_name = app_name
+        # スクリプトの先頭で取った time.perf_counter() を渡すと import の時間も含められる
+        self.started_at = time.perf_counter() if started_at is None else started_at
+        self.log_path = log_path
+        self.marks = []  # [(ラベル, 起動からの秒数)]
+        self.reported = False
+
+    def mark(self, label):
+        """起動からの経過時間を記録する。同じラベルは最初の1回だけ。"""
+        if any(name == label for name, _ in self.marks):
+            return
+        self.marks.append((label, time.perf_counter() - self.started_at))
+
+    def report(self, **extra):
+        """記録した時間を表示し、log_path があれば追記する。extra は一緒に出したい値 (秒)。"""
+        if self.reported:
+            return
+        self.reported = True
+        items = self.marks + sorted(extra.items())
+        print(f"--- Startup time ({self.app_name}) ---")
+        for label, seconds in items:
+            print(f"  {label:<16} {seconds:7.3f}s")
+        if self.log_path:
+            try:
+                new_file = not os.path.exists(self.log_path)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    if new_file:
+                        f.write("date,app,timings\n")
+                    timings = " ".join(f"{label}={seconds:.3f}" for label, seconds in items)
+                    f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')},{self.app_name},{timings}\n")
+            except OSError as e:
+                print(f"Could not write startup log {self.log_path}: {e}")
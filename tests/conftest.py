@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 共有モジュールはリポジトリの直下にある
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,54 @@
+import pytest
+
+from detection_voter import DetectionVoter
+
+CADENCES = (0.1, 0.2, 0.5, 0.8, 1.0)
+
+
+def hold_flag(voter, confidence, interval, limit=20.0):
+    """国旗をずっと見せたまま interval 秒ごとに推論したときの、認識までの秒数 (認識しなければ None)。"""
+    voter.reset(now=0.0)
+    now = 0.0
+    while now <= limit:
+        if voter.update({"Japan": confidence}, now=now) is not None:
+            return voter.time_to_recognize
+        now += interval
+    return None
+
+
+@pytest.mark.parametrize("confidence", [0.45, 0.6, 0.7, 0.84])
+def test_time_to_recognize_does_not_depend_on_cadence(confidence):
+    times = [hold_flag(DetectionVoter(), confidence, interval) for interval in CADENCES]
+    assert all(t is not None for t in times), times
+    fastest = times[0]
+    for interval, t in zip(CADENCES, times):
+        # 推論の時刻に丸められる分 (間隔1つ分) しか違わない
+        assert fastest - 0.1 <= t <= fastest + interval, (interval, times)
+
+
+def test_min_confidence_is_recognized():
+    voter = DetectionVoter()
+    assert hold_flag(voter, voter.min_confidence, 1.0, limit=60.0) is not None
+
+
+def test_early_exit_waits_the_same_time_at_any_cadence():
+    for interval in (0.1, 0.2):
+        voter = DetectionVoter()
+        assert hold_flag(voter, 0.95, interval) == pytest.approx(voter.early_exit_time, abs=interval)
+
+
+def test_single_miss_keeps_the_score():
+    voter = DetectionVoter()
+    voter.reset(now=0.0)
+    for now in (0.0, 0.2, 0.4):
+        voter.update({"Japan": 0.6}, now=now)
+    _, before = voter.leader()
+    voter.update({}, now=0.6)
+    name, after = voter.leader()
+    assert name == "Japan" and after > 0.5 * before
+
+
+def test_below_min_confidence_is_ignored():
+    voter = DetectionVoter()
+    assert hold_flag(voter, voter.min_confidence - 0.05, 0.2) is None
+    assert voter.leader() == (None, 0.0)
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from detection_voter import DetectionVoter
+from inference_scheduler import InferenceScheduler
+
+FRAME_INTERVAL = 1.0 / 30.0
+
+
+class FakeWorker:
+    """InferenceWorker の代わり。推論に inference_time 秒かかる。"""
+
+    def __init__(self, inference_time):
+        self.inference_time = inference_time
+        self.busy = False
+        self.last_inference_time = 0.0
+        self.done_at = None
+
+
+def recognize(inference_time, confidence=0.6, limit=30.0):
+    """止まった国旗を 30fps で映し続けたときの、認識までの秒数 (認識しなければ None)。"""
+    voter = DetectionVoter()
+    scheduler = InferenceScheduler(max_interval=voter.half_life / 4)
+    worker = FakeWorker(inference_time)
+    frame = np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    voter.reset(now=0.0)
+    now = 0.0
+    while now <= limit:
+        if worker.busy and now >= worker.done_at:
+            worker.busy = False
+            worker.last_inference_time = worker.inference_time
+            scheduler.note_result(True)
+            if voter.update({"Japan": confidence}, now=now) is not None:
+                return voter.time_to_recognize
+        if scheduler.should_infer(frame, worker, now=now):
+            worker.busy = True
+            worker.done_at = now + worker.inference_time
+        now += FRAME_INTERVAL
+    return None
+
+
+def test_interval_is_capped_on_slow_inference():
+    voter = DetectionVoter()
+    scheduler = InferenceScheduler(max_interval=voter.half_life / 4)
+    worker = FakeWorker(0.9)
+    worker.last_inference_time = 0.9
+    scheduler.should_infer(np.zeros((48, 64, 3), dtype=np.uint8), worker, now=0.0)
+    assert scheduler.interval == pytest.approx(voter.half_life / 4)
+
+
+@pytest.mark.parametrize("confidence", [0.45, 0.6, 0.84])
+def test_slow_inference_still_recognizes(confidence):
+    fast = recognize(0.03, confidence)
+    assert fast is not None
+    for inference_time in (0.5, 0.8, 1.2):
+        slow = recognize(inference_time, confidence)
+        assert slow is not None, inference_time
+        # 遅れるのは最初の結果が届くまでと、推論の時刻に丸められる分だけ
+        assert slow <= fast + 2 * inference_time, (inference_time, fast, slow)
@@ -1,20 +1,36 @@
-import pyttsx3
+_engine = None
 
-engine = pyttsx3.init()
 
-# 読み上げ速度をゆっくりに設定
-engine.setProperty('rate', 125)
+def get_engine():
+    """読み上げエンジンを返す。pyttsx3 の import と初期化は最初に使うときだけ行う。"""
+    global _engine
+    if _engine is None:
+        import pyttsx3
 
-# 音量を調整
-engine.setProperty('volume', 0.9)
+        engine = pyttsx3.init()
 
-# 音声の選択（声の質はシステムによる）
-voices = engine.getProperty('voices')
-for voice in voices:
-    if "child" in voice.name.lower():  # 子供向け音声があれば選択
-        engine.setProperty('voice', voice.id)
-        break
+        # 読み上げ速度をゆっくりに設定
+        engine.setProperty('rate', 125)
 
-text = "こんにちは、これは幼児向けの読み上げです。"
-engine.say(text)
-engine.runAndWait()
+        # 音量を調整
+        engine.setProperty('volume', 0.9)
+
+        # 音声の選択（声の質はシステムによる）
+        voices = engine.getProperty('voices')
+        for voice in voices:
+            if "child" in voice.name.lower():  # 子供向け音声があれば選択
+                engine.setProperty('voice', voice.id)
+                break
+        _engine = engine
+    return _engine
+
+
+def speak(text):
+    engine = get_engine()
+    engine.say(text)
+    engine.runAndWait()
+
+
+if __name__ == "__main__":
+    text = "こんにちは、これは幼児向けの読み上げです。"
+    speak(text)